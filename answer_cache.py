@@ -0,0 +1,160 @@
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+URL_PATTERN = re.compile(r"https?://[^\s)\]>\"'`]+")
+
+# Tools whose output the answer is grounded in; list_documentation_pages returns
+# every URL and would make each answer depend on the whole corpus
+SOURCE_TOOLS = {"retrieve_relevant_documentation", "get_page_content"}
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    citations: List[str]
+    latency: float
+    created_at: float = field(default_factory=time.time)
+
+def extract_citations(answer: str, messages: Iterable[Any] = ()) -> List[str]:
+    """URLs an answer depends on: those it cites, then those its tools returned."""
+    urls = URL_PATTERN.findall(answer)
+    for message in messages:
+        for part in getattr(message, "parts", []):
+            if part.part_kind == "tool-return" and part.tool_name in SOURCE_TOOLS:
+                urls.extend(URL_PATTERN.findall(part.model_response_str()))
+    return list(dict.fromkeys(url.rstrip(".,;:") for url in urls))
+
+class AnswerCache:
+    """Semantic cache of agent answers keyed on the question embedding.
+
+    A question whose cosine similarity to a cached one reaches `threshold` gets
+    the cached answer. Entries expire after `ttl` seconds and are dropped as soon
+    as the crawler rewrites any URL they cite.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: float = 3600,
+        max_entries: int = 1000,
+        poll_interval: float = 60
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.poll_interval = poll_interval
+
+        self._entries: List[CachedAnswer] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        self._last_page_update: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        # Zero vectors come from failed embedding calls and match nothing
+        return vector / norm if norm else None
+
+    def lookup(self, embedding: List[float]) -> Optional[CachedAnswer]:
+        """Return the closest cached answer above the threshold, if any."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._expire()
+            if vector is None or not self._entries or self._vectors.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entries[best]
+            self.hits += 1
+            self.saved_seconds += entry.latency
+            return entry
+
+    def store(self, question: str, embedding: List[float], answer: str, citations: List[str], latency: float):
+        """Cache an answer produced by a full agent run that took `latency` seconds."""
+        vector = self._normalize(embedding)
+        if vector is None or not answer:
+            return
+
+        with self._lock:
+            self._expire()
+            if len(self._entries) >= self.max_entries:
+                self._keep([i for i in range(len(self._entries)) if i != 0])
+            if not self._entries:
+                self._vectors = np.zeros((0, vector.shape[0]), dtype=np.float32)
+            self._entries.append(CachedAnswer(question, answer, citations, latency))
+            self._vectors = np.vstack([self._vectors, vector])
+
+    def invalidate_urls(self, urls: Iterable[str]) -> int:
+        """Drop every entry that cites one of the given URLs; returns how many were dropped."""
+        changed = set(urls)
+        with self._lock:
+            keep = [i for i, entry in enumerate(self._entries) if not changed.intersection(entry.citations)]
+            dropped = len(self._entries) - len(keep)
+            if dropped:
+                self._keep(keep)
+            return dropped
+
+    def refresh_from_page_state(self, supabase: Any):
+        """Invalidate answers citing pages the crawler rewrote since the last poll.
+
+        The crawler bumps `deepseek_page_state.updated_at` whenever it stores a
+        page. Polling is rate limited to once every `poll_interval` seconds.
+        """
+        now = time.time()
+        if now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+
+        try:
+            query = supabase.table("deepseek_page_state").select("url, updated_at")
+            if self._last_page_update is not None:
+                query = query.gt("updated_at", self._last_page_update)
+            result = query.execute()
+        except Exception as e:
+            print(f"Answer cache invalidation check failed: {e}")
+            return
+
+        if not result.data:
+            return
+        first_poll = self._last_page_update is None
+        self._last_page_update = max(row["updated_at"] for row in result.data)
+        if not first_poll:
+            dropped = self.invalidate_urls(row["url"] for row in result.data)
+            if dropped:
+                print(f"Answer cache: dropped {dropped} answers citing recrawled pages")
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        if self._entries and self._entries[0].created_at < cutoff:
+            self._keep([i for i, entry in enumerate(self._entries) if entry.created_at >= cutoff])
+
+    def _keep(self, indices: List[int]):
+        self._entries = [self._entries[i] for i in indices]
+        self._vectors = self._vectors[indices]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3)
+        }
@@ -0,0 +1,132 @@
+"""Async server for /api/chat.
+
+Every request runs on one long-lived event loop, so the pooled OpenAI
+connections are reused and requests overlap while they wait on the network.
+`POST /api/chat` returns JSON like the Flask app; with `"stream": true` in the
+body or `Accept: text/event-stream` it streams Server-Sent Events instead:
+
+    data: {"delta": "..."}
+    data: {"done": true, "session_id": "...", "citations": [...], "cached": false}
+
+Pass the returned `session_id` with the next message to continue the conversation.
+`GET /metrics` serves latency histograms, error counts and tool calls per request
+in the Prometheus text format.
+
+Run with `python -m api.asgi` or `uvicorn api.asgi:app --workers 4`.
+"""
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from api.chat_service import (answer_cache, get_agent_response, openai_client, single_flight_summary,
+                              stream_agent_response)
+from telemetry import prefetch_summary, render_metrics
+
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "16"))
+MAX_QUEUED_CHATS = int(os.getenv("MAX_QUEUED_CHATS", "64"))
+
+class ChatLimiter:
+    """Run at most `limit` agent loops at once and queue up to `max_queued` more."""
+
+    def __init__(self, limit: int, max_queued: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self.max_queued = max_queued
+        self.active = 0
+        self.queued = 0
+
+    def full(self) -> bool:
+        return self.queued >= self.max_queued and self._semaphore.locked()
+
+    @asynccontextmanager
+    async def slot(self):
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+limiter = ChatLimiter(MAX_CONCURRENT_CHATS, MAX_QUEUED_CHATS)
+
+def wants_stream(request: Request, body: dict) -> bool:
+    return bool(body.get('stream')) or 'text/event-stream' in request.headers.get('accept', '')
+
+async def chat(request: Request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({'error': 'Invalid JSON body'}, status_code=400)
+
+    message = body.get('message')
+    if not message:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+    if limiter.full():
+        return JSONResponse({'error': 'Server busy, try again shortly'}, status_code=503,
+                            headers={'Retry-After': '1'})
+
+    if wants_stream(request, body):
+        return StreamingResponse(sse_events(message, body.get('session_id')), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    try:
+        async with limiter.slot():
+            response = await get_agent_response(message, body.get('session_id'))
+        return JSONResponse(response)
+    except Exception as e:
+        print(f"Error in chat endpoint: {e}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+async def sse_events(message: str, session_id: Optional[str] = None):
+    """Forward agent deltas to the client as Server-Sent Events as they arrive."""
+    async with limiter.slot():
+        try:
+            async for event in stream_agent_response(message, session_id):
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+async def cache_stats(request: Request):
+    return JSONResponse(answer_cache.stats())
+
+async def server_stats(request: Request):
+    return JSONResponse({'active': limiter.active, 'queued': limiter.queued,
+                         'max_concurrent': MAX_CONCURRENT_CHATS, 'max_queued': MAX_QUEUED_CHATS,
+                         'prefetch': prefetch_summary(), 'single_flight': single_flight_summary()})
+
+async def metrics(request: Request):
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    yield
+    await openai_client.close()
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat, methods=['POST']),
+        Route('/api/cache', cache_stats, methods=['GET']),
+        Route('/api/stats', server_stats, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,206 @@
+from dotenv import load_dotenv
+import os
+import time
+import asyncio
+import uuid
+import httpx
+from typing import Any, AsyncIterator, Dict, List, Optional
+from openai import AsyncOpenAI
+from supabase import Client, create_client
+
+load_dotenv()
+
+# Long-lived clients shared by every request. The OpenAI client keeps a pool of
+# keep-alive connections, which only pays off when requests share one event loop.
+# Retries are left to the agent's rate limiter.
+openai_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_retries=0,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=20
+        )
+    )
+)
+supabase: Client = create_client(
+    os.getenv("SUPABASE_URL"),
+    os.getenv("SUPABASE_SERVICE_KEY")
+)
+
+# Import your existing agent
+from deepseek_agent import (agentic_rag, context_candidates, embedding_flight, format_documents, get_embedding,
+                            search_documentation, search_flight, DeepSeekDeps, system_prompt)
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from session_store import load_session_store_from_env
+from lexical_index import load_lexical_index_from_env
+from vector_index import load_vector_index_from_env
+from answer_cache import AnswerCache, extract_citations
+from page_catalog import PageCatalog
+from retrieval_prefetch import RetrievalPrefetch, load_prefetch_mode_from_env
+from single_flight import SingleFlight
+from telemetry import record_cache, span, track_request
+
+# Local snapshot search when VECTOR_SNAPSHOT_DIR is set, Supabase RPC otherwise
+vector_index = load_vector_index_from_env()
+lexical_index = load_lexical_index_from_env()
+
+# Answers to near-identical questions are served without running the agent
+answer_cache = AnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+)
+
+# Page list and page texts for the agent tools, invalidated by the crawler's version stamp
+page_catalog = PageCatalog(supabase)
+
+# Per-session conversation history, compacted to a token budget
+session_store = load_session_store_from_env()
+
+# Start the documentation search for each message before the model asks for it
+prefetch_mode = load_prefetch_mode_from_env()
+prefetch_min_coverage = float(os.getenv("RETRIEVAL_PREFETCH_MIN_COVERAGE", "0.6"))
+
+# Identical new questions asked at the same time share one agent run
+coalesce_chats = os.getenv("CHAT_COALESCE", "").lower() in ("1", "true", "yes")
+chat_flight = SingleFlight("chat")
+
+def make_deps() -> DeepSeekDeps:
+    return DeepSeekDeps(
+        supabase=supabase,
+        openai_client=openai_client,
+        vector_index=vector_index,
+        lexical_index=lexical_index,
+        page_catalog=page_catalog
+    )
+
+def normalize_message(message: str) -> str:
+    return " ".join(message.lower().split())
+
+async def prefetched_context(docs: list) -> str:
+    return ("Documentation already retrieved for the user's question:\n\n" + await format_documents(docs)
+            + "\n\nAnswer from it, and call retrieve_relevant_documentation only to search for something else.")
+
+async def run_agent(
+    message: str,
+    history: list,
+    query_embedding: Optional[List[float]],
+    started: float
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield {'delta': text} events, then {'messages': [...], 'citations': [...]} for the session."""
+    deps = make_deps()
+    run_history = history
+    stored_prefix = []
+    injected_urls = []
+    if prefetch_mode != "off":
+        deps.prefetch = RetrievalPrefetch(
+            message, search_documentation(deps, message, match_count=context_candidates),
+            min_coverage=prefetch_min_coverage
+        )
+        if prefetch_mode == "context" and not history:
+            docs = await deps.prefetch.take(message, inject=True)
+            if docs:
+                # Passing the system prompt as history stops pydantic-ai adding its own.
+                # Only the plain system prompt is kept in the session.
+                run_history = [ModelRequest(parts=[
+                    SystemPromptPart(content=system_prompt),
+                    SystemPromptPart(content=await prefetched_context(docs))
+                ])]
+                stored_prefix = [ModelRequest(parts=[SystemPromptPart(content=system_prompt)])]
+                injected_urls = [doc['url'] for doc in docs]
+
+    try:
+        async with agentic_rag.run_stream(
+            message,
+            deps=deps,
+            message_history=run_history,
+        ) as result:
+            response_text = ""
+            async for chunk in result.stream_text(delta=True):
+                response_text += chunk
+                yield {'delta': chunk}
+
+            new_messages = result.new_messages()
+            # Injected pages count as sources just like tool results
+            citations = list(dict.fromkeys(extract_citations(response_text, new_messages) + injected_urls))
+    finally:
+        if deps.prefetch is not None:
+            deps.prefetch.finish()
+
+    if query_embedding is not None:
+        answer_cache.store(message, query_embedding, response_text, citations, time.perf_counter() - started)
+    yield {'messages': stored_prefix + new_messages, 'citations': citations}
+
+async def stream_agent_response(message: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Run the agent and yield {'delta': text} events as the answer streams in.
+
+    The last event is {'done': True, 'session_id': ..., 'citations': [...], 'cached': bool,
+    'timings': {...}}, where timings break the request down by tool, embedding, database
+    and LLM time. Without a session id a new session is started.
+    """
+    with track_request("chat") as stats:
+        started = time.perf_counter()
+        session_id = session_id or uuid.uuid4().hex
+        history = session_store.get(session_id)
+
+        # Follow-up questions depend on the conversation, so only first turns use the answer cache
+        query_embedding = None
+        if not history:
+            try:
+                query_embedding = await get_embedding(message, openai_client)
+            except Exception as e:
+                print(f"Skipping answer cache, embedding failed: {e}")
+        if query_embedding is not None:
+            with span("db", "answer_cache_refresh"):
+                await asyncio.to_thread(answer_cache.refresh_from_page_state, supabase)
+            cached = answer_cache.lookup(query_embedding)
+            record_cache("answer", cached is not None)
+            if cached:
+                stats.cached = True
+                session_store.append(session_id, [
+                    ModelRequest(parts=[SystemPromptPart(content=system_prompt), UserPromptPart(content=message)]),
+                    ModelResponse(parts=[TextPart(content=cached.answer)])
+                ])
+                yield {'delta': cached.answer}
+                yield {
+                    'done': True,
+                    'session_id': session_id,
+                    'citations': cached.citations,
+                    'cached': True,
+                    'saved_seconds': round(cached.latency - (time.perf_counter() - started), 3),
+                    'timings': stats.summary()
+                }
+                return
+
+        if coalesce_chats and not history:
+            # Everyone asking the same new question right now gets the same answer stream
+            events = chat_flight.stream(normalize_message(message),
+                                        lambda: run_agent(message, [], query_embedding, started))
+        else:
+            events = run_agent(message, history, query_embedding, started)
+        result = None
+        async for event in events:
+            if 'delta' in event:
+                yield event
+            else:
+                result = event
+        if result is None:
+            raise RuntimeError("Agent run ended without a final result")
+
+        session_store.append(session_id, result['messages'])
+        yield {'done': True, 'session_id': session_id, 'citations': result['citations'], 'cached': False,
+               'timings': stats.summary()}
+
+def single_flight_summary() -> Dict[str, Dict[str, int]]:
+    return {flight.name: flight.summary() for flight in (embedding_flight, search_flight, chat_flight)}
+
+async def get_agent_response(message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Run the agent to completion and return the whole answer."""
+    response_text = ""
+    async for event in stream_agent_response(message, session_id):
+        if 'delta' in event:
+            response_text += event['delta']
+        else:
+            final = event
+    final.pop('done')
+    return {'response': response_text, **final}
@@ -0,0 +1,103 @@
+"""Throughput and chunk shape of the token-aware chunker vs. the character chunker.
+
+Documents are synthetic markdown of increasing size: headings, prose, lists
+and fenced code blocks, including code blocks larger than one chunk.
+
+    python -m benchmarks.chunking_benchmark --sizes 100000 1000000 5000000
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from chunking import chunk_text, chunk_text_by_chars, make_token_counter
+
+WORDS = (
+    "the model returns a response with tokens when streaming is enabled and the "
+    "request includes a system prompt temperature parameter context cache hit rate "
+    "for each completion choice reasoning content function call json output"
+).split()
+
+def make_document(size: int, seed: int) -> str:
+    """Synthetic documentation page of roughly `size` characters."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    length = 0
+    section = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.08:
+            section += 1
+            part = f"{'#' * rng.randint(1, 3)} Section {section}"
+        elif kind < 0.2:
+            lines = rng.choice([5, 20, 400])
+            part = "```python\n" + "\n".join(
+                f"response = client.chat.completions.create(model='deepseek-chat', step={i})"
+                for i in range(lines)
+            ) + "\n```"
+        elif kind < 0.3:
+            part = "\n".join(f"- {' '.join(rng.choices(WORDS, k=8))}" for _ in range(rng.randint(2, 8)))
+        else:
+            part = " ".join(
+                " ".join(rng.choices(WORDS, k=rng.randint(8, 25))).capitalize() + "."
+                for _ in range(rng.randint(2, 10))
+            )
+        parts.append(part)
+        length += len(part) + 2
+    return "\n\n".join(parts)
+
+def split_fences(chunks: List[str]) -> int:
+    """Chunks that end inside a fenced code block."""
+    return sum(1 for chunk in chunks if chunk.count("```") % 2)
+
+def measure(name: str, chunker: Callable[[str], List[str]], document: str, count: Callable[[str], int]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    chunks = chunker(document)
+    seconds = time.perf_counter() - started
+    tokens = [count(chunk) for chunk in chunks]
+    return {
+        "chunker": name,
+        "chars": len(document),
+        "seconds": seconds,
+        "mb_per_sec": len(document) / seconds / 1e6,
+        "chunks": len(chunks),
+        "mean_tokens": sum(tokens) / len(tokens),
+        "max_tokens": max(tokens),
+        "split_fences": split_fences(chunks),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the markdown chunkers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000],
+                        help="Document sizes in characters")
+    parser.add_argument("--max-tokens", type=int, default=1000, help="Token budget of the new chunker")
+    parser.add_argument("--overlap", type=int, default=100, help="Overlap tokens of the new chunker")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Character budget of the old chunker")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    count = make_token_counter()
+    chunkers = {
+        "chars": lambda text: chunk_text_by_chars(text, args.chunk_size),
+        "tokens": lambda text: chunk_text(text, args.max_tokens, args.overlap),
+    }
+
+    results = []
+    print(f"{'chunker':8} {'chars':>10} {'seconds':>8} {'MB/s':>7} {'chunks':>7} {'mean tok':>9} {'max tok':>8} {'split ```':>10}")
+    for size in args.sizes:
+        document = make_document(size, args.seed)
+        for name, chunker in chunkers.items():
+            result = measure(name, chunker, document, count)
+            results.append(result)
+            print(f"{name:8} {result['chars']:>10} {result['seconds']:>8.3f} {result['mb_per_sec']:>7.2f} "
+                  f"{result['chunks']:>7} {result['mean_tokens']:>9.0f} {result['max_tokens']:>8} "
+                  f"{result['split_fences']:>10}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
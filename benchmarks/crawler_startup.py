@@ -0,0 +1,174 @@
+"""Cold-start time, peak memory and bytes downloaded when the crawler starts up.
+
+Each variant runs in a fresh interpreter against a local stand-in for the
+Supabase REST endpoint that serves `--rows` synthetic deepseek_pages rows
+(1536-dimension embeddings included), so no Supabase project is needed:
+
+- `import`: importing crawl_deepseek_docs, as tools and benchmarks do,
+- `check`: the import plus the head-only count of `--check`,
+- `full_count_check`: the import-time check the crawler used to run, a
+  `select *` exact count that downloads every row,
+- `baseline`: importing the module as of `--baseline-ref`, if given (older
+  versions need crawl4ai installed and ran their check on import).
+
+    python -m benchmarks.crawler_startup --rows 2000 --baseline-ref HEAD~1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, resource, time
+started = time.perf_counter()
+import crawl_deepseek_docs as crawler
+imported = time.perf_counter()
+{check}
+finished = time.perf_counter()
+print(json.dumps({{
+    "import_s": round(imported - started, 3),
+    "check_s": round(finished - imported, 3),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}}))
+"""
+
+CHECKS = {
+    "import": "",
+    "check": "crawler.check_database()",
+    "full_count_check": (
+        "supabase = crawler.get_supabase()\n"
+        "supabase.table('deepseek_pages').select('id').limit(1).execute()\n"
+        "supabase.table('deepseek_pages').select('*', count='exact').execute()"
+    ),
+}
+
+def make_rows(count: int, seed: int = 0) -> bytes:
+    """deepseek_pages rows as PostgREST returns them, with embeddings in pgvector's text form."""
+    rng = np.random.default_rng(seed)
+    rows = [
+        {
+            "id": i + 1,
+            "url": f"https://api-docs.deepseek.com/page-{i // 8}",
+            "chunk_number": i % 8,
+            "title": f"Page {i // 8} part {i % 8}",
+            "summary": "Synthetic chunk summary.",
+            "content": "Synthetic chunk content. " * 150,
+            "metadata": {"source": "deepseek_docs", "chunk_size": 3750},
+            "embedding": "[" + ",".join(f"{x:.8f}" for x in rng.normal(0, 0.03, 1536)) + "]",
+        }
+        for i in range(count)
+    ]
+    return json.dumps(rows).encode()
+
+class StubPostgrest(ThreadingHTTPServer):
+    """Answers deepseek_pages selects with a fixed row set and counts the bytes it sends."""
+
+    def __init__(self, rows: int):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.rows = rows
+        self.full_body = make_rows(rows)
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubPostgrest
+
+    def log_message(self, *args: Any):
+        pass
+
+    def respond(self, head: bool):
+        query = parse_qs(urlparse(self.path).query)
+        if query.get("select") == ["*"] and "limit" not in query:
+            body = self.server.full_body
+        else:
+            body = b"[]" if head else json.dumps([{"id": 1}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Range", f"0-{self.server.rows - 1}/{self.server.rows}")
+        self.send_header("Content-Length", "0" if head else str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+            with self.server.lock:
+                self.server.bytes_sent += len(body)
+
+    def do_GET(self):
+        self.respond(head=False)
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+def run_variant(server: StubPostgrest, check: str, module_dir: Optional[Path] = None) -> Dict[str, Any]:
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        "SUPABASE_SERVICE_KEY": "offline.benchmark.key",
+        "OPENAI_API_KEY": "offline-benchmark",
+        "PYTHONPATH": os.pathsep.join(str(path) for path in (module_dir, ROOT) if path),
+    }
+    sent_before = server.bytes_sent
+    # Run from an empty directory so the crawler module is found through PYTHONPATH only
+    with tempfile.TemporaryDirectory() as cwd:
+        completed = subprocess.run([sys.executable, "-c", PROBE.format(check=check)], env=env, cwd=cwd,
+                                   capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = (completed.stderr or completed.stdout).strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit code {completed.returncode}"}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["downloaded_mb"] = round((server.bytes_sent - sent_before) / 2 ** 20, 2)
+    return result
+
+def median_run(server: StubPostgrest, check: str, runs: int, module_dir: Optional[Path] = None) -> Dict[str, Any]:
+    results = [run_variant(server, check, module_dir) for _ in range(runs)]
+    if any("error" in result for result in results):
+        return next(result for result in results if "error" in result)
+    return {key: float(np.median([result[key] for result in results])) for key in results[0]}
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure crawler module cold start against a stub database')
+    parser.add_argument('--rows', type=int, default=2000, help='Rows in the stub deepseek_pages table')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per variant (median reported)')
+    parser.add_argument('--baseline-ref', help='Also import crawl_deepseek_docs.py as of this git ref')
+    parser.add_argument('--json', type=Path, default=None, help='Also write results to this file')
+    args = parser.parse_args()
+
+    server = StubPostgrest(args.rows)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results: List[Dict[str, Any]] = []
+    for name, check in CHECKS.items():
+        results.append({"variant": name, **median_run(server, check, args.runs)})
+    if args.baseline_ref:
+        with tempfile.TemporaryDirectory() as directory:
+            source = subprocess.run(["git", "show", f"{args.baseline_ref}:crawl_deepseek_docs.py"], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout
+            (Path(directory) / "crawl_deepseek_docs.py").write_text(source)
+            results.append({"variant": f"baseline ({args.baseline_ref})",
+                            **median_run(server, "", args.runs, Path(directory))})
+    server.shutdown()
+
+    columns = ["variant", "import_s", "check_s", "peak_rss_mb", "downloaded_mb"]
+    print(" | ".join(columns))
+    print(" | ".join("---" for _ in columns))
+    for result in results:
+        if "error" in result:
+            print(f"{result['variant']} | failed: {result['error']}")
+        else:
+            print(" | ".join(str(result[column]) for column in columns))
+
+    if args.json:
+        args.json.write_text(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
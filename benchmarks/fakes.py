@@ -0,0 +1,347 @@
+"""In-process stand-ins for OpenAI and Supabase, for benchmarks that run without credentials.
+
+`FakeOpenAI` embeds text by feature hashing its words, so texts that share
+words are close and results are identical on every run; its chat completions
+answer the title/summary prompt. `fake_agent_model` drives the agent through
+one retrieval call and a streamed answer. `FakeSupabase` keeps tables in memory
+and implements the query builder calls and RPCs the app uses, including
+`match_deepseek_pages`. Each fake can add a fixed latency per call to stand in
+for network round trips.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic_ai.messages import ModelMessage
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+from chunk_summaries import heuristic_title_and_summary
+from embedding_batcher import EMBEDDING_DIMENSIONS
+from lexical_index import tokenize
+
+class FakeEmbedder:
+    """Deterministic embeddings from hashed unigrams and bigrams."""
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        bucket = self._buckets.get(feature)
+        if bucket is None:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            bucket = self._buckets[feature] = (value % self.dimensions, 1.0 if value >> 63 else -1.0)
+        return bucket
+
+    def embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = tokenize(text)
+        for feature in itertools.chain(tokens, (f"{a} {b}" for a, b in zip(tokens, tokens[1:]))):
+            index, sign = self._bucket(feature)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+class FakeEmbeddings:
+    def __init__(self, embedder: FakeEmbedder, latency: float = 0.0):
+        self.embedder = embedder
+        self.latency = latency
+        self.requests = 0
+        self.inputs = 0
+
+    async def create(self, model: str, input: Any, **kwargs) -> Any:
+        inputs = [input] if isinstance(input, str) else list(input)
+        self.requests += 1
+        self.inputs += len(inputs)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=self.embedder.embed(text)) for i, text in enumerate(inputs)],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens)
+        )
+
+class FakeCompletions:
+    """Answers the crawler's title and summary prompt, one or many chunks per request."""
+
+    CHUNK_PATTERN = re.compile(r"^Chunk (\d+)\nURL: (\S+)\n\nContent:\n", re.M)
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> Any:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        matches = list(self.CHUNK_PATTERN.finditer(prompt))
+        chunks = []
+        for match, following in zip(matches, matches[1:] + [None]):
+            content = prompt[match.end():following.start() if following else len(prompt)]
+            extracted = heuristic_title_and_summary(content, match.group(2))
+            chunks.append({"index": int(match.group(1)), **extracted})
+        message = SimpleNamespace(content=json.dumps({"chunks": chunks}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+class FakeOpenAI:
+    """The parts of `AsyncOpenAI` used by the crawler and the agent."""
+
+    def __init__(self, embedding_latency: float = 0.0, chat_latency: float = 0.0):
+        self.embedder = FakeEmbedder()
+        self.embeddings = FakeEmbeddings(self.embedder, embedding_latency)
+        self.chat = SimpleNamespace(completions=FakeCompletions(chat_latency))
+
+    async def close(self):
+        pass
+
+def fake_agent_model(latency: float = 0.0, words_per_delta: int = 4) -> FunctionModel:
+    """Model that searches the docs once with the user's question, then streams an answer citing the hits.
+
+    Documentation already given in the system prompt is answered from directly.
+    """
+
+    async def stream(messages: List[ModelMessage], info: AgentInfo):
+        parts = messages[-1].parts
+        returns = [part for part in parts if part.part_kind == 'tool-return']
+        provided = [
+            part for message in messages for part in message.parts
+            if part.part_kind == 'system-prompt' and 'Source: ' in part.content
+        ]
+        if latency:
+            await asyncio.sleep(latency)
+        if not returns and not provided:
+            prompt = next(
+                part.content for message in reversed(messages) for part in message.parts
+                if part.part_kind == 'user-prompt'
+            )
+            yield {0: DeltaToolCall(name='retrieve_relevant_documentation',
+                                    json_args=json.dumps({'user_query': prompt}))}
+            return
+
+        sources = re.findall(r"Source: (\S+)", str((returns or provided)[-1].content))
+        words = ("According to the documentation, this is covered in the pages below. "
+                 + " ".join(f"See {url} for details." for url in dict.fromkeys(sources))).split(" ")
+        for start in range(0, len(words), words_per_delta):
+            yield " ".join(words[start:start + words_per_delta]) + " "
+
+    return FunctionModel(stream_function=stream)
+
+def resolve(row: Dict[str, Any], column: str) -> Any:
+    """Value of a column or a JSON path such as `metadata->>source`."""
+    parts = re.split(r"->>?", column)
+    value = row.get(parts[0])
+    for key in parts[1:]:
+        value = value.get(key) if isinstance(value, dict) else None
+    if "->>" in column and value is not None and not isinstance(value, str):
+        value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    return value
+
+class FakeQuery:
+    """A PostgREST request builder over one in-memory table."""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.columns: Optional[List[Tuple[str, str]]] = None
+        self.filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self.ordering: List[Tuple[str, bool]] = []
+        self.row_limit: Optional[int] = None
+        self.row_range: Optional[Tuple[int, int]] = None
+        self.operation = "select"
+        self.payload: Any = None
+        self.options: Dict[str, Any] = {}
+
+    def select(self, columns: str = "*", count: Any = None) -> "FakeQuery":
+        if columns.strip() != "*":
+            self.columns = []
+            for column in columns.split(","):
+                alias, _, path = column.strip().rpartition(":")
+                self.columns.append((alias or re.split(r"->>?", path)[-1], path))
+        self.options["count"] = count
+        return self
+
+    def _filter(self, column: str, test: Callable[[Any], bool]) -> "FakeQuery":
+        self.filters.append(lambda row: test(resolve(row, column)))
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda v: v == value)
+
+    def neq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda v: v != value)
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda v: v is not None and v > value)
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda v: v is not None and v >= value)
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda v: v is not None and v < value)
+
+    def in_(self, column: str, values: List[Any]) -> "FakeQuery":
+        values = set(values)
+        return self._filter(column, lambda v: v in values)
+
+    def order(self, column: str, desc: bool = False) -> "FakeQuery":
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        self.row_limit = count
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self.row_range = (start, end)
+        return self
+
+    def upsert(self, rows: Any, on_conflict: str = "", ignore_duplicates: bool = False, **options) -> "FakeQuery":
+        self.operation = "upsert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        self.options.update(options, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates)
+        return self
+
+    def update(self, values: Dict[str, Any]) -> "FakeQuery":
+        self.operation, self.payload = "update", values
+        return self
+
+    def delete(self) -> "FakeQuery":
+        self.operation = "delete"
+        return self
+
+    def execute(self) -> Any:
+        return self.db._execute(self)
+
+class FakeSupabase:
+    """In-memory tables and RPCs behind the supabase-py interface.
+
+    Writes are serialized with a lock, since the app calls the client from
+    worker threads. `latency` seconds are slept on every request.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.corpus_version = 0
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._matrix: Optional[Tuple[np.ndarray, List[Dict[str, Any]]]] = None
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> Any:
+        return SimpleNamespace(execute=lambda: self._rpc(name, params))
+
+    def _pause(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _execute(self, query: FakeQuery) -> Any:
+        self._pause()
+        with self._lock:
+            rows = self.tables.setdefault(query.table, [])
+            if query.operation == "upsert":
+                return self._upsert(rows, query)
+
+            matched = [row for row in rows if all(test(row) for test in query.filters)]
+            if query.operation == "update":
+                for row in matched:
+                    row.update(query.payload)
+                self._matrix = None
+                return SimpleNamespace(data=[dict(row) for row in matched], count=len(matched))
+            if query.operation == "delete":
+                ids = {id(row) for row in matched}
+                rows[:] = [row for row in rows if id(row) not in ids]
+                self._matrix = None
+                return SimpleNamespace(data=[], count=len(matched))
+
+            for column, desc in reversed(query.ordering):
+                matched.sort(key=lambda row: (resolve(row, column) is None, resolve(row, column)), reverse=desc)
+            count = len(matched)
+            if query.row_range:
+                matched = matched[query.row_range[0]:query.row_range[1] + 1]
+            if query.row_limit is not None:
+                matched = matched[:query.row_limit]
+            if query.columns is not None:
+                matched = [{alias: resolve(row, path) for alias, path in query.columns} for row in matched]
+            else:
+                matched = [dict(row) for row in matched]
+            return SimpleNamespace(data=matched, count=count if query.options.get("count") else None)
+
+    def _upsert(self, rows: List[Dict[str, Any]], query: FakeQuery) -> Any:
+        keys = [key.strip() for key in query.options["on_conflict"].split(",") if key.strip()]
+        existing = {tuple(row.get(key) for key in keys): row for row in rows} if keys else {}
+        written = 0
+        for new in query.payload:
+            row = existing.get(tuple(new.get(key) for key in keys)) if keys else None
+            if row is None:
+                row = {"id": next(self._ids), **new}
+                rows.append(row)
+                if keys:
+                    existing[tuple(new.get(key) for key in keys)] = row
+                written += 1
+            elif not query.options["ignore_duplicates"]:
+                row.update(new)
+                written += 1
+        self._matrix = None
+        return SimpleNamespace(data=[], count=written)
+
+    def _rpc(self, name: str, params: Dict[str, Any]) -> Any:
+        self._pause()
+        if name == "bump_corpus_version":
+            with self._lock:
+                self.corpus_version += 1
+                self.tables["deepseek_corpus_version"] = [{"id": 1, "version": self.corpus_version}]
+            return SimpleNamespace(data=self.corpus_version)
+        if name == "match_deepseek_pages":
+            return SimpleNamespace(data=self.match_pages(**params))
+        raise ValueError(f"Unknown RPC {name}")
+
+    def match_pages(
+        self,
+        query_embedding: List[float],
+        match_count: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        match_threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Exact cosine search over deepseek_pages, like the SQL function."""
+        with self._lock:
+            if self._matrix is None:
+                rows = list(self.tables.get("deepseek_pages", []))
+                matrix = np.asarray([row["embedding"] for row in rows], dtype=np.float32).reshape(len(rows), -1)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                self._matrix = (matrix / np.where(norms == 0, 1, norms), rows)
+            matrix, rows = self._matrix
+
+        if not rows:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        similarities = matrix @ (query / (np.linalg.norm(query) or 1))
+        if filter:
+            # jsonb containment on metadata (metadata @> filter)
+            mask = np.array([all((row.get("metadata") or {}).get(k) == v for k, v in filter.items()) for row in rows])
+            similarities = np.where(mask, similarities, -np.inf)
+        if match_threshold is not None:
+            similarities = np.where(similarities > match_threshold, similarities, -np.inf)
+        order = np.argsort(-similarities)[:match_count]
+        return [
+            {**{key: rows[i][key] for key in ("id", "url", "chunk_number", "title", "summary", "content", "metadata")},
+             "similarity": float(similarities[i])}
+            for i in order if np.isfinite(similarities[i])
+        ]
@@ -0,0 +1,225 @@
+"""Pages per second, peak memory and bytes received for the crawler's HTTP fetch tier.
+
+Serves the pages of benchmarks/data/corpus.json from a local server, each
+wrapped in a Docusaurus-style page (navigation, sidebar, footer, scripts), plus
+`--js-pages` client-rendered shells with no text in the HTML. Two passes are
+fetched through `HttpFetcher`:
+
+- `cold`: no stored validators, as in a full crawl,
+- `revalidate`: the ETag and Last-Modified from the first pass sent back, as
+  in an incremental crawl, so unchanged pages come back as 304s.
+
+It also reports how many of each page's words survive the HTML to markdown
+conversion, which is crawl4ai's, so crawl4ai must be installed. The browser
+fallback is not run here; `crawl_deepseek_docs.py --fetch browser` reports the
+same pages/s and peak memory for Chromium.
+
+    python -m benchmarks.fetch_throughput --copies 20 --js-pages 10
+"""
+import argparse
+import asyncio
+import hashlib
+import html
+import json
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from page_fetcher import FetchResult, HttpFetcher, memory_mb
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title} | DeepSeek API Docs</title>
+<link rel="stylesheet" href="/assets/css/styles.css"><script src="/assets/js/runtime.js" defer></script></head>
+<body><div id="__docusaurus"><nav class="navbar"><a href="/">DeepSeek API Docs</a><a href="/news">News</a></nav>
+<div class="main-wrapper"><aside class="theme-doc-sidebar-container"><ul>{sidebar}</ul></aside>
+<main class="docMainContainer"><div class="container"><article><div class="theme-doc-markdown markdown">
+{body}
+</div></article></div></main></div>
+<footer class="footer">Copyright © 2025 DeepSeek, Inc.</footer></div>
+<script>window.__DATA__ = {{"route": "{path}"}};</script></body></html>"""
+
+JS_PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>Loading</title></head>
+<body><div id="root"></div><script src="/assets/js/app.js"></script></body></html>"""
+
+def inline(text: str) -> str:
+    text = html.escape(text, quote=False)
+    text = re.sub(r"`([^`]+)`", r"<code>\1</code>", text)
+    text = re.sub(r"\*\*([^*]+)\*\*", r"<strong>\1</strong>", text)
+    return re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r'<a href="\2">\1</a>', text)
+
+def markdown_to_html(markdown: str) -> str:
+    """Just enough of markdown for the benchmark corpus: headings, fences, lists and paragraphs."""
+    out: List[str] = []
+    in_code = in_list = False
+    for line in markdown.split("\n"):
+        if line.startswith("```"):
+            if in_code:
+                out.append("</code></pre>")
+            else:
+                language = line[3:].strip()
+                out.append(f'<pre class="prism-code language-{language}"><code>' if language else "<pre><code>")
+            in_code = not in_code
+            continue
+        if in_code:
+            out.append(html.escape(line, quote=False) + "\n")
+            continue
+        if in_list and not line.startswith("- "):
+            out.append("</ul>")
+            in_list = False
+        heading = re.match(r"(#{1,6}) (.*)", line)
+        if heading:
+            level = len(heading.group(1))
+            out.append(f'<h{level}>{inline(heading.group(2))}<a class="hash-link" href="#x">#</a></h{level}>')
+        elif line.startswith("- "):
+            if not in_list:
+                out.append("<ul>")
+                in_list = True
+            out.append(f"<li>{inline(line[2:])}</li>")
+        elif line.strip():
+            out.append(f"<p>{inline(line)}</p>")
+    if in_list:
+        out.append("</ul>")
+    return "\n".join(out)
+
+class DocsServer(ThreadingHTTPServer):
+    """Static pages with ETag and Last-Modified validators that honors conditional requests."""
+
+    def __init__(self, pages: Dict[str, bytes]):
+        super().__init__(("127.0.0.1", 0), DocsHandler)
+        self.pages = pages
+        self.etags = {path: '"' + hashlib.sha1(body).hexdigest()[:16] + '"' for path, body in pages.items()}
+        self.last_modified = formatdate(time.time() - 86400, usegmt=True)
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class DocsHandler(BaseHTTPRequestHandler):
+    server: DocsServer
+    protocol_version = "HTTP/1.1"  # Keep-alive, as documentation hosts serve it
+
+    def log_message(self, *args: Any):
+        pass
+
+    def do_GET(self):
+        body = self.server.pages.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = self.server.etags[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.server.last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+def build_pages(copies: int, js_pages: int) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+    """Served pages by path, and the source markdown of each static page by path."""
+    corpus = json.loads((DATA_DIR / "corpus.json").read_text())
+    sources: Dict[str, str] = {}
+    pages: Dict[str, bytes] = {}
+    sidebar = "".join(f'<li><a href="/p{i}">Page {i}</a></li>' for i in range(len(corpus)))
+    for copy in range(copies):
+        for i, entry in enumerate(corpus):
+            path = f"/p{i}-{copy}"
+            title = entry["markdown"].split("\n", 1)[0].lstrip("# ")
+            pages[path] = PAGE.format(title=html.escape(title), sidebar=sidebar, path=path,
+                                      body=markdown_to_html(entry["markdown"])).encode()
+            sources[path] = entry["markdown"]
+    for i in range(js_pages):
+        pages[f"/app-{i}"] = JS_PAGE.encode()
+    return pages, sources
+
+def word_recall(source: str, converted: str) -> float:
+    """Share of the source markdown's words that appear in the converted markdown."""
+    words = re.findall(r"\w+", source.lower())
+    found = set(re.findall(r"\w+", converted.lower()))
+    return sum(word in found for word in words) / len(words) if words else 1.0
+
+async def fetch_all(fetcher: HttpFetcher, urls: List[str], concurrency: int,
+                    validators: Optional[Dict[str, FetchResult]] = None) -> Dict[str, FetchResult]:
+    semaphore = asyncio.Semaphore(concurrency)
+    results: Dict[str, FetchResult] = {}
+
+    async def fetch(url: str):
+        previous = validators.get(url) if validators else None
+        async with semaphore:
+            results[url] = await fetcher.fetch(url, previous and previous.etag, previous and previous.last_modified)
+
+    await asyncio.gather(*(fetch(url) for url in urls))
+    return results
+
+async def run_pass(name: str, server: DocsServer, urls: List[str], args,
+                   validators: Optional[Dict[str, FetchResult]] = None) -> Tuple[Dict[str, Any], Dict[str, FetchResult]]:
+    # HTTP/1.1 here since the stdlib server does not speak HTTP/2; the crawler negotiates it with real hosts
+    fetcher = HttpFetcher(max_connections=args.concurrency, min_markdown_chars=args.min_markdown_chars)
+    sent_before = server.bytes_sent
+    started = time.perf_counter()
+    results = await fetch_all(fetcher, urls, args.concurrency, validators)
+    seconds = time.perf_counter() - started
+    await fetcher.close()
+    return {
+        "pass": name,
+        "pages": len(urls),
+        "pages_per_s": round(len(urls) / seconds, 1),
+        **fetcher.counts,
+        "received_mb": round((server.bytes_sent - sent_before) / 2 ** 20, 2),
+        "peak_mb": round(memory_mb(), 1),
+    }, results
+
+async def run(args) -> List[Dict[str, Any]]:
+    pages, sources = build_pages(args.copies, args.js_pages)
+    server = DocsServer(pages)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [server.base_url + path for path in pages]
+
+    cold, results = await run_pass("cold", server, urls, args)
+    recalls = [word_recall(sources[path], results[server.base_url + path].markdown) for path in sources]
+    cold["word_recall"] = round(min(recalls), 3)
+    revalidate, _ = await run_pass("revalidate", server, urls, args, results)
+    server.shutdown()
+    return [cold, revalidate]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the crawler's HTTP fetch tier against a local server")
+    parser.add_argument('--copies', type=int, default=20, help='Copies of the benchmark corpus to serve')
+    parser.add_argument('--js-pages', type=int, default=10, help='Client-rendered pages to serve (left to the browser)')
+    parser.add_argument('--concurrency', type=int, default=10, help='Pages fetched at once')
+    parser.add_argument('--min-markdown-chars', type=int, default=200)
+    parser.add_argument('--json', type=Path, default=None, help='Also write results to this file')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    columns = ["pass", "pages", "pages_per_s", "fetched", "not_modified", "fallback", "received_mb", "peak_mb"]
+    print(" | ".join(columns))
+    print(" | ".join("---" for _ in columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+    print(f"Lowest share of a page's words kept in its markdown: {results[0]['word_recall']}")
+
+    if args.json:
+        args.json.write_text(json.dumps({"config": vars(args) | {"json": str(args.json)}, "results": results},
+                                        indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""Offline benchmarks of ingest, retrieval and /api/chat, with no OpenAI or Supabase access.
+
+Runs the real chunker, summarizer, embedding batcher, chunk writer, agent tools
+and ASGI app against the stand-ins in benchmarks/fakes.py, on the labeled
+corpus and queries in benchmarks/data (plus optional synthetic distractor
+pages, or the pages of a corpus snapshot). Reports:
+
+- chunking throughput and ingest throughput in chunks/s,
+- retrieve_relevant_documentation p50/p95 latency and recall@k/MRR over the
+  labeled queries, for RPC vector search, hybrid search and the local index,
+- /api/chat p50/p95 latency and time to the first streamed delta.
+
+Results are written as JSON with the commit they were measured on, and
+`--compare` prints the change against an earlier results file:
+
+    python -m benchmarks.offline_suite --json bench.json --compare baseline.json
+"""
+import os
+import tempfile
+
+# The app reads its configuration at import time. Point the embedding cache at a
+# scratch file and turn off local indexes and session storage before importing it;
+# the clients created from the dummy credentials are replaced by the fakes below.
+SCRATCH_DIR = tempfile.mkdtemp(prefix="offline-bench-")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(SCRATCH_DIR, "embeddings.sqlite3")
+for name in ("VECTOR_SNAPSHOT_DIR", "LEXICAL_INDEX_PATH", "SESSION_DB_PATH"):
+    os.environ[name] = ""
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "offline.benchmark.key")
+os.environ.setdefault("LOGFIRE_CONSOLE", "false")
+
+import argparse
+import asyncio
+import json
+import re
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.chunking_benchmark import make_document
+from benchmarks.fakes import FakeOpenAI, FakeSupabase, fake_agent_model
+from chunk_summaries import SUMMARY_MODES, ChunkSummarizer
+from chunk_writer import ChunkWriter
+from chunking import chunk_text, make_token_counter
+from corpus_snapshot import CorpusSnapshot
+from embedding_batcher import EmbeddingBatcher
+from ingest_pipeline import Pipeline, Stage
+from lexical_index import build_lexical_index
+from retrieval_prefetch import PREFETCH_MODES
+from vector_index import LocalVectorIndex, export_snapshot
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    values = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+        return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_documents(args) -> List[Tuple[str, str]]:
+    """Labeled pages (or a corpus snapshot's pages) plus synthetic distractors."""
+    if args.corpus_snapshot:
+        snapshot = CorpusSnapshot.load(args.corpus_snapshot)
+        documents = [(url, snapshot.page_text(url)) for url in dict.fromkeys(snapshot.urls)]
+    else:
+        documents = [(page["url"], page["markdown"]) for page in json.loads((DATA_DIR / "corpus.json").read_text())]
+    documents += [
+        (f"https://api-docs.deepseek.com/synthetic/page-{i}", make_document(args.distractor_size, seed=i))
+        for i in range(args.distractors)
+    ]
+    return documents
+
+def bench_chunking(documents: List[Tuple[str, str]]) -> Dict[str, Any]:
+    chars = sum(len(markdown) for _, markdown in documents)
+    started = time.perf_counter()
+    chunks = sum(len(chunk_text(markdown)) for _, markdown in documents)
+    seconds = time.perf_counter() - started
+    return {"chunks": chunks, "seconds": round(seconds, 4), "mb_per_sec": round(chars / seconds / 1e6, 3)}
+
+async def bench_ingest(documents: List[Tuple[str, str]], supabase: FakeSupabase, openai: FakeOpenAI, args) -> Dict[str, Any]:
+    """Chunk, summarize, embed and write every document through the crawler's stages."""
+    from deepseek_agent import embedding_cache
+
+    summarizer = ChunkSummarizer(openai, mode=args.summaries)
+    batcher = EmbeddingBatcher(openai)
+    writer = ChunkWriter(supabase, update_existing=True)
+    chunk_count = 0
+
+    async def chunk(document: Tuple[str, str]) -> List[Any]:
+        nonlocal chunk_count
+        url, markdown = document
+        page = SimpleNamespace(url=url, chunks=chunk_text(markdown), rows=[])
+        page.remaining = len(page.chunks)
+        chunk_count += len(page.chunks)
+        return [(page, i, content) for i, content in enumerate(page.chunks)]
+
+    async def summarize(job: Tuple[Any, int, str]) -> List[Any]:
+        page, _, content = job
+        return [(job, await summarizer.summarize(content, page.url))]
+
+    async def embed(item: Tuple[Tuple[Any, int, str], Dict[str, str]]) -> List[Any]:
+        (page, i, content), extracted = item
+        embedding = await batcher.embed(content)
+        # Like the crawler, leave chunk vectors in the cache the agent shares
+        embedding_cache.put(content, embedding)
+        page.rows.append({
+            "url": page.url,
+            "chunk_number": i,
+            "title": extracted["title"],
+            "summary": extracted["summary"],
+            "content": content,
+            "metadata": {"source": "deepseek_docs", "chunk_size": len(content)},
+            "embedding": embedding,
+        })
+        page.remaining -= 1
+        return [page] if page.remaining == 0 else []
+
+    async def write(page: Any) -> List[Any]:
+        await writer.write(page.rows)
+        title = next((row["title"] for row in page.rows if row["chunk_number"] == 0), None)
+        await asyncio.to_thread(lambda: supabase.table("deepseek_page_state").upsert({
+            "url": page.url, "title": title, "source": "deepseek_docs", "lastmod": None,
+            "page_hash": "", "chunk_count": len(page.rows), "updated_at": datetime.now(timezone.utc).isoformat()
+        }, on_conflict="url").execute())
+        return []
+
+    pipeline = Pipeline([
+        Stage("chunk", chunk, workers=4),
+        Stage("summarize", summarize, workers=20),
+        Stage("embed", embed, workers=64),
+        Stage("write", write, workers=4),
+    ], report_interval=None)
+    await pipeline.run(documents)
+    await batcher.flush()
+    supabase.rpc("bump_corpus_version", {}).execute()
+
+    return {
+        "pages": len(documents),
+        "chunks": chunk_count,
+        "seconds": round(pipeline.seconds, 4),
+        "chunks_per_sec": round(chunk_count / pipeline.seconds, 1),
+        "embedding_requests": batcher.requests_sent,
+        "summary_requests": summarizer.requests_sent,
+    }
+
+def retrieval_quality(results: List[List[str]], queries: List[Dict[str, Any]], k: int) -> Dict[str, float]:
+    """Mean recall@k and MRR of ranked URL lists against the labeled relevant URLs."""
+    recalls, reciprocal_ranks = [], []
+    for urls, query in zip(results, queries):
+        relevant = set(query["relevant"])
+        ranked = list(dict.fromkeys(urls))[:k]
+        recalls.append(len(relevant & set(ranked)) / len(relevant))
+        rank = next((i + 1 for i, url in enumerate(ranked) if url in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {f"recall@{k}": round(float(np.mean(recalls)), 4), "mrr": round(float(np.mean(reciprocal_ranks)), 4)}
+
+async def bench_retrieval(supabase: FakeSupabase, openai: FakeOpenAI, queries: List[Dict[str, Any]], args) -> Tuple[Dict[str, Any], Any]:
+    """Latency of retrieve_relevant_documentation and quality of its ranking, per search backend."""
+    from deepseek_agent import DeepSeekDeps, hybrid_search, retrieve_relevant_documentation
+
+    lexical_index = await asyncio.to_thread(build_lexical_index, supabase, Path(SCRATCH_DIR) / "lexical_index.npz")
+    snapshot_root = Path(SCRATCH_DIR) / "snapshots"
+    await asyncio.to_thread(export_snapshot, supabase, snapshot_root)
+    backends = {
+        "rpc": DeepSeekDeps(supabase=supabase, openai_client=openai),
+        "hybrid": DeepSeekDeps(supabase=supabase, openai_client=openai, lexical_index=lexical_index),
+        "local": DeepSeekDeps(supabase=supabase, openai_client=openai, vector_index=LocalVectorIndex(snapshot_root)),
+    }
+
+    count_tokens = make_token_counter()
+    results = {}
+    for name, deps in backends.items():
+        ranked = [[doc["url"] for doc in await hybrid_search(deps, query["query"], args.k)] for query in queries]
+        context = SimpleNamespace(deps=deps)
+        seconds = []
+        for _ in range(args.rounds):
+            for query in queries:
+                started = time.perf_counter()
+                output = await retrieve_relevant_documentation(context, query["query"])
+                seconds.append(time.perf_counter() - started)
+
+        # What the model actually receives: its size, and how many relevant pages it covers
+        tokens, covered = [], []
+        for query in queries:
+            output = await retrieve_relevant_documentation(context, query["query"])
+            tokens.append(count_tokens(output))
+            sources = set(re.findall(r"Source: (\S+)", output))
+            covered.append(len(sources & set(query["relevant"])) / len(query["relevant"]))
+        results[name] = {
+            **latency_stats(seconds),
+            **retrieval_quality(ranked, queries, args.k),
+            "context_tokens": round(float(np.mean(tokens)), 1),
+            "context_recall": round(float(np.mean(covered)), 4),
+        }
+    return results, lexical_index
+
+async def bench_chat(supabase: FakeSupabase, openai: FakeOpenAI, lexical_index: Any, queries: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """End-to-end /api/chat latency through the ASGI app, and time to the first streamed delta."""
+    from answer_cache import AnswerCache
+    from api import chat_service
+    from api.asgi import app
+    from deepseek_agent import agentic_rag
+    from page_catalog import PageCatalog
+    from telemetry import TimedModel, prefetch_summary
+
+    chat_service.supabase = supabase
+    chat_service.openai_client = openai
+    chat_service.vector_index = None
+    chat_service.lexical_index = lexical_index
+    chat_service.page_catalog = PageCatalog(supabase)
+    # Similarity never exceeds 1, so a threshold of 2 measures every request uncached
+    chat_service.answer_cache = AnswerCache(threshold=1.0 if args.answer_cache else 2.0)
+    chat_service.prefetch_mode = args.prefetch
+    chat_service.coalesce_chats = args.coalesce
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    with agentic_rag.override(model=TimedModel(fake_agent_model(latency=args.llm_latency / 1000))):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://offline") as client:
+            async def ask(query: str) -> float:
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post("/api/chat", json={"message": query})
+                    response.raise_for_status()
+                    return time.perf_counter() - started
+
+            started = time.perf_counter()
+            seconds = []
+            for _ in range(args.rounds):
+                seconds += await asyncio.gather(*[ask(query["query"]) for query in queries])
+            wall = time.perf_counter() - started
+
+            # The same new question from many users at once, as after a docs link goes out
+            burst_query = f"{queries[0]['query']} (burst)"
+            embedding_requests, db_requests = openai.embeddings.requests, supabase.requests
+            started = time.perf_counter()
+            burst_seconds = await asyncio.gather(*[ask(burst_query) for _ in range(args.burst)])
+            burst = {
+                **latency_stats(burst_seconds),
+                "wall_seconds": round(time.perf_counter() - started, 3),
+                "embedding_requests": openai.embeddings.requests - embedding_requests,
+                "db_requests": supabase.requests - db_requests,
+                "single_flight": chat_service.single_flight_summary(),
+            }
+
+        first_delta = []
+        for query in queries:
+            started = time.perf_counter()
+            async for event in chat_service.stream_agent_response(query["query"]):
+                if "delta" in event and len(first_delta) == queries.index(query):
+                    first_delta.append(time.perf_counter() - started)
+    return {
+        **latency_stats(seconds),
+        "requests_per_sec": round(len(seconds) / wall, 2),
+        "first_delta": latency_stats(first_delta),
+        "burst": burst,
+        "prefetch": prefetch_summary() if args.prefetch != "off" else {},
+    }
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    """Print every metric next to its baseline value and the relative change."""
+    old, new = flatten(baseline.get("metrics", {})), flatten(current["metrics"])
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('created_at')}):")
+    print(f"{'metric':40} {'baseline':>12} {'current':>12} {'change':>9}")
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key)
+        change = f"{(after - before) / before:+.1%}" if before and after is not None else ""
+        print(f"{key:40} {before if before is not None else '-':>12} {after if after is not None else '-':>12} {change:>9}")
+
+async def run(args) -> Dict[str, Any]:
+    documents = load_documents(args)
+    queries = json.loads((args.queries or DATA_DIR / "queries.json").read_text())
+    urls = {url for url, _ in documents}
+    queries = [query for query in queries if set(query["relevant"]) & urls]
+
+    supabase = FakeSupabase(latency=args.db_latency / 1000)
+    openai = FakeOpenAI(embedding_latency=args.embedding_latency / 1000, chat_latency=args.llm_latency / 1000)
+
+    metrics = {"chunking": bench_chunking(documents)}
+    metrics["ingest"] = await bench_ingest(documents, supabase, openai, args)
+    print(f"Ingested {metrics['ingest']['chunks']} chunks from {len(documents)} pages; "
+          f"{len(queries)} labeled queries")
+    metrics["retrieval"], lexical_index = await bench_retrieval(supabase, openai, queries, args)
+    metrics["chat"] = await bench_chat(supabase, openai, lexical_index, queries, args)
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest, retrieval and chat benchmarks")
+    parser.add_argument("--queries", type=Path, help="Labeled queries (default benchmarks/data/queries.json)")
+    parser.add_argument("--corpus-snapshot", type=Path, help="Use the pages of a corpus snapshot instead of the labeled corpus")
+    parser.add_argument("--distractors", type=int, default=50, help="Synthetic pages added to the corpus")
+    parser.add_argument("--distractor-size", type=int, default=20_000, help="Characters per synthetic page")
+    parser.add_argument("--summaries", choices=SUMMARY_MODES, default="auto", help="Title and summary mode for ingest")
+    parser.add_argument("--k", type=int, default=5, help="Results per query for recall@k and MRR")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each query is timed")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent /api/chat requests")
+    parser.add_argument("--embedding-latency", type=float, default=20, help="Simulated ms per embedding request")
+    parser.add_argument("--llm-latency", type=float, default=50, help="Simulated ms per model request")
+    parser.add_argument("--db-latency", type=float, default=5, help="Simulated ms per database request")
+    parser.add_argument("--prefetch", choices=PREFETCH_MODES, default="off",
+                        help="Speculative retrieval mode for /api/chat")
+    parser.add_argument("--coalesce", action="store_true", help="Let identical concurrent /api/chat requests share one agent run")
+    parser.add_argument("--burst", type=int, default=8, help="Identical /api/chat requests sent at once")
+    parser.add_argument("--answer-cache", action="store_true", help="Let /api/chat serve repeated questions from the answer cache")
+    parser.add_argument("--json", type=Path, help="Write the results to this file")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    config = {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()}
+    metrics = asyncio.run(run(args))
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": config,
+        "metrics": metrics,
+    }
+    print(json.dumps(metrics, indent=2))
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Recall@k vs. memory and latency of quantized search against exact search.
+
+Times `LocalVectorIndex.search` itself for each configuration, on a published
+vector snapshot (see vector_index.py) or on `--synthetic` random unit vectors.
+For each coarse dimension the snapshot's codes are rebuilt in a temporary copy
+that links to the same embeddings. Queries are corpus vectors with Gaussian
+noise added, so no embedding calls are needed:
+
+    python -m benchmarks.quantization_report --snapshot snapshots --k 5
+    python -m benchmarks.quantization_report --synthetic 5000
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from embedding_batcher import EMBEDDING_DIMENSIONS
+from vector_index import CURRENT_FILE, LocalVectorIndex, Snapshot, build_codes, publish_snapshot
+
+def make_queries(embeddings: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), size=min(count, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[np.sort(rows)]) + rng.normal(0, noise, (len(rows), embeddings.shape[1]))
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+def write_synthetic(directory: Path, count: int, seed: int):
+    """A snapshot of `count` random unit vectors with empty contents."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(count, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    directory.mkdir(parents=True)
+    embeddings.tofile(directory / "embeddings.f32")
+    (directory / "content.bin").write_bytes(b"")
+    meta = {
+        "ids": list(range(1, count + 1)),
+        "urls": [f"https://example.com/{i}" for i in range(count)],
+        "chunk_numbers": [0] * count,
+        "titles": [""] * count,
+        "summaries": [""] * count,
+        "metadata": [{}] * count,
+        "count": count,
+        "dimensions": EMBEDDING_DIMENSIONS,
+        "content_offsets": [0] * (count + 1),
+    }
+    (directory / "meta.json").write_text(json.dumps(meta))
+
+def with_codes(source: Path, root: Path, dimensions: int) -> Path:
+    """Publish a copy of `source` under `root` whose codes are built from `dimensions` components."""
+    directory = root / f"coarse-{dimensions}"
+    directory.mkdir(parents=True)
+    for name in ("embeddings.f32", "content.bin"):
+        os.symlink((source / name).resolve(), directory / name)
+    meta = json.loads((source / "meta.json").read_text())
+    build_codes(directory, meta, dimensions)
+    (directory / "meta.json").write_text(json.dumps(meta))
+    publish_snapshot(root, directory.name, keep=1)
+    return root
+
+def evaluate(
+    index: LocalVectorIndex,
+    queries: np.ndarray,
+    exact: List[set],
+    k: int
+) -> Dict[str, Any]:
+    """Search every query through `index` and compare it to the exact top-k ids."""
+    snapshot = index._snapshot
+    if index.quantization is None:
+        memory = snapshot.embeddings.nbytes
+    elif index.quantization == "int8":
+        memory = snapshot.int8_codes.nbytes + snapshot.int8_scale.nbytes
+    else:
+        memory = snapshot.binary_codes.nbytes
+
+    index.search(queries[0], k)  # Faults the memory maps in
+    latencies, recalls = [], []
+    for query, expected in zip(queries, exact):
+        started = time.perf_counter()
+        found = index.search(query, k, match_threshold=-1)
+        latencies.append(time.perf_counter() - started)
+        recalls.append(len(expected.intersection(row["id"] for row in found)) / len(expected))
+
+    return {
+        "quantization": index.quantization or "exact",
+        "dimensions": snapshot.meta["coarse_dimensions"] if index.quantization else snapshot.meta["dimensions"],
+        "rescore_factor": index.rescore_factor if index.quantization else None,
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "memory_mb": round(memory / 2 ** 20, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare quantized and exact vector search')
+    parser.add_argument('--snapshot', type=Path, default=Path(os.getenv("VECTOR_SNAPSHOT_DIR", "snapshots")),
+                        help='Snapshot root directory (containing CURRENT) or a snapshot directory')
+    parser.add_argument('--synthetic', type=int, default=None,
+                        help='Search this many random unit vectors instead of a snapshot')
+    parser.add_argument('--queries', type=int, default=200, help='Number of sampled queries')
+    parser.add_argument('--noise', type=float, default=0.02, help='Std-dev of noise added to each query')
+    parser.add_argument('--k', type=int, default=5, help='Number of results per query')
+    parser.add_argument('--rescore-factor', type=int, default=10, help='Candidates rescored per result')
+    parser.add_argument('--dimensions', type=int, nargs='+', default=[1536, 512, 256],
+                        help='Matryoshka dimensions to test for the coarse codes')
+    parser.add_argument('--json', type=Path, default=None, help='Also write results to this file')
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="quantization-report-"))
+    try:
+        if args.synthetic:
+            directory = work / "synthetic"
+            write_synthetic(directory, args.synthetic, seed=0)
+        else:
+            directory = args.snapshot
+            if (directory / CURRENT_FILE).exists():
+                directory = directory / (directory / CURRENT_FILE).read_text().strip()
+        snapshot = Snapshot.open(directory)
+        # Load into RAM so the page cache doesn't skew the first configuration
+        embeddings = np.asarray(snapshot.embeddings)
+        ids = np.asarray(snapshot.meta["ids"])
+        print(f"Snapshot {snapshot.name}: {len(embeddings)} chunks x {embeddings.shape[1]} dimensions")
+
+        queries = make_queries(embeddings, args.queries, args.noise, seed=0)
+        exact = [set(ids[np.argsort(-(embeddings @ q))[:args.k]].tolist()) for q in queries]
+
+        results = []
+        for dimensions in args.dimensions:
+            root = with_codes(directory, work / f"root-{dimensions}", dimensions)
+            if not results:
+                results.append(evaluate(LocalVectorIndex(root), queries, exact, args.k))
+            for quantization in ("int8", "binary"):
+                index = LocalVectorIndex(root, quantization=quantization, rescore_factor=args.rescore_factor)
+                results.append(evaluate(index, queries, exact, args.k))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    columns = list(results[0])
+    print(" | ".join(columns))
+    print(" | ".join("---" for _ in columns))
+    for result in results:
+        print(" | ".join("" if result[c] is None else str(result[c]) for c in columns))
+
+    if args.json:
+        args.json.write_text(json.dumps({"snapshot": snapshot.name, "queries": len(queries), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Vector search latency as the number of corpus sources in one index grows.
+
+Builds synthetic snapshots holding 1, 2, 4, ... sources of the same size and
+times, for each, a search restricted to one source (pushed down: only that
+source's rows are scored), the same search filtered after scoring every row
+(how filtered searches used to run) and an unfiltered search over all sources:
+
+    python -m benchmarks.source_scaling --sources 1 2 4 8 16 --chunks-per-source 2000
+
+Against Postgres the equivalent check is `explain analyze` of
+`match_deepseek_pages` with a `{"source": ...}` filter, which should show the
+source's partial ivfflat index (see create_source_index in setup_db.sql).
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from embedding_batcher import EMBEDDING_DIMENSIONS
+from quantization import top_k
+from vector_index import LocalVectorIndex, build_codes, group_by_source, publish_snapshot
+
+def write_snapshot(root: Path, sources: int, chunks_per_source: int, seed: int, interleaved: bool) -> np.ndarray:
+    """Publish a snapshot of random unit vectors, sources interleaved by id like a shared table.
+
+    Exports group the rows by source, unless `interleaved` keeps the table order.
+    """
+    rng = np.random.default_rng(seed)
+    count = sources * chunks_per_source
+    embeddings = rng.normal(size=(count, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    directory = root / f"sources-{sources}"
+    directory.mkdir(parents=True)
+    embeddings.tofile(directory / "embeddings.f32")
+    (directory / "content.bin").write_bytes(b"x" * count)
+    meta = {
+        "ids": list(range(1, count + 1)),
+        "urls": [f"https://example.com/{i % sources}/{i}" for i in range(count)],
+        "chunk_numbers": [0] * count,
+        "titles": [""] * count,
+        "summaries": [""] * count,
+        "metadata": [{"source": f"source-{i % sources}"} for i in range(count)],
+        "count": count,
+        "dimensions": EMBEDDING_DIMENSIONS,
+        "content_offsets": list(range(count + 1)),
+    }
+    if not interleaved:
+        group_by_source(directory, meta)
+    build_codes(directory, meta, coarse_dimensions=512)
+    (directory / "meta.json").write_text(json.dumps(meta))
+    publish_snapshot(root, directory.name, keep=1)
+    return embeddings
+
+def time_search(search: Callable[[np.ndarray], Any], queries: np.ndarray) -> Dict[str, float]:
+    search(queries[0])  # Builds the per-filter caches
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - started)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+    }
+
+def measure(sources: int, args) -> Dict[str, Any]:
+    root = Path(tempfile.mkdtemp(prefix="source-scaling-"))
+    embeddings = write_snapshot(root, sources, args.chunks_per_source, args.seed, args.interleaved)
+    rng = np.random.default_rng(args.seed + 1)
+    # Queries near chunks of the searched source
+    rows = rng.choice(np.arange(0, len(embeddings), sources), size=args.queries)
+    queries = embeddings[rows] + rng.normal(0, 0.02, (args.queries, embeddings.shape[1])).astype(np.float32)
+    source = {"source": "source-0"}
+
+    result: Dict[str, Any] = {"sources": sources, "chunks": len(embeddings)}
+    for quantization in (None, "int8"):
+        index = LocalVectorIndex(root, quantization=quantization)
+        label = quantization or "exact"
+        result[f"{label}_source"] = time_search(lambda q: index.search(q, args.k, filter=source), queries)
+        result[f"{label}_all"] = time_search(lambda q: index.search(q, args.k), queries)
+
+    mask = np.array([i % sources == 0 for i in range(len(embeddings))])
+    result["exact_post_filter"] = time_search(
+        lambda q: top_k(np.where(mask, embeddings @ q, -np.inf), args.k), queries)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Search latency against the number of sources in one index')
+    parser.add_argument('--sources', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='Source counts to test')
+    parser.add_argument('--chunks-per-source', type=int, default=2000, help='Chunks in each source')
+    parser.add_argument('--queries', type=int, default=100, help='Queries timed per configuration')
+    parser.add_argument('--k', type=int, default=5, help='Results per query')
+    parser.add_argument('--interleaved', action='store_true',
+                        help="Keep the sources' rows interleaved instead of grouping them like an export")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', type=Path, default=None, help='Also write results to this file')
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = [measure(sources, args) for sources in args.sources]
+
+    columns = ["sources", "chunks", "exact_source", "exact_post_filter", "exact_all", "int8_source", "int8_all"]
+    print(" | ".join(f"{c} p50/p95 ms" if c not in ("sources", "chunks") else c for c in columns))
+    print(" | ".join("---" for _ in columns))
+    for result in results:
+        print(" | ".join(
+            f"{result[c]['p50_ms']}/{result[c]['p95_ms']}" if isinstance(result[c], dict) else str(result[c])
+            for c in columns
+        ))
+
+    if args.json:
+        args.json.write_text(json.dumps({"config": {k: str(v) for k, v in vars(args).items()}, "results": results},
+                                        indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from openai import AsyncOpenAI
+
+from chunking import SENTENCE_PATTERN, iter_blocks
+from rate_limiter import RateLimiter
+
+SUMMARY_MODES = ("auto", "heuristic", "llm")
+
+LINK_PATTERN = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+INLINE_PATTERN = re.compile(r"[`*]+")  # Underscores are left alone, they are common in identifiers
+LIST_MARKER_PATTERN = re.compile(r"^\s*(?:[-*+]|\d+[.)]|>)\s+", re.M)
+
+SYSTEM_PROMPT = """You are an AI that extracts titles and summaries from documentation chunks.
+You will receive one or more chunks, each introduced by its index.
+Return a JSON object with a 'chunks' key holding a list with one object per chunk,
+each with 'index', 'title' and 'summary' keys.
+For the title: If this seems like the start of a document, extract its title. If it's a middle chunk, derive a descriptive title.
+For the summary: Create a concise summary of the main points in this chunk.
+Keep both title and summary concise but informative."""
+
+def clean_inline(text: str) -> str:
+    """Plain text of a markdown line: link text only, no emphasis or code markers."""
+    text = LINK_PATTERN.sub(r"\1", text)
+    text = INLINE_PATTERN.sub("", text)
+    # Docs sites put zero-width characters in heading anchor links
+    return " ".join(text.replace("\u200b", "").split())
+
+def title_from_url(url: str) -> str:
+    segment = urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+    return segment.replace("-", " ").replace("_", " ").strip().capitalize() or "Documentation"
+
+def heuristic_title_and_summary(chunk: str, url: str, require_heading: bool = False) -> Optional[Dict[str, str]]:
+    """Title from the chunk's first heading and summary from its first sentences.
+
+    With `require_heading` only chunks that open with a heading get a result;
+    otherwise the title falls back to the page URL.
+    """
+    title = None
+    sentences: List[str] = []
+    for block in iter_blocks(chunk):
+        if block.kind == "heading":
+            if title is None:
+                title = clean_inline(block.text.lstrip("#"))
+        elif require_heading and title is None:
+            return None
+        elif block.kind == "text" and len(sentences) < 2:
+            text = clean_inline(LIST_MARKER_PATTERN.sub("", block.text))
+            sentences.extend(sentence for sentence in SENTENCE_PATTERN.split(text) if sentence)
+        if title is not None and len(sentences) >= 2:
+            break
+
+    title = title or title_from_url(url)
+    summary = " ".join(sentences[:2]) or f"Code example from {title}."
+    if len(summary) > 300:
+        summary = summary[:297].rsplit(" ", 1)[0] + "..."
+    return {"title": title, "summary": summary}
+
+@dataclass
+class PendingSummary:
+    chunk: str
+    url: str
+    future: asyncio.Future
+
+class ChunkSummarizer:
+    """Titles and summaries for chunks, from headings where possible and the LLM otherwise.
+
+    In "heuristic" mode no model is called. In "auto" mode chunks that open
+    with a heading take the heuristic fast path and the rest go to the LLM; in
+    "llm" mode every chunk does. LLM requests are collected from concurrent
+    callers and sent `max_batch_size` chunks at a time as one JSON-mode
+    completion, flushed after `flush_interval` seconds like `EmbeddingBatcher`.
+    """
+
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        model: str = "gpt-4o-mini",
+        mode: str = "auto",
+        limiter: Optional[RateLimiter] = None,
+        max_batch_size: int = 8,
+        flush_interval: float = 0.1,
+        max_chunk_chars: int = 1000
+    ):
+        if mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode {mode!r}, expected one of {SUMMARY_MODES}")
+        self.openai_client = openai_client
+        self.model = model
+        self.mode = mode
+        self.limiter = limiter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_chunk_chars = max_chunk_chars
+
+        self._pending: List[PendingSummary] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+        # Counters for the end-of-run report
+        self.heuristic_chunks = 0
+        self.llm_chunks = 0
+        self.requests_sent = 0
+        self.failed_chunks = 0
+
+    async def summarize(self, chunk: str, url: str) -> Dict[str, str]:
+        """Title and summary of a chunk. Raises if the LLM gives none after retries."""
+        if self.mode != "llm":
+            extracted = heuristic_title_and_summary(chunk, url, require_heading=self.mode == "auto")
+            if extracted is not None:
+                self.heuristic_chunks += 1
+                return extracted
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(PendingSummary(chunk, url, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush_now()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_now)
+        return await future
+
+    async def flush(self):
+        """Send everything still pending and wait for all in-flight batches."""
+        self._flush_now()
+        while self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch = self._pending
+        self._pending = []
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[PendingSummary]):
+        content = "\n\n".join(
+            f"Chunk {i}\nURL: {item.url}\n\nContent:\n{item.chunk[:self.max_chunk_chars]}..."
+            for i, item in enumerate(batch)
+        )
+        kwargs = dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": content}
+            ],
+            response_format={"type": "json_object"}
+        )
+        try:
+            if self.limiter is not None:
+                # Prompt estimate plus a short title and summary per chunk
+                tokens = (len(SYSTEM_PROMPT) + len(content)) // 4 + 150 * len(batch)
+                response = await self.limiter.call(self.openai_client.chat.completions.create, tokens=tokens, **kwargs)
+            else:
+                response = await self.openai_client.chat.completions.create(**kwargs)
+            self.requests_sent += 1
+            entries = json.loads(response.choices[0].message.content).get("chunks", [])
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        by_index = {}
+        for position, entry in enumerate(entries):
+            if isinstance(entry, dict) and entry.get("title") and entry.get("summary"):
+                # Models sometimes quote the index ("0") or leave it out
+                try:
+                    index = int(entry["index"])
+                except (KeyError, TypeError, ValueError):
+                    index = position
+                by_index[index] = entry
+
+        missing = []
+        for i, item in enumerate(batch):
+            entry = by_index.get(i)
+            if entry is None:
+                missing.append(item)
+            elif not item.future.done():
+                self.llm_chunks += 1
+                item.future.set_result({"title": entry["title"], "summary": entry["summary"]})
+
+        if missing and len(batch) > 1:
+            # Ask again one at a time for chunks the model skipped
+            await asyncio.gather(*[self._send([item]) for item in missing])
+        elif missing:
+            self._fail(missing, ValueError(f"No title and summary returned for {missing[0].url}"))
+
+    def _fail(self, batch: List[PendingSummary], error: Exception):
+        self.failed_chunks += len(batch)
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(error)
+
+    def summary(self) -> str:
+        chunks = self.heuristic_chunks + self.llm_chunks
+        saved = chunks - self.requests_sent
+        return (f"Titled {chunks} chunks: {self.heuristic_chunks} from headings, {self.llm_chunks} by the model in "
+                f"{self.requests_sent} requests ({saved} model calls saved, {self.failed_chunks} failed)")
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from postgrest.types import CountMethod, ReturnMethod
+from supabase import Client
+
+@dataclass
+class BatchResult:
+    rows: int
+    written: int
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def skipped(self) -> int:
+        return self.rows - self.written if self.error is None else 0
+
+class ChunkWriter:
+    """Write processed chunks to Supabase with one upsert per batch.
+
+    Rows are upserted on the `unique(url, chunk_number)` constraint. Existing rows
+    are overwritten when `update_existing` is set and left untouched otherwise.
+    The synchronous Supabase client runs in a worker thread so writes never block
+    the event loop, and nothing is read back from the table.
+    """
+
+    def __init__(
+        self,
+        supabase: Client,
+        update_existing: bool = False,
+        batch_size: int = 100,
+        table: str = "deepseek_pages"
+    ):
+        self.supabase = supabase
+        self.update_existing = update_existing
+        self.batch_size = batch_size
+        self.table = table
+        self.batches: List[BatchResult] = []
+
+    async def write(self, chunks: Sequence[Any], update_existing: Optional[bool] = None) -> List[BatchResult]:
+        """Upsert chunks (dataclasses or row dicts) in batches of `batch_size` and return one result per batch."""
+        if update_existing is None:
+            update_existing = self.update_existing
+
+        rows = [chunk if isinstance(chunk, dict) else asdict(chunk) for chunk in chunks]
+        results = []
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            results.append(await asyncio.to_thread(self._upsert, batch, update_existing))
+
+        self.batches.extend(results)
+        return results
+
+    def _upsert(self, rows: List[Dict[str, Any]], update_existing: bool) -> BatchResult:
+        started = time.perf_counter()
+        try:
+            response = self.supabase.table(self.table).upsert(
+                rows,
+                on_conflict="url,chunk_number",
+                ignore_duplicates=not update_existing,
+                returning=ReturnMethod.minimal,
+                count=CountMethod.exact
+            ).execute()
+        except Exception as e:
+            print(f"Error writing batch of {len(rows)} chunks: {e}")
+            return BatchResult(len(rows), 0, time.perf_counter() - started, str(e))
+
+        # With ignore_duplicates the count only includes newly inserted rows
+        written = response.count if response.count is not None else len(rows)
+        return BatchResult(len(rows), written, time.perf_counter() - started)
+
+    def summary(self) -> str:
+        """One-line report of everything written so far."""
+        rows = sum(batch.rows for batch in self.batches)
+        written = sum(batch.written for batch in self.batches)
+        skipped = sum(batch.skipped for batch in self.batches)
+        failed = sum(batch.rows for batch in self.batches if batch.error)
+        seconds = sum(batch.seconds for batch in self.batches)
+        return (f"Wrote {written} of {rows} chunks in {len(self.batches)} batches "
+                f"({skipped} existing skipped, {failed} failed, {seconds:.2f}s in database)")
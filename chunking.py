@@ -0,0 +1,210 @@
+import io
+import re
+from functools import lru_cache
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from embedding_batcher import EMBEDDING_MODEL, load_encoding
+
+FENCE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+HEADING_PATTERN = re.compile(r"^ {0,3}#{1,6}\s")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+@dataclass
+class Block:
+    text: str
+    kind: str  # 'heading', 'code' or 'text'
+
+@lru_cache(maxsize=None)
+def make_token_counter(model: str = EMBEDDING_MODEL) -> Callable[[str], int]:
+    """Count tokens with the embedding model's tokenizer, or estimate if it is unavailable."""
+    encoding = load_encoding(model)
+    if encoding is None:
+        return lambda text: len(text) // 4 + 1
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+def iter_blocks(markdown: str) -> Iterator[Block]:
+    """Yield headings, fenced code blocks and paragraphs in a single pass over the lines."""
+    lines: List[str] = []
+    fence: Optional[str] = None
+
+    for line in io.StringIO(markdown):
+        stripped = line.strip()
+        if fence:
+            lines.append(line)
+            if stripped.startswith(fence) and set(stripped) == {fence[0]}:
+                yield Block("".join(lines).strip("\n"), "code")
+                lines, fence = [], None
+            continue
+
+        match = FENCE_PATTERN.match(line)
+        if match or HEADING_PATTERN.match(line) or not stripped:
+            if lines:
+                yield Block("".join(lines).strip("\n"), "text")
+                lines = []
+            if match:
+                fence = match.group(1)
+                lines.append(line)
+            elif stripped:
+                yield Block(stripped, "heading")
+            continue
+
+        lines.append(line)
+
+    if lines:
+        # An unterminated fence still counts as code
+        yield Block("".join(lines).strip("\n"), "code" if fence else "text")
+
+def split_block(block: Block, max_tokens: int, count: Callable[[str], int]) -> Iterator[Tuple[str, int, str]]:
+    """Yield (text, tokens, kind) pieces of a block that each fit in `max_tokens`.
+
+    Code is split between lines and prose between sentences, falling back to
+    words for a single line or sentence that is still too long.
+    """
+    tokens = count(block.text)
+    if tokens <= max_tokens:
+        yield block.text, tokens, block.kind
+        return
+
+    separator = "\n" if block.kind == "code" else " "
+    if block.kind == "code":
+        # Re-open and close the fence around every piece of a split code block
+        parts = block.text.split("\n")
+        opening = parts.pop(0)
+        closing = parts.pop() if parts and FENCE_PATTERN.match(parts[-1]) else opening.strip()[:3]
+        wrap = lambda text: f"{opening}\n{text}\n{closing}"
+        max_tokens -= count(opening) + count(closing) + 2
+    else:
+        parts = SENTENCE_PATTERN.split(block.text)
+        wrap = lambda text: text
+
+    piece: List[str] = []
+    piece_tokens = 0
+    for part in parts:
+        part_tokens = count(part) + 1
+        if piece and piece_tokens + part_tokens > max_tokens:
+            text = wrap(separator.join(piece))
+            yield text, count(text), block.kind
+            piece, piece_tokens = [], 0
+        if part_tokens > max_tokens:
+            # Re-split an oversized line or sentence on whitespace
+            words = part.split(" ")
+            if len(words) > 1:
+                for half in (words[:len(words) // 2], words[len(words) // 2:]):
+                    for text, tokens, _ in split_block(Block(" ".join(half), "text"), max_tokens, count):
+                        yield wrap(text), count(wrap(text)), block.kind
+            else:
+                step = max(1, len(part) * max_tokens // part_tokens)
+                for start in range(0, len(part), step):
+                    text = wrap(part[start:start + step])
+                    yield text, count(text), block.kind
+            continue
+        piece.append(part)
+        piece_tokens += part_tokens
+    if piece:
+        text = wrap(separator.join(piece))
+        yield text, count(text), block.kind
+
+def chunk_markdown(
+    markdown: str,
+    max_tokens: int = 1000,
+    overlap_tokens: int = 100,
+    min_tokens: Optional[int] = None,
+    count_tokens: Optional[Callable[[str], int]] = None
+) -> Iterator[str]:
+    """Split markdown into chunks of at most `max_tokens` tokens.
+
+    Chunks only break between blocks, so code fences are never cut unless a
+    single block is larger than the budget. A heading starts a new chunk once
+    the current one holds `min_tokens` (a fifth of the budget by default).
+    Chunks cut for size repeat up to `overlap_tokens` of trailing text from
+    the previous chunk. Every block is tokenized once, so the run is linear in
+    the size of the document.
+    """
+    count = count_tokens or make_token_counter()
+    if min_tokens is None:
+        min_tokens = max_tokens // 5
+
+    current: List[Tuple[str, int, str]] = []
+    current_tokens = 0
+
+    def overlap() -> List[Tuple[str, int, str]]:
+        # A trailing heading belongs with the text that follows it
+        if len(current) > 1 and current[-1][2] == "heading":
+            return [current.pop()]
+        tail: List[Tuple[str, int, str]] = []
+        tail_tokens = 0
+        for unit in reversed(current):
+            if unit[2] != "text" or tail_tokens + unit[1] > overlap_tokens:
+                break
+            tail.insert(0, unit)
+            tail_tokens += unit[1]
+        return tail
+
+    for block in iter_blocks(markdown):
+        if block.kind == "heading" and current and current_tokens >= min_tokens:
+            yield "\n\n".join(unit[0] for unit in current)
+            current, current_tokens = [], 0
+
+        for unit in split_block(block, max_tokens, count):
+            if current and current_tokens + unit[1] > max_tokens:
+                carried = overlap()
+                yield "\n\n".join(text for text, _, _ in current)
+                current = carried
+                current_tokens = sum(tokens + 1 for _, tokens, _ in current)
+                if current_tokens + unit[1] > max_tokens:
+                    current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit[1] + 1
+
+    if current:
+        yield "\n\n".join(text for text, _, _ in current)
+
+def chunk_text(text: str, max_tokens: int = 1000, overlap_tokens: int = 100) -> List[str]:
+    """Split text into token-budgeted chunks, respecting headings and code blocks."""
+    return [chunk for chunk in chunk_markdown(text, max_tokens, overlap_tokens) if chunk.strip()]
+
+def chunk_text_by_chars(text: str, chunk_size: int = 5000) -> List[str]:
+    """Previous character-window chunker, kept for benchmarks."""
+    chunks = []
+    start = 0
+    text_length = len(text)
+
+    while start < text_length:
+        # Calculate end position
+        end = start + chunk_size
+
+        # If we're at the end of the text, just take what's left
+        if end >= text_length:
+            chunks.append(text[start:].strip())
+            break
+
+        # Try to find a code block boundary first (```)
+        chunk = text[start:end]
+        code_block = chunk.rfind('```')
+        if code_block != -1 and code_block > chunk_size * 0.3:
+            end = start + code_block
+
+        # If no code block, try to break at a paragraph
+        elif '\n\n' in chunk:
+            # Find the last paragraph break
+            last_break = chunk.rfind('\n\n')
+            if last_break > chunk_size * 0.3:  # Only break if we're past 30% of chunk_size
+                end = start + last_break
+
+        # If no paragraph break, try to break at a sentence
+        elif '. ' in chunk:
+            # Find the last sentence break
+            last_period = chunk.rfind('. ')
+            if last_period > chunk_size * 0.3:  # Only break if we're past 30% of chunk_size
+                end = start + last_period + 1
+
+        # Extract chunk and clean it up
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        # Move start position for next chunk
+        start = max(start + 1, end)
+
+    return chunks
@@ -0,0 +1,164 @@
+"""Pack retrieved chunks into a token budget for the agent's prompt.
+
+Search over-fetches candidates, and `pack_context` picks from them in maximal
+marginal relevance order, so a chunk that mostly repeats one already picked
+waits behind one that adds something new. Neighbouring chunks of the same
+page are merged into one section without the text the chunker repeats
+between them, and picking stops when the token budget is full rather than
+after a fixed number of chunks.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from chunking import make_token_counter
+from lexical_index import tokenize
+
+@dataclass
+class Section:
+    """Consecutive chunks of one page."""
+    url: str
+    title: str
+    chunks: Dict[int, str] = field(default_factory=dict)
+
+    def text(self) -> str:
+        parts: List[str] = []
+        previous_number, previous = None, ""
+        for number in sorted(self.chunks):
+            content = self.chunks[number]
+            if previous_number is not None and number == previous_number + 1:
+                content = strip_overlap(previous, content)
+            parts.append(content)
+            previous_number, previous = number, self.chunks[number]
+        return "\n\n".join(part.strip("\n") for part in parts if part.strip())
+
+    def render(self) -> str:
+        return f"## {self.title}\nSource: {self.url}\n{self.text()}"
+
+def strip_overlap(previous: str, following: str, probe_chars: int = 40) -> str:
+    """`following` without the text it repeats from the end of `previous`."""
+    probe = following[:probe_chars]
+    if not probe:
+        return following
+    position = previous.find(probe)
+    while position != -1:
+        tail = previous[position:]
+        if following.startswith(tail):
+            return following[len(tail):]
+        position = previous.find(probe, position + 1)
+    return following
+
+def mmr_order(relevance: np.ndarray, similarity: np.ndarray, diversity: float) -> List[int]:
+    """Indices in maximal marginal relevance order.
+
+    Each step takes the candidate with the best `(1 - diversity) * relevance`
+    minus `diversity` times its highest similarity to those already taken.
+    """
+    order: List[int] = []
+    remaining = list(range(len(relevance)))
+    redundancy = np.zeros(len(relevance))
+    while remaining:
+        scores = (1 - diversity) * relevance[remaining] - diversity * redundancy[remaining]
+        best = remaining.pop(int(np.argmax(scores)))
+        order.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return order
+
+def candidate_similarity(docs: Sequence[dict], embeddings: Optional[Sequence[Optional[Sequence[float]]]]) -> np.ndarray:
+    """Cosine similarity between candidates' embeddings, or token overlap when any is missing."""
+    if embeddings is not None and all(embedding is not None for embedding in embeddings):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        return matrix @ matrix.T
+
+    token_sets = [set(tokenize(doc["content"])) for doc in docs]
+    similarity = np.zeros((len(docs), len(docs)))
+    for i, a in enumerate(token_sets):
+        for j in range(i, len(docs)):
+            b = token_sets[j]
+            similarity[i, j] = similarity[j, i] = len(a & b) / len(a | b) if a | b else 0.0
+    return similarity
+
+def pack_context(
+    docs: Sequence[dict],
+    token_budget: int = 1000,
+    diversity: float = 0.5,
+    embeddings: Optional[Sequence[Optional[Sequence[float]]]] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    max_chunk_tokens: Optional[int] = None,
+    min_excerpt_tokens: int = 100
+) -> List[Section]:
+    """Sections of `docs` (best match first) that fit in `token_budget` tokens once rendered.
+
+    `docs` are search results best first, with the `match_deepseek_pages`
+    fields, and `embeddings` (one per doc) are used to judge redundancy. A
+    chunk that does not fit in what is left of the budget is cut down to an
+    excerpt of at least `min_excerpt_tokens`, or skipped, and no chunk
+    contributes more than `max_chunk_tokens`.
+    """
+    if not docs:
+        return []
+    count_tokens = count_tokens or make_token_counter()
+
+    # Relevance comes from the rank, since fused results have no common score
+    relevance = 1 - np.arange(len(docs)) / len(docs)
+    order = mmr_order(relevance, candidate_similarity(docs, embeddings), diversity)
+
+    sections: List[Section] = []
+    used = 0
+    for i in order:
+        doc = docs[i]
+        url, number = doc["url"], doc["chunk_number"]
+        neighbours = [
+            section for section in sections
+            if section.url == url and (number - 1 in section.chunks or number + 1 in section.chunks)
+        ]
+        if any(number in section.chunks for section in sections if section.url == url):
+            continue
+
+        # Adding a chunk can join the sections on either side of it into one
+        merged = Section(url, doc.get("title") or url)
+        for section in neighbours:
+            merged.title = section.title
+            merged.chunks.update(section.chunks)
+        content = doc["content"]
+        if max_chunk_tokens:
+            content = truncate_to_tokens(content, max_chunk_tokens, count_tokens)
+        merged.chunks[number] = content
+        cost = count_tokens(merged.render()) - sum(count_tokens(section.render()) for section in neighbours)
+
+        if used + cost > token_budget:
+            # Fill what is left with the start of the chunk, unless too little is left to be useful
+            overhead = cost - count_tokens(content)
+            if sections and token_budget - used - overhead < min_excerpt_tokens:
+                continue  # A later, shorter candidate may still fit
+            merged.chunks[number] = truncate_to_tokens(content, token_budget - used - overhead, count_tokens)
+            cost = count_tokens(merged.render()) - sum(count_tokens(section.render()) for section in neighbours)
+
+        position = min(
+            (index for index, section in enumerate(sections) if any(section is other for other in neighbours)),
+            default=len(sections)
+        )
+        sections = [section for section in sections if all(section is not other for other in neighbours)]
+        sections.insert(min(position, len(sections)), merged)
+        used += cost
+    return sections
+
+def truncate_to_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """Longest prefix of `text` ending on a word boundary that fits in `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low].rsplit(" ", 1)[0] if " " in text[:low] else text[:low]
+    return cut + "..."
+
+def format_sections(sections: Sequence[Section]) -> str:
+    return "\n\n---\n\n".join(section.render() for section in sections)
@@ -0,0 +1,320 @@
+"""Offline snapshot of the processed corpus, for rebuilding deepseek_pages without crawling.
+
+A corpus snapshot is a directory holding `chunks.parquet`, one row per chunk
+(url, chunk number, title, summary, content, metadata as JSON and the raw
+embedding as a fixed-size float32 list), `pages.parquet` with the page
+catalog, and `manifest.json` describing them. Loading a snapshot needs no
+browser and no model calls:
+
+    python corpus_snapshot.py export --out corpus/2026-10-17
+    python corpus_snapshot.py import --snapshot corpus/2026-10-17 [--replace]
+
+`--replace` also deletes chunks and pages that are not in the snapshot, which
+rolls the table back to exactly what was exported. A snapshot exported with
+`--source` only replaces the rows of that source.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+from chunk_writer import ChunkWriter
+from embedding_batcher import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+from vector_index import EXPORT_PAGE_SIZE, parse_embedding
+
+FORMAT_VERSION = 3
+# Version 2 snapshots lack the page validators and load with them cleared
+READABLE_VERSIONS = (2, 3)
+CHUNKS_FILE = "chunks.parquet"
+PAGES_FILE = "pages.parquet"
+MANIFEST_FILE = "manifest.json"
+PAGE_COLUMNS = ("url", "title", "source", "lastmod", "etag", "last_modified", "page_hash", "chunk_count")
+
+def chunks_schema(dimensions: int) -> pa.Schema:
+    return pa.schema([
+        ("url", pa.string()),
+        ("chunk_number", pa.int32()),
+        ("title", pa.string()),
+        ("summary", pa.string()),
+        ("content", pa.string()),
+        ("metadata", pa.string()),
+        ("embedding", pa.list_(pa.float32(), dimensions)),
+    ])
+
+PAGES_SCHEMA = pa.schema([
+    ("url", pa.string()),
+    ("title", pa.string()),
+    ("source", pa.string()),
+    ("lastmod", pa.string()),
+    ("etag", pa.string()),
+    ("last_modified", pa.string()),
+    ("page_hash", pa.string()),
+    ("chunk_count", pa.int32()),
+])
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+@dataclass
+class CorpusSnapshot:
+    manifest: Dict[str, Any]
+    urls: List[str]
+    chunk_numbers: np.ndarray
+    titles: List[str]
+    summaries: List[str]
+    contents: List[str]
+    metadata: List[Dict[str, Any]]
+    embeddings: np.ndarray
+    pages: List[Dict[str, Any]]
+
+    @classmethod
+    def load(cls, directory: Path) -> "CorpusSnapshot":
+        """Read a snapshot, checking its format version and checksums."""
+        directory = Path(directory)
+        manifest = json.loads((directory / MANIFEST_FILE).read_text())
+        if manifest["format_version"] not in READABLE_VERSIONS:
+            raise ValueError(f"Unsupported corpus snapshot format {manifest['format_version']}, export it again")
+        for name, digest in manifest["sha256"].items():
+            if file_sha256(directory / name) != digest:
+                raise ValueError(f"Checksum mismatch for {directory / name}")
+
+        chunks = pq.read_table(directory / CHUNKS_FILE)
+        embedding = chunks.column("embedding").combine_chunks()
+        return cls(
+            manifest=manifest,
+            urls=chunks.column("url").to_pylist(),
+            chunk_numbers=chunks.column("chunk_number").to_numpy(),
+            titles=chunks.column("title").to_pylist(),
+            summaries=chunks.column("summary").to_pylist(),
+            contents=chunks.column("content").to_pylist(),
+            metadata=[json.loads(value) for value in chunks.column("metadata").to_pylist()],
+            embeddings=embedding.values.to_numpy().reshape(len(chunks), manifest["dimensions"]),
+            pages=pq.read_table(directory / PAGES_FILE).to_pylist()
+        )
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Chunks as deepseek_pages rows, without the database id."""
+        for i in range(start, min(stop if stop is not None else len(self), len(self))):
+            yield {
+                "url": self.urls[i],
+                "chunk_number": int(self.chunk_numbers[i]),
+                "title": self.titles[i],
+                "summary": self.summaries[i],
+                "content": self.contents[i],
+                "metadata": self.metadata[i],
+                "embedding": self.embeddings[i].tolist()
+            }
+
+    def page_text(self, url: str) -> str:
+        """A page's chunks joined in order (overlapping text is repeated)."""
+        chunks = sorted((int(self.chunk_numbers[i]), self.contents[i]) for i, u in enumerate(self.urls) if u == url)
+        return "\n\n".join(content for _, content in chunks)
+
+def export_corpus(supabase: Client, directory: Path, source: Optional[str] = None) -> Path:
+    """Export deepseek_pages and the page catalog to a new snapshot directory."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=False)
+
+    columns: Dict[str, list] = {key: [] for key in ("url", "chunk_number", "title", "summary", "content", "metadata")}
+    embeddings: List[np.ndarray] = []
+    last_id = 0
+    while True:
+        query = supabase.table("deepseek_pages")\
+            .select("id, url, chunk_number, title, summary, content, metadata, embedding")\
+            .gt("id", last_id)
+        if source:
+            query = query.eq("metadata->>source", source)
+        rows = query.order("id").limit(EXPORT_PAGE_SIZE).execute().data
+        if not rows:
+            break
+
+        for row in rows:
+            for key in columns:
+                columns[key].append(row[key])
+            embeddings.append(np.asarray(parse_embedding(row["embedding"]), dtype=np.float32))
+        last_id = rows[-1]["id"]
+        print(f"Exported {len(columns['url'])} chunks")
+
+    pages = stored_pages(supabase, source)
+    version = supabase.table("deepseek_corpus_version").select("version").eq("id", 1).execute().data
+
+    matrix = np.vstack(embeddings) if embeddings else np.zeros((0, EMBEDDING_DIMENSIONS), np.float32)
+    dimensions = int(matrix.shape[1])
+    chunks = pa.table({
+        "url": columns["url"],
+        "chunk_number": columns["chunk_number"],
+        "title": columns["title"],
+        "summary": columns["summary"],
+        "content": columns["content"],
+        "metadata": [json.dumps(value or {}) for value in columns["metadata"]],
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(matrix.reshape(-1)), dimensions),
+    }, schema=chunks_schema(dimensions))
+    pq.write_table(chunks, directory / CHUNKS_FILE, compression="zstd")
+    pq.write_table(pa.Table.from_pylist(pages, schema=PAGES_SCHEMA), directory / PAGES_FILE, compression="zstd")
+
+    # The manifest is written last, so a directory without one is an unfinished export
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+        "chunks": len(columns["url"]),
+        "pages": len(pages),
+        "embedding_model": EMBEDDING_MODEL,
+        "dimensions": dimensions,
+        "corpus_version": version[0]["version"] if version else None,
+        "sha256": {name: file_sha256(directory / name) for name in (CHUNKS_FILE, PAGES_FILE)},
+    }
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    return directory
+
+def stored_pages(supabase: Client, source: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The deepseek_page_state rows, optionally only those of one source, read page by page."""
+    pages: List[Dict[str, Any]] = []
+    while True:
+        query = supabase.table("deepseek_page_state").select(", ".join(PAGE_COLUMNS))
+        if source:
+            query = query.eq("source", source)
+        rows = query.order("url")\
+            .range(len(pages), len(pages) + EXPORT_PAGE_SIZE - 1)\
+            .execute().data
+        pages.extend(rows)
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return pages
+
+def stored_urls(supabase: Client, source: Optional[str] = None) -> List[str]:
+    """Every URL that has a chunk 0 in deepseek_pages, optionally only those of one source."""
+    urls: List[str] = []
+    while True:
+        query = supabase.table("deepseek_pages")\
+            .select("url")\
+            .eq("chunk_number", 0)
+        if source:
+            query = query.eq("metadata->>source", source)
+        rows = query.order("url")\
+            .range(len(urls), len(urls) + EXPORT_PAGE_SIZE - 1)\
+            .execute().data
+        urls.extend(row["url"] for row in rows)
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return urls
+
+def delete_outside_snapshot(supabase: Client, snapshot: CorpusSnapshot, batch_size: int = 50):
+    """Delete chunks and page states that the snapshot does not contain.
+
+    A snapshot exported for one source only replaces that source's rows.
+    """
+    source = snapshot.manifest.get("source")
+    chunk_counts: Dict[str, int] = {}
+    for url, chunk_number in zip(snapshot.urls, snapshot.chunk_numbers):
+        chunk_counts[url] = max(chunk_counts.get(url, 0), int(chunk_number) + 1)
+
+    extra = sorted(set(stored_urls(supabase, source)) - set(chunk_counts))
+    for start in range(0, len(extra), batch_size):
+        batch = extra[start:start + batch_size]
+        pages = supabase.table("deepseek_pages").delete().in_("url", batch)
+        page_states = supabase.table("deepseek_page_state").delete().in_("url", batch)
+        if source:
+            pages = pages.eq("metadata->>source", source)
+            page_states = page_states.eq("source", source)
+        pages.execute()
+        page_states.execute()
+    for url, count in chunk_counts.items():
+        supabase.table("deepseek_pages").delete().eq("url", url).gte("chunk_number", count).execute()
+    print(f"Deleted {len(extra)} {source + ' ' if source else ''}pages not in the snapshot")
+
+async def load_corpus(
+    supabase: Client,
+    snapshot: CorpusSnapshot,
+    batch_size: int = 500,
+    concurrency: int = 4,
+    replace: bool = False
+) -> ChunkWriter:
+    """Bulk load a snapshot into deepseek_pages and deepseek_page_state.
+
+    Chunks are upserted `batch_size` rows per request with `concurrency`
+    requests in flight, overwriting rows with the same url and chunk number.
+    Rows are built one batch at a time so the whole corpus is never held as
+    JSON in memory.
+    """
+    writer = ChunkWriter(supabase, update_existing=True, batch_size=batch_size)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def write(start: int):
+        async with semaphore:
+            await writer.write(list(snapshot.rows(start, start + batch_size)))
+
+    await asyncio.gather(*[write(start) for start in range(0, len(snapshot), batch_size)])
+
+    # A new updated_at tells answer caches that these pages changed
+    updated_at = datetime.now(timezone.utc).isoformat()
+    for start in range(0, len(snapshot.pages), batch_size):
+        # The stored HTTP validators must be the snapshot's (or none): a newer crawl's ETag
+        # would get a 304 for the rolled-back page and keep its old chunks as current
+        pages = [{"etag": None, "last_modified": None, **page, "updated_at": updated_at}
+                 for page in snapshot.pages[start:start + batch_size]]
+        await asyncio.to_thread(
+            lambda: supabase.table("deepseek_page_state").upsert(pages, on_conflict="url").execute()
+        )
+
+    if replace:
+        if any(batch.error for batch in writer.batches):
+            print("Some chunks failed to load, keeping rows that are not in the snapshot")
+        else:
+            await asyncio.to_thread(delete_outside_snapshot, supabase, snapshot)
+
+    # Agent processes drop their page caches when the version moves
+    await asyncio.to_thread(lambda: supabase.rpc("bump_corpus_version", {}).execute())
+    return writer
+
+def main():
+    parser = argparse.ArgumentParser(description='Export or load an offline snapshot of the processed corpus')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help='Write deepseek_pages and the page catalog to a snapshot')
+    export.add_argument('--out', type=Path, required=True, help='New snapshot directory')
+    export.add_argument('--source', default=None, help='Only export chunks with this metadata source')
+    load = subparsers.add_parser('import', help='Bulk load a snapshot into the database')
+    load.add_argument('--snapshot', type=Path, required=True, help='Snapshot directory')
+    load.add_argument('--batch-size', type=int, default=500, help='Rows per upsert request')
+    load.add_argument('--concurrency', type=int, default=4, help='Upsert requests in flight')
+    load.add_argument('--replace', action='store_true',
+                      help="Also delete chunks and pages that are not in the snapshot (within the snapshot's "
+                           "source, if it was exported with --source)")
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent / '.env')
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+
+    if args.command == 'export':
+        directory = export_corpus(supabase, args.out, source=args.source)
+        print(f"Wrote corpus snapshot {directory}")
+    else:
+        snapshot = CorpusSnapshot.load(args.snapshot)
+        print(f"Loading {len(snapshot)} chunks and {len(snapshot.pages)} pages from {args.snapshot}")
+        writer = asyncio.run(load_corpus(
+            supabase,
+            snapshot,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            replace=args.replace
+        ))
+        print(writer.summary())
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,31 @@
 import os
 import sys
-import json
 import asyncio
 import requests
 import argparse
+import hashlib
 from xml.etree import ElementTree
-from typing import List, Dict, Any
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+from functools import lru_cache
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 from pathlib import Path
 from dotenv import load_dotenv
 
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 from openai import AsyncOpenAI
 from supabase import create_client, Client
 
+from chunk_writer import ChunkWriter
+from chunk_summaries import SUMMARY_MODES, ChunkSummarizer
+from chunking import chunk_text
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+from ingest_pipeline import Pipeline, Stage
+from rate_limiter import load_rate_limiter_from_env
+from lexical_index import build_lexical_index
+from page_fetcher import FETCH_MODES, HttpFetcher, MemorySampler, browser_run_config
+
 # Get the directory containing the script
 script_dir = Path(__file__).resolve().parent
 
@@ -23,43 +33,93 @@ script_dir = Path(__file__).resolve().parent
 env_path = script_dir / '.env'
 load_dotenv(dotenv_path=env_path)
 
-# Debug: Print where we're loading from
-print(f"Loading .env file from: {env_path}")
-print(f"SUPABASE_URL: {'[SET]' if os.getenv('SUPABASE_URL') else '[NOT SET]'}")
-print(f"SUPABASE_SERVICE_KEY: {'[SET]' if os.getenv('SUPABASE_SERVICE_KEY') else '[NOT SET]'}")
+# Importing this module has no side effects beyond reading .env: clients are
+# created on first use and the database is only contacted by main() or --check.
 
-# Initialize Supabase client with environment variables
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+@lru_cache(maxsize=None)
+def get_supabase() -> Client:
+    """The Supabase client, created on first use."""
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+    if not supabase_url or not supabase_key:
+        raise ValueError(
+            "Missing Supabase credentials. Please ensure SUPABASE_URL and "
+            "SUPABASE_SERVICE_KEY are set in your .env file"
+        )
+    return create_client(supabase_url, supabase_key)
 
-if not supabase_url or not supabase_key:
-    raise ValueError(
-        "Missing Supabase credentials. Please ensure SUPABASE_URL and "
-        "SUPABASE_SERVICE_KEY are set in your .env file"
-    )
+@lru_cache(maxsize=None)
+def get_openai_client() -> AsyncOpenAI:
+    """The OpenAI client, created on first use. Retries are left to the rate limiters."""
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 
-# Initialize OpenAI and Supabase clients
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-supabase: Client = create_client(
-    supabase_url,
-    supabase_key
-)
-
-# Debug: Check database connection and table existence
-try:
-    print("\nChecking database connection and tables...")
-    # Try to directly query the deepseek_pages table
-    test_query = supabase.table("deepseek_pages").select("id").limit(1).execute()
-    print("Successfully connected to deepseek_pages table")
-    
-    print("\nTesting table permissions...")
-    # Try a simple count query
-    count_query = supabase.table("deepseek_pages").select("*", count="exact").execute()
-    print(f"Current number of records in table: {count_query.count}")
+# Request and token budgets for each model, shared by every in-flight call
+embedding_limiter = load_rate_limiter_from_env("EMBEDDING")
+llm_limiter = load_rate_limiter_from_env("LLM")
+
+# Created on first use with default settings, or by main() from the command line options:
+# batched embeddings shared by every in-flight document,
+embedding_batcher: Optional[EmbeddingBatcher] = None
+# titles and summaries from headings where possible, batched LLM calls otherwise,
+chunk_summarizer: Optional[ChunkSummarizer] = None
+# and batched upserts into deepseek_pages, run off the event loop
+chunk_writer: Optional[ChunkWriter] = None
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """The shared embedding batcher, with default batch sizes unless main() configured it."""
+    global embedding_batcher
+    if embedding_batcher is None:
+        embedding_batcher = EmbeddingBatcher(get_openai_client(), limiter=embedding_limiter)
+    return embedding_batcher
+
+def get_chunk_summarizer() -> ChunkSummarizer:
+    """The shared chunk summarizer, in "auto" mode unless main() configured it."""
+    global chunk_summarizer
+    if chunk_summarizer is None:
+        chunk_summarizer = ChunkSummarizer(
+            get_openai_client(),
+            model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+            limiter=llm_limiter
+        )
+    return chunk_summarizer
+
+def get_chunk_writer() -> ChunkWriter:
+    """The shared chunk writer, with the default batch size unless main() configured it."""
+    global chunk_writer
+    if chunk_writer is None:
+        chunk_writer = ChunkWriter(get_supabase())
+    return chunk_writer
+
+# On-disk cache so unchanged chunks are never embedded twice (opened on first use)
+embedding_cache = EmbeddingCache()
+
+# Rows per request when reading deepseek_page_state (below PostgREST's default max-rows of 1000)
+STATE_PAGE_SIZE = 500
+
+# Token budget per chunk and tokens repeated between chunks cut mid-section
+chunk_max_tokens = 1000
+chunk_overlap_tokens = 100
 
-except Exception as e:
-    print(f"\nDatabase connection error: {str(e)}")
-    sys.exit(1)
+def check_database() -> int:
+    """Connectivity test: the number of chunks in deepseek_pages.
+
+    A head-only exact count, so no rows are transferred. Raises if the
+    database cannot be reached or the table is missing.
+    """
+    result = get_supabase().table("deepseek_pages").select("id", count="exact", head=True).execute()
+    return result.count
+
+def print_check() -> bool:
+    """Print where credentials come from and whether the database answers."""
+    print(f"Loading .env file from: {env_path}")
+    for name in ("SUPABASE_URL", "SUPABASE_SERVICE_KEY", "OPENAI_API_KEY"):
+        print(f"{name}: {'[SET]' if os.getenv(name) else '[NOT SET]'}")
+    try:
+        print(f"Connected, deepseek_pages has {check_database()} chunks")
+        return True
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return False
 
 @dataclass
 class ProcessedChunk:
@@ -71,225 +131,390 @@ class ProcessedChunk:
     metadata: Dict[str, Any]
     embedding: List[float]
 
-def chunk_text(text: str, chunk_size: int = 5000) -> List[str]:
-    """Split text into chunks, respecting code blocks and paragraphs."""
-    chunks = []
-    start = 0
-    text_length = len(text)
-
-    while start < text_length:
-        # Calculate end position
-        end = start + chunk_size
-
-        # If we're at the end of the text, just take what's left
-        if end >= text_length:
-            chunks.append(text[start:].strip())
-            break
-
-        # Try to find a code block boundary first (```)
-        chunk = text[start:end]
-        code_block = chunk.rfind('```')
-        if code_block != -1 and code_block > chunk_size * 0.3:
-            end = start + code_block
-
-        # If no code block, try to break at a paragraph
-        elif '\n\n' in chunk:
-            # Find the last paragraph break
-            last_break = chunk.rfind('\n\n')
-            if last_break > chunk_size * 0.3:  # Only break if we're past 30% of chunk_size
-                end = start + last_break
-
-        # If no paragraph break, try to break at a sentence
-        elif '. ' in chunk:
-            # Find the last sentence break
-            last_period = chunk.rfind('. ')
-            if last_period > chunk_size * 0.3:  # Only break if we're past 30% of chunk_size
-                end = start + last_period + 1
-
-        # Extract chunk and clean it up
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        # Move start position for next chunk
-        start = max(start + 1, end)
-
-    return chunks
+@dataclass
+class PageJob:
+    """A fetched page moving through the ingest pipeline."""
+    url: str
+    markdown: str
+    lastmod: Optional[str] = None
+    etag: Optional[str] = None  # HTTP validators for the next crawl's conditional request
+    last_modified: Optional[str] = None
+    page_hash: str = ""
+    chunk_count: int = 0
+    remaining: int = 0
+    processed: List[ProcessedChunk] = field(default_factory=list)
+    failed: int = 0
+
+@dataclass
+class ChunkJob:
+    """A chunk of a page waiting for its title, summary and embedding."""
+    page: PageJob
+    chunk_number: int
+    content: str
+    title: str = ""
+    summary: str = ""
+
+def content_hash(text: str) -> str:
+    """Stable hash of page or chunk content used to detect changes between crawls."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
-    """Extract title and summary using GPT-4."""
-    system_prompt = """You are an AI that extracts titles and summaries from documentation chunks.
-    Return a JSON object with 'title' and 'summary' keys.
-    For the title: If this seems like the start of a document, extract its title. If it's a middle chunk, derive a descriptive title.
-    For the summary: Create a concise summary of the main points in this chunk.
-    Keep both title and summary concise but informative."""
-    
-    try:
-        response = await openai_client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}..."}  # Send first 1000 chars for context
-            ],
-            response_format={ "type": "json_object" }
-        )
-        return json.loads(response.choices[0].message.content)
-    
-    except Exception as e:
-        print(f"Error getting title and summary: {e}")
-        return {"title": "Error processing title", "summary": "Error processing summary"}
+    """Title and summary from the chunk's heading, or from the LLM in batches.
+
+    Raises if the model cannot be reached or returns no usable JSON.
+    """
+    return await get_chunk_summarizer().summarize(chunk, url)
 
 async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
-    
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+    """Get embedding vector from the cache, or from OpenAI via the shared batcher.
+
+    Raises once the batcher has given up, so no placeholder vector is ever stored.
+    """
+    cached = await asyncio.to_thread(embedding_cache.get, text)
+    if cached is not None:
+        return cached
+
+    embedding = await get_embedding_batcher().embed(text)
+    await asyncio.to_thread(embedding_cache.put, text, embedding)
+    return embedding
+
+async def summarize_chunk(job: ChunkJob) -> List[Any]:
+    """Summarize stage: add a title and summary to a chunk."""
+    # Pages without changed chunks pass straight through to the write stage
+    if isinstance(job, PageJob):
+        return [job]
+    extracted = await get_title_and_summary(job.content, job.page.url)
+    job.title = extracted['title']
+    job.summary = extracted['summary']
+    return [job]
+
+async def embed_chunk(job: ChunkJob) -> List[Any]:
+    """Embed stage: embed a chunk and pass its page on once every chunk is done."""
+    if isinstance(job, PageJob):
+        return [job]
+    embedding = await get_embedding(job.content)
 
-async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChunk:
-    """Process a single chunk of text."""
-    # Get title and summary
-    extracted = await get_title_and_summary(chunk, url)
-    
-    # Get embedding
-    embedding = await get_embedding(chunk)
-    
     # Create metadata
     metadata = {
         "source": "deepseek_docs",  # Changed from pydantic_ai_docs
-        "chunk_size": len(chunk),
+        "chunk_size": len(job.content),
+        "content_hash": content_hash(job.content),
         "crawled_at": datetime.now(timezone.utc).isoformat(),
-        "url_path": urlparse(url).path
+        "url_path": urlparse(job.page.url).path
     }
-    
-    return ProcessedChunk(
-        url=url,
-        chunk_number=chunk_number,
-        title=extracted['title'],
-        summary=extracted['summary'],
-        content=chunk,  # Store the original chunk content
+
+    page = job.page
+    page.processed.append(ProcessedChunk(
+        url=page.url,
+        chunk_number=job.chunk_number,
+        title=job.title,
+        summary=job.summary,
+        content=job.content,  # Store the original chunk content
         metadata=metadata,
         embedding=embedding
-    )
+    ))
+    page.remaining -= 1
+    return [page] if page.remaining == 0 else []
+
+def fail_chunk(job: ChunkJob, error: Exception) -> List[Any]:
+    """Error handler of the summarize and embed stages: drop the chunk, not its page.
+
+    The rest of the page is still written, but its state is not recorded, so
+    the next crawl picks the page up again.
+    """
+    if isinstance(job, PageJob):
+        return []
+    print(f"Chunk {job.chunk_number} of {job.page.url} failed, will retry next crawl: {error}")
+    page = job.page
+    page.failed += 1
+    page.remaining -= 1
+    return [page] if page.remaining == 0 else []
+
+def load_page_states() -> Dict[str, Dict[str, Any]]:
+    """Load the last crawl state (lastmod, HTTP validators, page hash, chunk count) of every page.
+
+    Read in pages of STATE_PAGE_SIZE rows, since PostgREST truncates a
+    response at the project's max-rows and missing pages would be recrawled.
+    """
+    states: Dict[str, Dict[str, Any]] = {}
+    while True:
+        rows = get_supabase().table("deepseek_page_state")\
+            .select("url, lastmod, etag, last_modified, page_hash, chunk_count")\
+            .order("url")\
+            .range(len(states), len(states) + STATE_PAGE_SIZE - 1)\
+            .execute().data
+        states.update((row["url"], row) for row in rows)
+        if len(rows) < STATE_PAGE_SIZE:
+            return states
+
+def get_chunk_hashes(url: str) -> Dict[int, str]:
+    """Get the stored content hash of each chunk of a page, without its embedding."""
+    result = get_supabase().table("deepseek_pages")\
+        .select("chunk_number, content_hash:metadata->>content_hash")\
+        .eq("url", url)\
+        .execute()
+    return {row["chunk_number"]: row["content_hash"] for row in result.data}
+
+def save_page_state(
+    url: str,
+    lastmod: Optional[str],
+    page_hash: str,
+    chunk_count: int,
+    title: Optional[str] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None
+):
+    """Record what was stored for a page in the page catalog.
+
+    The next incremental crawl uses it to skip the page, and the agent lists
+    pages from it. `title` is left unchanged when not given.
+    """
+    state = {
+        "url": url,
+        "lastmod": lastmod,
+        "page_hash": page_hash,
+        "chunk_count": chunk_count,
+        "etag": etag,
+        "last_modified": last_modified,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    if title is not None:
+        state["title"] = title
+    get_supabase().table("deepseek_page_state").upsert(state, on_conflict="url").execute()
+
+def save_page_validators(url: str, lastmod: Optional[str], etag: Optional[str], last_modified: Optional[str]):
+    """Record a new sitemap lastmod and HTTP validators for a page whose content did not change."""
+    get_supabase().table("deepseek_page_state")\
+        .update({"lastmod": lastmod, "etag": etag, "last_modified": last_modified})\
+        .eq("url", url)\
+        .execute()
+
+def mark_page_for_retry(url: str):
+    """Clear a page's lastmod, validators and hash so the next incremental crawl reprocesses it."""
+    get_supabase().table("deepseek_page_state")\
+        .update({"lastmod": None, "etag": None, "last_modified": None, "page_hash": ""})\
+        .eq("url", url)\
+        .execute()
+
+def bump_corpus_version() -> int:
+    """Tell agent processes that pages changed so they drop their page caches."""
+    return get_supabase().rpc("bump_corpus_version", {}).execute().data
+
+def delete_stale_chunks(url: str, chunk_count: int):
+    """Delete chunks left over from a longer previous version of a page."""
+    get_supabase().table("deepseek_pages")\
+        .delete()\
+        .eq("url", url)\
+        .gte("chunk_number", chunk_count)\
+        .execute()
+
+def needs_recrawl(url: str, lastmod: Optional[str], page_states: Dict[str, Dict[str, Any]]) -> bool:
+    """Whether the sitemap reports a page as changed since it was last stored."""
+    state = page_states.get(url)
+    return state is None or lastmod is None or state["lastmod"] != lastmod
+
+async def prepare_document(
+    page: PageJob,
+    incremental: bool = False,
+    page_state: Optional[Dict[str, Any]] = None
+) -> List[Any]:
+    """Chunk stage: split a page and return the chunks that need processing.
+
+    In incremental mode unchanged pages are dropped here and only chunks whose
+    content hash changed are passed on. A changed page without changed chunks
+    is passed on by itself so the write stage can record it.
+    """
+    page.page_hash = content_hash(page.markdown)
+    if incremental and page_state and page_state["page_hash"] == page.page_hash:
+        print(f"Unchanged content, skipping: {page.url}")
+        if (page_state["lastmod"], page_state.get("etag"), page_state.get("last_modified")) != \
+                (page.lastmod, page.etag, page.last_modified):
+            await asyncio.to_thread(save_page_validators, page.url, page.lastmod, page.etag, page.last_modified)
+        return []
 
-async def insert_chunk(chunk: ProcessedChunk, update_existing: bool = False):
-    """Insert or update a processed chunk in Supabase."""
-    try:
-        # First, check if the chunk already exists
-        print(f"\nChecking chunk existence for:")
-        print(f"URL: {chunk.url}")
-        print(f"Chunk number: {chunk.chunk_number}")
-        
-        existing = supabase.table("deepseek_pages")\
-            .select("*")\
-            .eq("url", chunk.url)\
-            .eq("chunk_number", chunk.chunk_number)\
-            .execute()
-        
-        print(f"Database response:")
-        print(f"Data: {existing.data}")
-        print(f"Count: {len(existing.data)}")
-        
-        data = {
-            "url": chunk.url,
-            "chunk_number": chunk.chunk_number,
-            "title": chunk.title,
-            "summary": chunk.summary,
-            "content": chunk.content,
-            "metadata": chunk.metadata,
-            "embedding": chunk.embedding
-        }
-        
-        if existing.data:
-            if update_existing:
-                print(f"Updating existing chunk...")
-                result = supabase.table("deepseek_pages")\
-                    .update(data)\
-                    .eq("url", chunk.url)\
-                    .eq("chunk_number", chunk.chunk_number)\
-                    .execute()
-                print(f"Update complete")
-            else:
-                print(f"Skipping existing chunk")
-                return None
-        else:
-            print(f"Inserting new chunk...")
-            result = supabase.table("deepseek_pages")\
-                .insert(data)\
-                .execute()
-            print(f"Insert complete")
-            
-        return result
-    
-    except Exception as e:
-        print(f"\nError in database operation:")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error message: {str(e)}")
-        print(f"For chunk: URL={chunk.url}, Number={chunk.chunk_number}")
-        return None
-
-async def process_and_store_document(url: str, markdown: str, update_existing: bool = False):
-    """Process a document and store its chunks in parallel."""
     # Split into chunks
-    chunks = chunk_text(markdown)
-    
-    # Process chunks in parallel
-    tasks = [
-        process_chunk(chunk, i, url) 
-        for i, chunk in enumerate(chunks)
-    ]
-    processed_chunks = await asyncio.gather(*tasks)
-    
-    # Store chunks in parallel
-    insert_tasks = [
-        insert_chunk(chunk, update_existing) 
-        for chunk in processed_chunks
+    chunks = chunk_text(page.markdown, chunk_max_tokens, chunk_overlap_tokens)
+    page.chunk_count = len(chunks)
+
+    # Only keep chunks whose content differs from what is stored
+    stored_hashes = await asyncio.to_thread(get_chunk_hashes, page.url) if incremental else {}
+    changed = [
+        ChunkJob(page, i, chunk) for i, chunk in enumerate(chunks)
+        if stored_hashes.get(i) != content_hash(chunk)
     ]
-    await asyncio.gather(*insert_tasks)
-
-async def crawl_parallel(urls: List[str], max_concurrent: int = 5, update_existing: bool = False):
-    """Crawl multiple URLs in parallel with a concurrency limit."""
-    browser_config = BrowserConfig(
-        headless=True,
-        verbose=False,
-        extra_args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"],
-    )
-    crawl_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
+    if incremental:
+        print(f"{len(changed)} of {len(chunks)} chunks changed: {page.url}")
+
+    page.remaining = len(changed)
+    return changed or [page]
+
+async def store_document(page: PageJob, update_existing: bool = False, incremental: bool = False) -> bool:
+    """Write stage: store a page's processed chunks and record its state.
+
+    In incremental mode chunks past the end of the new page are deleted. Pages
+    with failed chunks are marked for retry instead. Returns whether the
+    stored page changed.
+    """
+    processed_chunks = sorted(page.processed, key=lambda chunk: chunk.chunk_number)
+
+    # Store chunks with one upsert per batch
+    batches = await get_chunk_writer().write(processed_chunks, update_existing or incremental)
+    written = sum(batch.written for batch in batches)
+    print(f"Stored {written} of {len(processed_chunks)} chunks: {page.url}")
 
-    # Create the crawler instance
-    crawler = AsyncWebCrawler(config=browser_config)
-    await crawler.start()
+    if page.failed:
+        print(f"{page.failed} chunks failed, marking for retry: {page.url}")
+        await asyncio.to_thread(mark_page_for_retry, page.url)
+        return written > 0
 
+    # Skipped or failed writes leave the stored page out of date, so only
+    # record its state when every chunk made it to the database
+    if written == len(processed_chunks) and not any(batch.error for batch in batches):
+        if incremental or update_existing:
+            await asyncio.to_thread(delete_stale_chunks, page.url, page.chunk_count)
+        title = next((chunk.title for chunk in processed_chunks if chunk.chunk_number == 0), None)
+        await asyncio.to_thread(save_page_state, page.url, page.lastmod, page.page_hash, page.chunk_count, title,
+                                page.etag, page.last_modified)
+        return True
+    return written > 0
+
+async def crawl_parallel(
+    urls: List[str],
+    max_concurrent: int = 5,
+    update_existing: bool = False,
+    lastmods: Optional[Dict[str, Optional[str]]] = None,
+    page_states: Optional[Dict[str, Dict[str, Any]]] = None,
+    summarize_workers: int = 20,
+    embed_workers: int = 64,
+    write_workers: int = 4,
+    queue_size: int = 100,
+    report_interval: Optional[float] = 10,
+    fetch_mode: str = "auto",
+    min_markdown_chars: int = 200
+) -> int:
+    """Crawl URLs through the fetch, chunk, summarize, embed and write stages.
+
+    `max_concurrent` is the number of fetch workers; every other stage has its
+    own worker count and a queue of at most `queue_size` items in front of it.
+    Pages are fetched over plain HTTP first and through the headless browser
+    only when that fails or yields too little text (`fetch_mode` "auto"), or
+    with just one of the two ("http" or "browser"). HTTP pages converting to
+    fewer than `min_markdown_chars` characters are assumed to need JavaScript.
+    Passing `page_states` enables incremental mode, where unchanged pages and
+    chunks are skipped before any model call. Returns the number of pages
+    whose stored content changed.
+    """
+    lastmods = lastmods or {}
+    incremental = page_states is not None
+    http_fetcher = None
+    if fetch_mode != "browser":
+        http_fetcher = HttpFetcher(max_connections=max_concurrent * 2, min_markdown_chars=min_markdown_chars)
+    crawler = None
+    run_config = None
+    crawler_lock = asyncio.Lock()
+    browser_pages = 0
+
+    async def browser_fetch(url: str) -> Optional[str]:
+        nonlocal crawler, run_config, browser_pages
+        async with crawler_lock:
+            if crawler is None:
+                # Chromium is only started (and crawl4ai imported) once a page needs it
+                from crawl4ai import AsyncWebCrawler, BrowserConfig
+                browser = AsyncWebCrawler(config=BrowserConfig(
+                    headless=True,
+                    verbose=False,
+                    extra_args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"],
+                ))
+                await browser.start()
+                run_config = browser_run_config()
+                crawler = browser
+        # Each page gets its own tab; a shared session_id would have concurrent fetches share one
+        result = await crawler.arun(url=url, config=run_config)
+        if not result.success:
+            print(f"Failed: {url} - Error: {result.error_message}")
+            return None
+        browser_pages += 1
+        return result.markdown_v2.raw_markdown
+
+    async def fetch(url: str) -> List[PageJob]:
+        state = page_states.get(url, {}) if incremental else {}
+        if http_fetcher is not None:
+            # Validators are only sent in incremental mode; a full crawl reprocesses every page
+            result = await http_fetcher.fetch(url, state.get("etag"), state.get("last_modified"))
+            if result.status == "not_modified":
+                print(f"Not modified since last crawl, skipping: {url}")
+                # A 304 may carry a new ETag or Last-Modified, which the next run must send
+                validators = (lastmods.get(url), result.etag, result.last_modified)
+                if (state.get("lastmod"), state.get("etag"), state.get("last_modified")) != validators:
+                    await asyncio.to_thread(save_page_validators, url, *validators)
+                return []
+            if result.status == "fetched":
+                print(f"Fetched over HTTP: {url}")
+                return [PageJob(url, result.markdown, lastmods.get(url), result.etag, result.last_modified)]
+            if fetch_mode == "http":
+                print(f"Failed: {url} - Error: {result.reason}")
+                return []
+            print(f"Using the browser ({result.reason}): {url}")
+
+        markdown = await browser_fetch(url)
+        if markdown is None:
+            return []
+        print(f"Successfully crawled: {url}")
+        return [PageJob(url, markdown, lastmods.get(url))]
+
+    async def chunk(page: PageJob) -> List[Any]:
+        page_state = page_states.get(page.url) if incremental else None
+        return await prepare_document(page, incremental, page_state)
+
+    changed = []
+    async def write(page: PageJob) -> List[Any]:
+        changed.append(await store_document(page, update_existing, incremental))
+        return []
+
+    pipeline = Pipeline([
+        Stage("fetch", fetch, workers=max_concurrent, queue_size=queue_size),
+        Stage("chunk", chunk, workers=max_concurrent, queue_size=queue_size),
+        Stage("summarize", summarize_chunk, workers=summarize_workers, queue_size=queue_size, on_error=fail_chunk),
+        Stage("embed", embed_chunk, workers=embed_workers, queue_size=queue_size, on_error=fail_chunk),
+        Stage("write", write, workers=write_workers, queue_size=queue_size),
+    ], report_interval=report_interval)
+
+    memory = MemorySampler()
+    memory.start()
     try:
-        # Create a semaphore to limit concurrency
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def process_url(url: str):
-            async with semaphore:
-                result = await crawler.arun(
-                    url=url,
-                    config=crawl_config,
-                    session_id="session1"
-                )
-                if result.success:
-                    print(f"Successfully crawled: {url}")
-                    await process_and_store_document(url, result.markdown_v2.raw_markdown, update_existing)
-                else:
-                    print(f"Failed: {url} - Error: {result.error_message}")
-        
-        # Process all URLs in parallel with limited concurrency
-        await asyncio.gather(*[process_url(url) for url in urls])
+        await pipeline.run(urls)
     finally:
-        await crawler.close()
+        await memory.stop()
+        await get_chunk_summarizer().flush()
+        await get_embedding_batcher().flush()
+        if http_fetcher is not None:
+            await http_fetcher.close()
+        if crawler is not None:
+            await crawler.close()
+
+    print(pipeline.summary())
+    fetched = pipeline.stages[0].processed
+    rate = fetched / pipeline.seconds if pipeline.seconds else 0.0
+    print(f"Fetched {fetched} pages in {pipeline.seconds:.1f}s ({rate:.2f} pages/s), "
+          f"{browser_pages} through the browser; peak memory {memory.peak_mb:.0f} MB")
+    if http_fetcher is not None:
+        print(http_fetcher.summary())
+    print(get_chunk_writer().summary())
+    print(embedding_cache.summary())
+    print(f"Embedding API: {embedding_limiter.summary()}")
+    print(get_chunk_summarizer().summary())
+    print(f"Summary API: {llm_limiter.summary()}")
+    batcher = get_embedding_batcher()
+    print(f"Embedded {batcher.inputs_embedded} chunks in {batcher.requests_sent} requests "
+          f"({batcher.inputs_retried} retried, {batcher.inputs_failed} failed)")
+    return sum(changed)
 
 def get_deepseek_docs_urls() -> List[str]:  # Renamed from get_pydantic_ai_docs_urls
     """Get URLs from DeepSeek docs sitemap."""
+    return list(get_deepseek_docs_sitemap())
+
+def get_deepseek_docs_sitemap() -> Dict[str, Optional[str]]:
+    """Get URLs and their <lastmod> values (None when absent) from DeepSeek docs sitemap."""
     sitemap_url = "https://api-docs.deepseek.com/sitemap.xml"
     try:
         response = requests.get(sitemap_url)
@@ -301,29 +526,131 @@ def get_deepseek_docs_urls() -> List[str]:  # Renamed from get_pydantic_ai_docs_
         # Extract all URLs from the sitemap
         # Namespace remains the same despite additional xmlns declarations
         namespace = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-        urls = [loc.text for loc in root.findall('.//ns:loc', namespace)]
+        entries = {}
+        for url_element in root.findall('.//ns:url', namespace):
+            loc = url_element.find('ns:loc', namespace)
+            lastmod = url_element.find('ns:lastmod', namespace)
+            if loc is not None and loc.text:
+                entries[loc.text.strip()] = lastmod.text.strip() if lastmod is not None and lastmod.text else None
         
-        return urls
+        return entries
     except Exception as e:
         print(f"Error fetching sitemap: {e}")
-        return []
+        return {}
 
 async def main():
     parser = argparse.ArgumentParser(description='Crawl DeepSeek documentation')
+    parser.add_argument('--check', action='store_true',
+                       help='Only check the credentials and database connection, then exit')
     parser.add_argument('--update-existing', action='store_true',
                        help='Update existing documents instead of skipping')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only reprocess pages and chunks that changed since the last crawl')
+    parser.add_argument('--lexical-index', type=Path, default=os.getenv("LEXICAL_INDEX_PATH"),
+                       help='Rebuild the BM25 index at this path after crawling')
     parser.add_argument('--max-concurrent', type=int, default=5,
                        help='Maximum number of concurrent crawls')
+    parser.add_argument('--fetch', choices=FETCH_MODES, default='auto',
+                       help='Fetch pages over plain HTTP with the headless browser as a fallback (auto), '
+                            'over HTTP only (http), or with the browser only (browser)')
+    parser.add_argument('--min-markdown-chars', type=int, default=200,
+                       help='HTTP pages with less text than this are assumed to need JavaScript')
+    parser.add_argument('--summaries', choices=SUMMARY_MODES, default='auto',
+                       help='Titles and summaries from headings (heuristic), the LLM (llm), '
+                            'or headings where a chunk has one and the LLM otherwise (auto)')
+    parser.add_argument('--summary-batch-size', type=int, default=8,
+                       help='Maximum number of chunks per title and summary request')
+    parser.add_argument('--summarize-workers', type=int, default=20,
+                       help='Chunks waiting on titles and summaries at once')
+    parser.add_argument('--embed-workers', type=int, default=64,
+                       help='Chunks waiting on embeddings at once')
+    parser.add_argument('--write-workers', type=int, default=4,
+                       help='Pages written to the database at once')
+    parser.add_argument('--queue-size', type=int, default=100,
+                       help='Maximum number of items waiting in front of each stage')
+    parser.add_argument('--report-interval', type=float, default=10,
+                       help='Seconds between pipeline progress lines (0 to disable)')
+    parser.add_argument('--write-batch-size', type=int, default=100,
+                       help='Maximum number of chunks per database upsert')
+    parser.add_argument('--embedding-batch-size', type=int, default=256,
+                       help='Maximum number of chunks per embedding request')
+    parser.add_argument('--embedding-batch-tokens', type=int, default=100_000,
+                       help='Maximum number of tokens per embedding request')
+    parser.add_argument('--embedding-flush-interval', type=float, default=0.05,
+                       help='Seconds to wait for more chunks before sending a partial batch')
+    parser.add_argument('--chunk-tokens', type=int, default=1000,
+                       help='Maximum number of tokens per chunk')
+    parser.add_argument('--chunk-overlap', type=int, default=100,
+                       help='Tokens repeated from the previous chunk when a section is split')
     args = parser.parse_args()
 
+    # Fail before the sitemap and the browser if the database is unreachable
+    if not print_check():
+        sys.exit(1)
+    if args.check:
+        return
+
+    global embedding_batcher, chunk_writer, chunk_summarizer, chunk_max_tokens, chunk_overlap_tokens
+    chunk_summarizer = ChunkSummarizer(
+        get_openai_client(),
+        model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+        mode=args.summaries,
+        limiter=llm_limiter,
+        max_batch_size=args.summary_batch_size
+    )
+    chunk_max_tokens = args.chunk_tokens
+    chunk_overlap_tokens = args.chunk_overlap
+    chunk_writer = ChunkWriter(
+        get_supabase(),
+        update_existing=args.update_existing,
+        batch_size=args.write_batch_size
+    )
+    embedding_batcher = EmbeddingBatcher(
+        get_openai_client(),
+        limiter=embedding_limiter,
+        max_batch_size=args.embedding_batch_size,
+        max_batch_tokens=args.embedding_batch_tokens,
+        flush_interval=args.embedding_flush_interval
+    )
+
     # Get URLs from DeepSeek docs
-    urls = get_deepseek_docs_urls()
+    lastmods = get_deepseek_docs_sitemap()
+    urls = list(lastmods)
     if not urls:
         print("No URLs found to crawl")
         return
+
+    page_states = None
+    if args.incremental:
+        page_states = load_page_states()
+        urls = [url for url in urls if needs_recrawl(url, lastmods[url], page_states)]
+        print(f"{len(lastmods) - len(urls)} pages unchanged since last crawl (sitemap lastmod)")
+        if not urls:
+            print("Nothing to update")
+            return
     
     print(f"Found {len(urls)} URLs to crawl")
-    await crawl_parallel(urls, max_concurrent=args.max_concurrent, update_existing=args.update_existing)
+    changed_pages = await crawl_parallel(
+        urls,
+        max_concurrent=args.max_concurrent,
+        update_existing=args.update_existing,
+        lastmods=lastmods,
+        page_states=page_states,
+        summarize_workers=args.summarize_workers,
+        embed_workers=args.embed_workers,
+        write_workers=args.write_workers,
+        queue_size=args.queue_size,
+        report_interval=args.report_interval or None,
+        fetch_mode=args.fetch,
+        min_markdown_chars=args.min_markdown_chars
+    )
+
+    if changed_pages:
+        version = await asyncio.to_thread(bump_corpus_version)
+        print(f"{changed_pages} pages changed, corpus version is now {version}")
+
+    if args.lexical_index:
+        await asyncio.to_thread(build_lexical_index, get_supabase(), Path(args.lexical_index))
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
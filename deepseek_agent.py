@@ -7,16 +7,27 @@ import asyncio
 import httpx
 import os
 
+from pydantic import Field
 from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic_ai.models.openai import OpenAIModel
 from openai import AsyncOpenAI
 from supabase import Client
-from typing import List
+from typing import Annotated, List, Optional
+
+from context_packer import format_sections, pack_context
+from embedding_cache import EmbeddingCache
+from lexical_index import LexicalIndex, looks_like_identifier, reciprocal_rank_fusion
+from page_catalog import PageCatalog
+from rate_limiter import load_rate_limiter_from_env
+from single_flight import SingleFlight
+from retrieval_prefetch import RetrievalPrefetch
+from telemetry import TimedModel, record_cache, record_tokens, span
+from vector_index import LocalVectorIndex
 
 load_dotenv()
 
 llm = os.getenv('LLM_MODEL', 'gpt-4o-mini')
-model = OpenAIModel(llm)
+model = TimedModel(OpenAIModel(llm))  # Each LLM turn is timed with its token counts
 
 logfire.configure(send_to_logfire='if-token-present')
 
@@ -24,6 +35,10 @@ logfire.configure(send_to_logfire='if-token-present')
 class DeepSeekDeps:  # Changed from PydanticAIDeps
     supabase: Client
     openai_client: AsyncOpenAI
+    vector_index: Optional[LocalVectorIndex] = None  # Search a local snapshot instead of the RPC
+    lexical_index: Optional[LexicalIndex] = None  # BM25 index fused with vector results
+    page_catalog: Optional[PageCatalog] = None  # Cached page list and page texts
+    prefetch: Optional[RetrievalPrefetch] = None  # Search for the user's message started ahead of the model
     
 system_prompt = """
 You are an expert at DeepSeek - an LLM agent framework. You have access to all the documentation including API references, 
@@ -44,70 +59,217 @@ agentic_rag = Agent(
     retries=2
 )
 
+# Shared with the crawler, so repeated questions skip the embedding call
+embedding_cache = EmbeddingCache()
+
+# Rate limits and retries for query embeddings, configured like the crawler's
+embedding_limiter = load_rate_limiter_from_env("EMBEDDING")
+
+# Search results considered for the prompt, and the tokens they may fill once packed
+context_candidates = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+context_diversity = float(os.getenv("CONTEXT_DIVERSITY", "0.5"))
+context_chunk_tokens = int(os.getenv("CONTEXT_CHUNK_TOKENS", "250"))
+
+# Corpus source searched unless the agent asks for another (metadata->>'source' of each chunk)
+default_source = os.getenv("DOC_SOURCE", "deepseek_docs")
+
+# pydantic-ai reads tool argument defaults from the annotation, not the signature
+SourceArgument = Annotated[Optional[str], Field(default=None)]
+
+# Concurrent identical questions share one embedding call and one search
+embedding_flight = SingleFlight("embedding")
+search_flight = SingleFlight("search")
+
 async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await openai_client.embeddings.create(
+    """Get embedding vector from the cache, or from OpenAI on a miss.
+
+    Raises when the embedding cannot be fetched after retries.
+    """
+    cached = await asyncio.to_thread(embedding_cache.get, text)
+    record_cache("embedding", cached is not None)
+    if cached is not None:
+        return cached
+    return await embedding_flight.run(text, lambda: fetch_embedding(text, openai_client))
+
+async def fetch_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
+    with span("embedding", "text-embedding-3-small", chars=len(text)):
+        response = await embedding_limiter.call(
+            openai_client.embeddings.create,
             model="text-embedding-3-small",
-            input=text
+            input=text,
+            tokens=len(text) // 4 + 1
         )
-        return response.data[0].embedding
+        record_tokens("embedding", getattr(response.usage, "prompt_tokens", None))
+    embedding = response.data[0].embedding
+    await asyncio.to_thread(embedding_cache.put, text, embedding)
+    return embedding
+
+def search_vectors(deps: DeepSeekDeps, query_embedding: List[float], match_count: int, source: str) -> List[dict]:
+    """Vector search of one source through the local snapshot if there is one, else the Supabase RPC."""
+    if deps.vector_index is not None:
+        with span("search", "local_vector_index", match_count=match_count, source=source):
+            return deps.vector_index.search(
+                query_embedding,
+                match_count=match_count,
+                filter={'source': source},
+                include_embeddings=True
+            )
+    with span("db", "match_deepseek_pages", match_count=match_count, source=source):
+        return deps.supabase.rpc('match_deepseek_pages', {
+            'query_embedding': query_embedding,
+            'match_count': match_count,
+            'filter': {'source': source}  # Searched with the source's partial vector index
+        }).execute().data
+
+def fetch_chunks(deps: DeepSeekDeps, ids: List[int]) -> List[dict]:
+    """Load chunks by table id, keeping the order of `ids`."""
+    found = {doc['id']: doc for doc in deps.vector_index.rows_by_id(ids)} if deps.vector_index else {}
+    missing = [row_id for row_id in ids if row_id not in found]
+    if missing:
+        with span("db", "fetch_chunks", rows=len(missing)):
+            result = deps.supabase.from_('deepseek_pages') \
+                .select('id,url,chunk_number,title,summary,content,metadata') \
+                .in_('id', missing) \
+                .execute()
+        found.update((doc['id'], doc) for doc in result.data)
+    return [found[row_id] for row_id in ids if row_id in found]
+
+async def hybrid_search(
+    deps: DeepSeekDeps,
+    user_query: str,
+    match_count: int = 5,
+    source: str = default_source
+) -> List[dict]:
+    """Vector search of one source fused with BM25 by reciprocal rank, when a lexical index is loaded.
+
+    Identifier-shaped queries (model names, parameters, paths, error codes) that
+    match the lexical index are answered from it alone, skipping the embedding call.
+    """
+    lexical_index = deps.lexical_index
+    if lexical_index is not None and looks_like_identifier(user_query):
+        with span("search", "lexical_index", identifier=True):
+            hits = lexical_index.search(user_query, match_count, source=source)
+        if hits:
+            return await asyncio.to_thread(fetch_chunks, deps, [row_id for row_id, _ in hits])
+
+    try:
+        query_embedding = await get_embedding(user_query, deps.openai_client)
     except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return [0] * 1536
+        if lexical_index is None:
+            raise
+        # Keyword results beat no results while the embedding API is unavailable
+        print(f"Embedding failed, using lexical search only: {e}")
+        hits = lexical_index.search(user_query, match_count, source=source)
+        return await asyncio.to_thread(fetch_chunks, deps, [row_id for row_id, _ in hits])
+    # The Supabase client is synchronous, so its requests run in a thread
+    if lexical_index is None:
+        return await asyncio.to_thread(search_vectors, deps, query_embedding, match_count, source)
+
+    # Over-fetch both lists so fusion has room to reorder them
+    docs = await asyncio.to_thread(search_vectors, deps, query_embedding, match_count * 2, source)
+    with span("search", "lexical_index"):
+        hits = lexical_index.search(user_query, match_count * 2, source=source)
+    ranked = reciprocal_rank_fusion([
+        [doc['id'] for doc in docs],
+        [row_id for row_id, _ in hits]
+    ])[:match_count]
+
+    by_id = {doc['id']: doc for doc in docs}
+    extra = await asyncio.to_thread(fetch_chunks, deps, [i for i in ranked if i not in by_id])
+    by_id.update((doc['id'], doc) for doc in extra)
+    return [by_id[row_id] for row_id in ranked if row_id in by_id]
     
+async def format_documents(docs: List[dict]) -> str:
+    """Search results packed into the context token budget, neighbouring chunks merged."""
+    # Rows from the RPC carry no vectors, but the crawler cached each chunk's embedding
+    missing = [i for i, doc in enumerate(docs) if doc.get('embedding') is None]
+    cached = await asyncio.to_thread(embedding_cache.get_many, [docs[i]['content'] for i in missing]) if missing else []
+    embeddings = [doc.get('embedding') for doc in docs]
+    for i, vector in zip(missing, cached):
+        embeddings[i] = vector
+    with span("context", "pack", candidates=len(docs)):
+        sections = pack_context(docs, context_token_budget, context_diversity, embeddings=embeddings,
+                                max_chunk_tokens=context_chunk_tokens)
+    return format_sections(sections)
+
+async def search_documentation(
+    deps: DeepSeekDeps,
+    user_query: str,
+    match_count: int,
+    source: str = default_source
+) -> List[dict]:
+    """`hybrid_search`, sharing the results of an identical search that is already running."""
+    key = (id(deps.supabase), id(deps.vector_index), id(deps.lexical_index), user_query, match_count, source)
+    return await search_flight.run(key, lambda: hybrid_search(deps, user_query, match_count, source))
+
 @agentic_rag.tool
-async def retrieve_relevant_documentation(ctx: RunContext[DeepSeekDeps], user_query: str) -> str:
+async def retrieve_relevant_documentation(
+    ctx: RunContext[DeepSeekDeps],
+    user_query: str,
+    source: SourceArgument = None
+) -> str:
     """
     Retrieve relevant DeepSeek documentation chunks using vector similarity search
 
     Args:
         ctx: Context with Supabase and OpenAI clients
         user_query: User's question/query
+        source: Corpus to search, such as "deepseek_docs" or "changelogs"; defaults to the DeepSeek docs
 
     Returns:
-        str: Top 5 relevant documentation chunks with sources
+        str: The most relevant documentation sections with sources, within the context token budget
     """
     try:
-        query_embedding = await get_embedding(user_query, ctx.deps.openai_client)
-        
-        result = ctx.deps.supabase.rpc('match_deepseek_pages', {
-            'query_embedding': query_embedding,
-            'match_count': 5,
-            'filter': {'source': 'deepseek_docs'}  # Updated source filter
-        }).execute()
-        
-        if not result.data:
+        source = source or default_source
+        with span("tool", "retrieve_relevant_documentation", query=user_query, source=source) as tool_span:
+            docs = None
+            # The prefetch searched the default source
+            if ctx.deps.prefetch is not None and source == default_source:
+                docs = await ctx.deps.prefetch.take(user_query)
+                tool_span.set_attribute("prefetched", docs is not None)
+            if docs is None:
+                docs = await search_documentation(ctx.deps, user_query, match_count=context_candidates, source=source)
+
+        if not docs:
             return "No relevant documentation found."
-        
-        formatted_chunks = []
-        for doc in result.data:
-            chunk_text = f"""## {doc['title']}
-            Source: {doc['url']}
-            {doc['content'][:1000]}..."""
-            formatted_chunks.append(chunk_text)
-            
-        return "\n\n---\n\n".join(formatted_chunks)
+
+        return await format_documents(docs)
     
     except Exception as e:
         print(f"Documentation retrieval error: {e}")
         return f"Error: {str(e)}"
     
 @agentic_rag.tool
-async def list_documentation_pages(ctx: RunContext[DeepSeekDeps]) -> List[str]:
+async def list_documentation_pages(ctx: RunContext[DeepSeekDeps], source: SourceArgument = None) -> List[str]:
     """
     Get all available DeepSeek documentation URLs
+
+    Args:
+        source: Corpus to list, such as "deepseek_docs" or "changelogs"; defaults to the DeepSeek docs
     
     Returns:
         List[str]: Unique documentation page URLs
     """
     try:
-        result = ctx.deps.supabase.from_('deepseek_pages') \
-            .select('url') \
-            .eq('metadata->>source', 'deepseek_docs') \
-            .execute()
-            
-        return sorted(set(doc['url'] for doc in result.data)) if result.data else []
+        source = source or default_source
+        with span("tool", "list_documentation_pages", source=source):
+            if ctx.deps.page_catalog is not None:
+                with span("db", "page_catalog"):
+                    urls = await asyncio.to_thread(ctx.deps.page_catalog.list_urls, source)
+                if urls:
+                    return urls
+
+            # Databases crawled before the page catalog existed have to be scanned
+            with span("db", "list_urls"):
+                result = await asyncio.to_thread(
+                    ctx.deps.supabase.from_('deepseek_pages')
+                    .select('url')
+                    .eq('metadata->>source', source)
+                    .execute
+                )
+
+            return sorted(set(doc['url'] for doc in result.data)) if result.data else []
     
     except Exception as e:
         print(f"URL listing error: {e}")
@@ -125,18 +287,32 @@ async def get_page_content(ctx: RunContext[DeepSeekDeps], url: str) -> str:
         str: Complete page content with chunks ordered
     """
     try:
-        result = ctx.deps.supabase.from_('deepseek_pages') \
-            .select('title,content,chunk_number') \
-            .eq('url', url) \
-            .order('chunk_number') \
-            .execute()
-        
-        if not result.data:
-            return f'No content found for: {url}'
-        
-        content = [f"# {result.data[0]['title']}"]
-        content.extend(chunk['content'] for chunk in result.data)
-        return '\n\n'.join(content)
+        with span("tool", "get_page_content", url=url):
+            page_catalog = ctx.deps.page_catalog
+            if page_catalog is not None:
+                cached = await asyncio.to_thread(page_catalog.get_page, url)
+                record_cache("page", cached is not None)
+                if cached is not None:
+                    return cached
+
+            with span("db", "page_chunks"):
+                result = await asyncio.to_thread(
+                    ctx.deps.supabase.from_('deepseek_pages')
+                    .select('title,content,chunk_number')
+                    .eq('url', url)
+                    .order('chunk_number')
+                    .execute
+                )
+
+            if not result.data:
+                return f'No content found for: {url}'
+
+            content = [f"# {result.data[0]['title']}"]
+            content.extend(chunk['content'] for chunk in result.data)
+            page = '\n\n'.join(content)
+            if page_catalog is not None:
+                page_catalog.put_page(url, page)
+            return page
     
     except Exception as e:
         print(f"Content retrieval error: {e}")
@@ -0,0 +1,178 @@
+import asyncio
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+import tiktoken
+from openai import AsyncOpenAI, BadRequestError
+
+from rate_limiter import RateLimiter
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536
+
+def load_encoding(model: str = EMBEDDING_MODEL) -> Optional[tiktoken.Encoding]:
+    """Load the tokenizer for a model, or None if it cannot be downloaded."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        print(f"Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+@dataclass
+class PendingEmbedding:
+    text: str
+    tokens: int
+    future: asyncio.Future
+
+class EmbeddingBatcher:
+    """Collect embedding requests from concurrent callers and send them in batches.
+
+    Callers await `embed(text)` as if it were a single request. Pending texts are
+    sent as one `embeddings.create` call as soon as the batch reaches
+    `max_batch_size` inputs or `max_batch_tokens` tokens, or after
+    `flush_interval` seconds, whichever comes first. With a `limiter`, requests
+    go through its rate limits and retries instead of the batcher's own.
+    """
+
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        model: str = EMBEDDING_MODEL,
+        max_batch_size: int = 256,
+        max_batch_tokens: int = 100_000,
+        flush_interval: float = 0.05,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.openai_client = openai_client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.limiter = limiter
+
+        self._encoding = load_encoding(model)
+        self._pending: List[PendingEmbedding] = []
+        self._pending_tokens = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+        # Counters for the end-of-run report
+        self.requests_sent = 0
+        self.inputs_embedded = 0
+        self.inputs_retried = 0
+        self.inputs_failed = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue a text for embedding and wait for its vector."""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(PendingEmbedding(text, self._count_tokens(text), future))
+        return await future
+
+    def _count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            return len(text) // 4 + 1
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    async def flush(self):
+        """Send everything still pending and wait for all in-flight batches."""
+        self._flush_now()
+        while self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+
+    def _enqueue(self, item: PendingEmbedding):
+        # Never let a single batch go over the token budget
+        if self._pending and self._pending_tokens + item.tokens > self.max_batch_tokens:
+            self._flush_now()
+
+        self._pending.append(item)
+        self._pending_tokens += item.tokens
+
+        if len(self._pending) >= self.max_batch_size or self._pending_tokens >= self.max_batch_tokens:
+            self._flush_now()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._flush_now
+            )
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch = self._pending
+        self._pending = []
+        self._pending_tokens = 0
+
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[PendingEmbedding], attempt: int = 0):
+        """Embed a batch, retrying only the inputs that did not get a vector."""
+        try:
+            if self.limiter is not None:
+                response = await self.limiter.call(
+                    self.openai_client.embeddings.create,
+                    model=self.model,
+                    input=[item.text for item in batch],
+                    tokens=sum(item.tokens for item in batch)
+                )
+            else:
+                response = await self.openai_client.embeddings.create(
+                    model=self.model,
+                    input=[item.text for item in batch]
+                )
+        except BadRequestError as e:
+            # A bad input rejects the whole batch, so split it to isolate the culprit
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                await asyncio.gather(
+                    self._send(batch[:middle], attempt),
+                    self._send(batch[middle:], attempt)
+                )
+            else:
+                self._fail(batch, e)
+            return
+        except Exception as e:
+            if self.limiter is not None:
+                # The limiter already retried what was worth retrying
+                self._fail(batch, e)
+            else:
+                await self._retry(batch, attempt, e)
+            return
+
+        self.requests_sent += 1
+        vectors = {item.index: item.embedding for item in response.data}
+        missing = []
+        for i, item in enumerate(batch):
+            if i in vectors:
+                self.inputs_embedded += 1
+                if not item.future.done():
+                    item.future.set_result(vectors[i])
+            else:
+                missing.append(item)
+
+        if missing:
+            await self._retry(missing, attempt, RuntimeError("Embedding missing from response"))
+
+    async def _retry(self, batch: List[PendingEmbedding], attempt: int, error: Exception):
+        if attempt >= self.max_retries:
+            self._fail(batch, error)
+            return
+
+        print(f"Retrying {len(batch)} embeddings after error: {error}")
+        self.inputs_retried += len(batch)
+        await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        await self._send(batch, attempt + 1)
+
+    def _fail(self, batch: List[PendingEmbedding], error: Exception):
+        self.inputs_failed += len(batch)
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(error)
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from embedding_batcher import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "embeddings.sqlite3"
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: in-memory LRU in front of SQLite.
+
+    Entries are keyed by (model, dimensions, sha256 of the text) and stored as
+    float32 blobs. The database is shared by the crawler, the agent and every
+    API worker, and the least recently used rows are evicted once it grows past
+    `max_bytes`. Disk hits refresh `last_used` in memory; the new times are
+    written with the next `put`, before an eviction, or once `touch_batch`
+    have piled up, so reads do not commit.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_bytes: int = 512 * 1024 * 1024,
+        memory_entries: int = 2048,
+        touch_batch: int = 256
+    ):
+        self.path = Path(path or os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH))
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.touch_batch = touch_batch
+
+        self._memory: "OrderedDict[Tuple[str, int, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        self._touched: Dict[Tuple[str, int, str], float] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("pragma journal_mode=wal")
+            self._db.execute("""
+                create table if not exists embeddings (
+                    model text not null,
+                    dimensions integer not null,
+                    text_hash text not null,
+                    vector blob not null,
+                    last_used real not null,
+                    primary key (model, dimensions, text_hash)
+                )
+            """)
+            self._db.execute("create index if not exists idx_embeddings_last_used on embeddings (last_used)")
+            self._disk_bytes = self._db.execute(
+                "select coalesce(sum(length(vector)), 0) from embeddings"
+            ).fetchone()[0]
+        return self._db
+
+    @staticmethod
+    def key(text: str, model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS) -> Tuple[str, int, str]:
+        return (model, dimensions, hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+    def get(self, text: str, model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS) -> Optional[List[float]]:
+        """Return the cached vector for a text, or None on a miss."""
+        key = self.key(text, model, dimensions)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+            try:
+                db = self._connect()
+                row = db.execute(
+                    "select vector from embeddings where model = ? and dimensions = ? and text_hash = ?",
+                    key
+                ).fetchone()
+                if row is not None:
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= self.touch_batch:
+                        self._write_touched(db)
+                        db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache read error: {e}")
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            vector = array("f", row[0]).tolist()
+            self.disk_hits += 1
+            self._remember(key, vector)
+            return vector
+
+    def get_many(
+        self,
+        texts: List[str],
+        model: str = EMBEDDING_MODEL,
+        dimensions: int = EMBEDDING_DIMENSIONS
+    ) -> List[Optional[List[float]]]:
+        """Cached vectors for several texts (None for misses), read in one query.
+
+        Read-only: disk hits do not refresh `last_used`, so callers that only
+        peek at the cache (like context packing) never write to the database.
+        """
+        keys = [self.key(text, model, dimensions) for text in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            missing: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    vectors[i] = vector
+                else:
+                    missing.setdefault(key[2], []).append(i)
+            if not missing:
+                return vectors
+
+            try:
+                hashes = list(missing)
+                rows = self._connect().execute(
+                    "select text_hash, vector from embeddings where model = ? and dimensions = ? "
+                    f"and text_hash in ({','.join('?' * len(hashes))})",
+                    (model, dimensions, *hashes)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Embedding cache read error: {e}")
+                rows = []
+
+            for text_hash, blob in rows:
+                vector = array("f", blob).tolist()
+                self._remember((model, dimensions, text_hash), vector)
+                for i in missing.pop(text_hash):
+                    vectors[i] = vector
+                    self.disk_hits += 1
+            self.misses += sum(len(positions) for positions in missing.values())
+            return vectors
+
+    def put(self, text: str, vector: List[float], model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS):
+        """Store a vector for a text in memory and on disk."""
+        key = self.key(text, model, dimensions)
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            self._remember(key, list(vector))
+            try:
+                db = self._connect()
+                cursor = db.execute(
+                    "insert or ignore into embeddings (model, dimensions, text_hash, vector, last_used) "
+                    "values (?, ?, ?, ?, ?)",
+                    (*key, blob, time.time())
+                )
+                self._write_touched(db)
+                db.commit()
+                self._disk_bytes += len(blob) if cursor.rowcount else 0
+                if self._disk_bytes > self.max_bytes:
+                    self._evict(db)
+            except sqlite3.Error as e:
+                print(f"Embedding cache write error: {e}")
+
+    def _remember(self, key: Tuple[str, int, str], vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_touched(self, db: sqlite3.Connection):
+        """Write the pending last_used times of disk hits (the caller commits)."""
+        if self._touched:
+            db.executemany(
+                "update embeddings set last_used = ? where model = ? and dimensions = ? and text_hash = ?",
+                [(used, *key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self, db: sqlite3.Connection):
+        """Drop least recently used rows until the database is back under 90% of its budget."""
+        self._write_touched(db)
+        db.commit()
+        while self._disk_bytes > self.max_bytes * 0.9:
+            rows = db.execute("select count(*) from embeddings").fetchone()[0]
+            if rows == 0:
+                break
+            db.execute(
+                "delete from embeddings where rowid in "
+                "(select rowid from embeddings order by last_used limit ?)",
+                (max(1, rows // 10),)
+            )
+            db.commit()
+            # Other processes write to the same file, so recount instead of tracking deltas
+            self._disk_bytes = db.execute(
+                "select coalesce(sum(length(vector)), 0) from embeddings"
+            ).fetchone()[0]
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def summary(self) -> str:
+        """One-line hit/miss report."""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return (f"Embedding cache: {self.hits} hits ({self.memory_hits} memory, {self.disk_hits} disk), "
+                f"{self.misses} misses, {rate:.0%} hit rate")
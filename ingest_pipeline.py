@@ -0,0 +1,126 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+# A stage handler takes one item and returns the items to pass to the next stage
+Handler = Callable[[Any], Awaitable[Iterable[Any]]]
+# An error handler gets the item and the exception, and returns items to pass on instead
+ErrorHandler = Callable[[Any, Exception], Iterable[Any]]
+
+@dataclass
+class Stage:
+    """One step of a pipeline, run by `workers` tasks reading a queue of `queue_size` items."""
+    name: str
+    handler: Handler
+    workers: int = 1
+    queue_size: int = 100
+    on_error: Optional[ErrorHandler] = None
+
+    processed: int = 0
+    failed: int = 0
+    emitted: int = 0
+    active: int = 0
+    busy_seconds: float = 0.0
+    peak_depth: int = 0
+    queue: Optional[asyncio.Queue] = field(default=None, repr=False)
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+class Pipeline:
+    """Stages connected by bounded queues.
+
+    Each stage pulls items from its own queue and puts its outputs on the next
+    stage's queue, waiting when that queue is full, so a slow stage holds back
+    the ones before it instead of letting work pile up. A handler that raises
+    counts the item as failed and the pipeline carries on, passing on whatever
+    the stage's `on_error` returns.
+    """
+
+    def __init__(self, stages: List[Stage], report_interval: Optional[float] = 10):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.seconds = 0.0
+
+    async def run(self, items: Iterable[Any]):
+        """Feed `items` to the first stage and return once every stage is drained."""
+        started = time.perf_counter()
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+
+        workers = [
+            [asyncio.create_task(self._work(stage, next_stage)) for _ in range(stage.workers)]
+            for stage, next_stage in zip(self.stages, self.stages[1:] + [None])
+        ]
+        reporter = asyncio.create_task(self._report()) if self.report_interval else None
+
+        try:
+            for item in items:
+                await self._put(self.stages[0], item)
+
+            # A stage is finished once its queue is drained, because its
+            # workers hand outputs downstream before marking an item done
+            for stage, tasks in zip(self.stages, workers):
+                await stage.queue.join()
+                for task in tasks:
+                    task.cancel()
+        finally:
+            for task in [task for tasks in workers for task in tasks] + ([reporter] if reporter else []):
+                task.cancel()
+            await asyncio.gather(*[task for tasks in workers for task in tasks], return_exceptions=True)
+            if reporter:
+                await asyncio.gather(reporter, return_exceptions=True)
+            self.seconds = time.perf_counter() - started
+
+    async def _put(self, stage: Stage, item: Any):
+        await stage.queue.put(item)
+        stage.peak_depth = max(stage.peak_depth, stage.queue.qsize())
+
+    async def _work(self, stage: Stage, next_stage: Optional[Stage]):
+        while True:
+            item = await stage.queue.get()
+            stage.active += 1
+            started = time.perf_counter()
+            try:
+                try:
+                    outputs = await stage.handler(item)
+                    stage.processed += 1
+                except Exception as e:
+                    stage.failed += 1
+                    if stage.on_error is None:
+                        raise
+                    outputs = stage.on_error(item, e)
+                for output in outputs or ():
+                    stage.emitted += 1
+                    if next_stage:
+                        await self._put(next_stage, output)
+            except Exception as e:
+                print(f"Error in {stage.name} stage: {e}")
+            finally:
+                stage.busy_seconds += time.perf_counter() - started
+                stage.active -= 1
+                stage.queue.task_done()
+
+    async def _report(self):
+        previous = {stage.name: 0 for stage in self.stages}
+        while True:
+            await asyncio.sleep(self.report_interval)
+            parts = []
+            for stage in self.stages:
+                rate = (stage.processed - previous[stage.name]) / self.report_interval
+                previous[stage.name] = stage.processed
+                parts.append(f"{stage.name} {rate:.1f}/s q={stage.depth} busy={stage.active}/{stage.workers}")
+            print("Pipeline: " + " | ".join(parts))
+
+    def summary(self) -> str:
+        lines = [f"Pipeline finished in {self.seconds:.1f}s"]
+        for stage in self.stages:
+            rate = stage.processed / self.seconds if self.seconds else 0.0
+            utilization = stage.busy_seconds / (self.seconds * stage.workers) if self.seconds else 0.0
+            lines.append(
+                f"  {stage.name:<10} {stage.processed} done, {stage.failed} failed, {stage.emitted} passed on, "
+                f"{rate:.1f}/s, {stage.workers} workers {utilization:.0%} busy, peak queue {stage.peak_depth}"
+            )
+        return "\n".join(lines)
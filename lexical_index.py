@@ -0,0 +1,214 @@
+"""BM25 inverted index over deepseek_pages titles and content.
+
+The index is built from the table after a crawl and saved as a single `.npz`
+file: a vocabulary, CSR posting lists (document and term-frequency arrays) and
+per-document lengths, keys and sources, so it loads into a few flat arrays.
+
+    python lexical_index.py build --out lexical_index.npz
+"""
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+# Identifiers such as deepseek-reasoner, max_tokens, /chat/completions or 429
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[-./][a-z0-9_]+)*")
+IDENTIFIER_PATTERN = re.compile(r"`[^`]+`|\b\w+[-_./]\w[\w\-./]*|/\w+|\b\d{3}\b")
+TITLE_WEIGHT = 2
+BUILD_PAGE_SIZE = 1000
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens, keeping compound identifiers whole and adding their parts."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-./]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+def looks_like_identifier(query: str, max_words: int = 4) -> bool:
+    """Short queries made of API names, parameters, paths or error codes."""
+    return len(query.split()) <= max_words and bool(IDENTIFIER_PATTERN.search(query))
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Any]], k: int = 60) -> List[Any]:
+    """Merge ranked lists of keys by summing 1 / (k + rank)."""
+    scores: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class LexicalIndex:
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        frequencies: np.ndarray,
+        lengths: np.ndarray,
+        ids: np.ndarray,
+        urls: List[str],
+        sources: Optional[List[str]] = None,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.ids = ids
+        self.urls = urls
+        self.sources = sources  # None for indexes built before sources were stored
+        self._source_masks: Dict[str, np.ndarray] = {}
+        self.k1 = k1
+        self.b = b
+        self._average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, str, str, str, str]]) -> "LexicalIndex":
+        """Build from (id, url, title, content, source) tuples."""
+        vocabulary: Dict[str, int] = {}
+        term_docs: List[List[Tuple[int, int]]] = []
+        ids, urls, sources, lengths = [], [], [], []
+
+        for doc, (row_id, url, title, content, source) in enumerate(documents):
+            counts = Counter(tokenize(content))
+            for token in tokenize(title or ""):
+                counts[token] += TITLE_WEIGHT
+            for token, count in counts.items():
+                term = vocabulary.setdefault(token, len(vocabulary))
+                if term == len(term_docs):
+                    term_docs.append([])
+                term_docs[term].append((doc, count))
+            ids.append(row_id)
+            urls.append(url)
+            sources.append(source)
+            lengths.append(sum(counts.values()))
+
+        offsets = np.zeros(len(term_docs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(docs) for docs in term_docs])
+        postings = np.fromiter((doc for docs in term_docs for doc, _ in docs), dtype=np.int32, count=offsets[-1])
+        frequencies = np.fromiter((min(count, 65535) for docs in term_docs for _, count in docs),
+                                  dtype=np.uint16, count=offsets[-1])
+        return cls(vocabulary, offsets, postings, frequencies,
+                   np.asarray(lengths, dtype=np.int32), np.asarray(ids, dtype=np.int64), urls, sources)
+
+    def save(self, path: Path):
+        np.savez_compressed(
+            path,
+            vocabulary=np.array(json.dumps(self.vocabulary)),
+            urls=np.array(json.dumps(self.urls)),
+            sources=np.array(json.dumps(self.sources)),
+            offsets=self.offsets,
+            postings=self.postings,
+            frequencies=self.frequencies,
+            lengths=self.lengths,
+            ids=self.ids
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalIndex":
+        with np.load(path) as data:
+            return cls(
+                json.loads(str(data["vocabulary"])),
+                data["offsets"],
+                data["postings"],
+                data["frequencies"],
+                data["lengths"],
+                data["ids"],
+                json.loads(str(data["urls"])),
+                json.loads(str(data["sources"])) if "sources" in data.files else None
+            )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def source_mask(self, source: str) -> np.ndarray:
+        if source not in self._source_masks:
+            self._source_masks[source] = np.asarray([s == source for s in self.sources], dtype=bool)
+        return self._source_masks[source]
+
+    def search(self, query: str, match_count: int = 5, source: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Return (row id, BM25 score) pairs for the best matching chunks, of one source if given."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = False
+        for token in set(tokenize(query)):
+            term = self.vocabulary.get(token)
+            if term is None:
+                continue
+            matched = True
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.postings[start:end]
+            tf = self.frequencies[start:end].astype(np.float32)
+            idf = np.log(1 + (len(self.ids) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[docs] / self._average_length)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if not matched:
+            return []
+        if source is not None and self.sources is not None:
+            scores[~self.source_mask(source)] = 0
+        k = min(match_count, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+def load_lexical_index_from_env() -> Optional[LexicalIndex]:
+    """Load the index named by LEXICAL_INDEX_PATH, if it is set and exists."""
+    path = os.getenv("LEXICAL_INDEX_PATH")
+    if not path:
+        return None
+    try:
+        index = LexicalIndex.load(Path(path))
+    except OSError as e:
+        print(f"Lexical index not loaded: {e}")
+        return None
+    print(f"Loaded lexical index ({len(index)} chunks, {len(index.vocabulary)} terms)")
+    return index
+
+def build_lexical_index(supabase: Client, path: Path) -> LexicalIndex:
+    """Build the index from deepseek_pages and save it to `path`."""
+    documents = []
+    last_id = 0
+    while True:
+        rows = supabase.table("deepseek_pages")\
+            .select("id, url, title, content, source:metadata->>source")\
+            .gt("id", last_id)\
+            .order("id")\
+            .limit(BUILD_PAGE_SIZE)\
+            .execute().data
+        if not rows:
+            break
+        documents.extend((row["id"], row["url"], row["title"], row["content"], row["source"]) for row in rows)
+        last_id = rows[-1]["id"]
+
+    index = LexicalIndex.build(documents)
+    index.save(path)
+    print(f"Built lexical index: {len(index)} chunks, {len(index.vocabulary)} terms -> {path}")
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the BM25 index over deepseek_pages')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='Build the index from the table')
+    build.add_argument('--out', type=Path, default=Path(os.getenv("LEXICAL_INDEX_PATH", "lexical_index.npz")),
+                       help='Where to write the index')
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent / '.env')
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    build_lexical_index(supabase, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from supabase import Client
+
+# Rows per catalog request (below PostgREST's default max-rows of 1000)
+CATALOG_PAGE_SIZE = 500
+
+class PageCatalog:
+    """In-process cache of the page catalog and of assembled page texts.
+
+    The catalog (url, title, source, chunk count, content hash, updated_at) is
+    read from `deepseek_page_state`, which the crawler maintains. Assembled page
+    texts are kept in an LRU bounded by `max_page_bytes`. Everything is dropped
+    when the crawler bumps `deepseek_corpus_version`, which is checked at most
+    every `check_interval` seconds.
+    """
+
+    def __init__(self, supabase: Client, check_interval: float = 30, max_page_bytes: int = 32 * 1024 * 1024):
+        self.supabase = supabase
+        self.check_interval = check_interval
+        self.max_page_bytes = max_page_bytes
+
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._catalog: Optional[List[Dict[str, Any]]] = None
+        self._pages: "OrderedDict[str, str]" = OrderedDict()
+        self._page_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        try:
+            rows = self.supabase.table("deepseek_corpus_version").select("version").eq("id", 1).execute().data
+        except Exception as e:
+            print(f"Corpus version check failed: {e}")
+            return
+        version = rows[0]["version"] if rows else None
+        if version != self._version:
+            with self._lock:
+                self._version = version
+                self._catalog = None
+                self._pages.clear()
+                self._page_bytes = 0
+
+    def catalog(self) -> List[Dict[str, Any]]:
+        """All catalogued pages, ordered by URL."""
+        self._check_version()
+        if self._catalog is None:
+            # Read in pages, since PostgREST truncates a response at the project's max-rows
+            pages: List[Dict[str, Any]] = []
+            while True:
+                rows = self.supabase.table("deepseek_page_state")\
+                    .select("url, title, source, chunk_count, page_hash, updated_at")\
+                    .order("url")\
+                    .range(len(pages), len(pages) + CATALOG_PAGE_SIZE - 1)\
+                    .execute().data
+                pages.extend(rows)
+                if len(rows) < CATALOG_PAGE_SIZE:
+                    break
+            self._catalog = pages
+        return self._catalog
+
+    def list_urls(self, source: str = "deepseek_docs") -> List[str]:
+        return [page["url"] for page in self.catalog() if page["source"] == source]
+
+    def get_page(self, url: str) -> Optional[str]:
+        """Cached page text, or None if it has not been assembled since the last version bump."""
+        self._check_version()
+        with self._lock:
+            content = self._pages.get(url)
+            if content is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(url)
+            self.hits += 1
+            return content
+
+    def put_page(self, url: str, content: str):
+        size = len(content.encode("utf-8"))
+        if size > self.max_page_bytes:
+            return
+        with self._lock:
+            previous = self._pages.pop(url, None)
+            if previous is not None:
+                self._page_bytes -= len(previous.encode("utf-8"))
+            self._pages[url] = content
+            self._page_bytes += size
+            while self._page_bytes > self.max_page_bytes:
+                _, evicted = self._pages.popitem(last=False)
+                self._page_bytes -= len(evicted.encode("utf-8"))
@@ -0,0 +1,167 @@
+"""Plain HTTP fetch tier for the crawler, ahead of the headless browser.
+
+Most documentation pages are rendered on the server, so a pooled HTTP client
+gets the same HTML as Chromium for a fraction of the memory and time. The HTML
+goes through crawl4ai's own scraping and markdown steps, so both tiers produce
+the same markdown for the same page. Conditional requests (If-None-Match /
+If-Modified-Since with the validators stored from the last crawl) turn
+unchanged pages into bodiless 304 responses. Pages that come back without
+enough text, or not as HTML, are left to the browser.
+"""
+import asyncio
+import resource
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+
+try:
+    import psutil
+except ImportError:  # Peak memory then covers this process only, without the browser's processes
+    psutil = None
+
+FETCH_MODES = ("auto", "http", "browser")
+
+def browser_run_config() -> Any:
+    """crawl4ai run settings for the browser tier, which the HTTP tier converts with as well."""
+    from crawl4ai import CacheMode, CrawlerRunConfig
+    return CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
+
+def html_to_markdown(html: str, url: str) -> str:
+    """A page's markdown, derived from its HTML the way crawl4ai derives `raw_markdown`.
+
+    These are the scraping and markdown steps AsyncWebCrawler runs on a
+    rendered page, with the same settings, so a page's content hash (and its
+    chunks' embeddings) does not depend on which tier fetched it.
+    """
+    from crawl4ai.content_scraping_strategy import WebScrapingStrategy
+    from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+    from crawl4ai.utils import sanitize_input_encode
+
+    config = browser_run_config()
+    params = {key: value for key, value in config.to_dict().items() if key != "url"}
+    scraped = WebScrapingStrategy().scrap(url, html, is_raw_html=False, **params)
+    if scraped is None:
+        return ""
+    # Older crawl4ai releases return a dict, newer ones a ScrapingResult
+    cleaned_html = scraped.get("cleaned_html", "") if isinstance(scraped, dict) else scraped.cleaned_html
+    generator = config.markdown_generator or DefaultMarkdownGenerator()
+    result = generator.generate_markdown(cleaned_html=sanitize_input_encode(cleaned_html), base_url=url)
+    return sanitize_input_encode(result.raw_markdown)
+
+@dataclass
+class FetchResult:
+    url: str
+    status: str  # "fetched", "not_modified" or "fallback" (leave the page to the browser)
+    markdown: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    reason: str = ""
+
+class HttpFetcher:
+    """Fetches pages over pooled keep-alive connections and converts them to markdown.
+
+    A page whose markdown is shorter than `min_markdown_chars` is assumed to be
+    rendered by JavaScript and reported as a fallback, as are errors and
+    responses that are not HTML.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        timeout: float = 30,
+        min_markdown_chars: int = 200,
+        client: Optional[httpx.AsyncClient] = None
+    ):
+        self.min_markdown_chars = min_markdown_chars
+        self.client = client or httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=timeout,
+            headers={"User-Agent": "deepseek-docs-crawler (+https://github.com/aravpatel19/deepseek-agentic-rag)"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.counts: Dict[str, int] = {"fetched": 0, "not_modified": 0, "fallback": 0}
+        self.bytes_received = 0
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+        """The page as markdown, or not_modified when the stored validators still match."""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        result = await self._fetch(url, headers)
+        self.counts[result.status] += 1
+        return result
+
+    async def _fetch(self, url: str, headers: Dict[str, str]) -> FetchResult:
+        try:
+            response = await self.client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            return FetchResult(url, "fallback", reason=f"{type(e).__name__}: {e}")
+        self.bytes_received += len(response.content)
+
+        if response.status_code == 304:
+            return FetchResult(url, "not_modified", etag=response.headers.get("etag") or headers.get("If-None-Match"),
+                               last_modified=response.headers.get("last-modified") or headers.get("If-Modified-Since"))
+        if response.status_code != 200:
+            return FetchResult(url, "fallback", reason=f"HTTP {response.status_code}")
+        if "html" not in response.headers.get("content-type", ""):
+            return FetchResult(url, "fallback", reason=f"content type {response.headers.get('content-type')!r}")
+
+        # Parsing takes milliseconds per page; keep it off the event loop. The requested
+        # URL is the base for links, as it is when the browser renders the page.
+        try:
+            markdown = await asyncio.to_thread(html_to_markdown, response.text, url)
+        except Exception as e:
+            return FetchResult(url, "fallback", reason=f"conversion failed: {e}")
+        if len(markdown) < self.min_markdown_chars:
+            return FetchResult(url, "fallback", reason=f"only {len(markdown)} characters without JavaScript")
+        return FetchResult(url, "fetched", markdown, response.headers.get("etag"), response.headers.get("last-modified"))
+
+    def summary(self) -> str:
+        return (f"HTTP fetch: {self.counts['fetched']} pages converted, {self.counts['not_modified']} not modified, "
+                f"{self.counts['fallback']} left to the browser, {self.bytes_received / 2 ** 20:.1f} MB received")
+
+    async def close(self):
+        await self.client.aclose()
+
+def memory_mb() -> float:
+    """Resident memory of this process and its children (Chromium runs in child processes)."""
+    if psutil is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    process = psutil.Process()
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 2 ** 20
+
+class MemorySampler:
+    """Peak of `memory_mb()` while a crawl runs, sampled every `interval` seconds."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample(self):
+        while True:
+            self.peak_mb = max(self.peak_mb, memory_mb())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.peak_mb = max(self.peak_mb, memory_mb())
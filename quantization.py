@@ -0,0 +1,60 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Rows converted to float32 at a time when scanning int8 codes; small enough that
+# the converted block is still in cache when the matmul reads it
+SCAN_BLOCK_ROWS = 256
+
+def truncate(vectors: np.ndarray, dimensions: Optional[int]) -> np.ndarray:
+    """Keep the first `dimensions` components and renormalize.
+
+    text-embedding-3 models are trained Matryoshka-style, so a prefix of the
+    vector is itself a usable lower-dimensional embedding.
+    """
+    if dimensions is None or dimensions >= vectors.shape[-1]:
+        return vectors
+    prefix = np.asarray(vectors[..., :dimensions], dtype=np.float32)
+    norms = np.linalg.norm(prefix, axis=-1, keepdims=True)
+    return prefix / np.where(norms == 0, 1, norms)
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-dimension scalar quantization to int8 codes and float32 scales."""
+    scale = np.abs(vectors).max(axis=0).astype(np.float32) / 127
+    scale[scale == 0] = 1
+    codes = np.clip(np.round(vectors / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed eight to a byte."""
+    return np.packbits(vectors > 0, axis=-1)
+
+def int8_scores(codes: np.ndarray, scale: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Approximate dot products between a normalized query and int8 codes.
+
+    numpy has no fast int8 matmul, so each block is widened to float32 first.
+    That costs about as much as the float32 scan it replaces: at the full
+    dimensions the codes save memory, not time (see the quantization report).
+    """
+    weighted = (query * scale).astype(np.float32)
+    scores = np.empty(len(codes), dtype=np.float32)
+    buffer = np.empty((min(SCAN_BLOCK_ROWS, len(codes)), codes.shape[1]), dtype=np.float32)
+    for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+        block = codes[start:start + SCAN_BLOCK_ROWS]
+        widened = buffer[:len(block)]
+        np.copyto(widened, block)
+        np.matmul(widened, weighted, out=scores[start:start + len(block)])
+    return scores
+
+def binary_scores(bits: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Negated Hamming distance between the query's sign bits and each code."""
+    query_bits = quantize_binary(query)
+    return -np.bitwise_count(np.bitwise_xor(bits, query_bits)).sum(axis=1, dtype=np.int32).astype(np.float32)
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
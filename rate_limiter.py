@@ -0,0 +1,191 @@
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from openai import APIConnectionError, APIStatusError, RateLimitError
+
+class TokenBucket:
+    """Budget of `per_minute` units, refilled continuously and bursting up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.available = per_minute
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Wait until `amount` units are available and take them. Returns the seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        # asyncio.run() callers (Flask, Streamlit) bring a new loop per request
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+
+        # Callers are served in arrival order, so a large request is not starved
+        async with self._lock:
+            self._refill()
+            while self.available < amount:
+                delay = (amount - self.available) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.available -= amount
+        return waited
+
+    def drain(self, seconds: float):
+        """Treat the budget as spent for the next `seconds`, e.g. after a 429."""
+        self._refill()
+        self.available = min(self.available, -seconds * self.rate)
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait according to the response's retry-after headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    return None
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, dropped connections and server errors are worth retrying."""
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in (408, 409) or error.status_code >= 500)
+
+class RateLimiter:
+    """Client-side limits and retries for calls to one OpenAI model family.
+
+    Each call takes one request from a requests-per-minute bucket and its
+    estimated tokens from a tokens-per-minute bucket before it is sent.
+    Concurrency adapts by AIMD: every success raises the limit by 1/limit and a
+    429 halves it, at most once per `decrease_interval` seconds so one burst of
+    rejections only counts once. Retryable errors are retried with full-jitter
+    exponential backoff, waiting at least as long as the server's Retry-After.
+    Other errors are raised immediately.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 3000,
+        tokens_per_minute: float = 1_000_000,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 60,
+        decrease_interval: float = 2.0
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.decrease_interval = decrease_interval
+
+        self.concurrency = float(max_concurrency)
+        self.active = 0
+        self._slots: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._decreased_at = 0.0
+
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.waited_seconds = 0.0
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, tokens: int = 1, **kwargs) -> Any:
+        """Await `fn(*args, **kwargs)` within the limits, retrying transient errors."""
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+            await self._acquire_slot()
+            self.waited_seconds += time.monotonic() - started
+            succeeded = False
+            try:
+                result = await fn(*args, **kwargs)
+                succeeded = True
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                error = e
+            finally:
+                # Also on cancellation, or the slot is lost for good
+                await self._release_slot(succeeded)
+            if succeeded:
+                return result
+            await self._backoff(error, attempt)
+
+    async def _acquire_slot(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._slots, self.active = loop, asyncio.Condition(), 0
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.active < int(self.concurrency))
+            self.active += 1
+
+    async def _release_slot(self, succeeded: bool = False):
+        async with self._slots:
+            self.active -= 1
+            if succeeded:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._slots.notify_all()
+
+    async def _backoff(self, error: Exception, attempt: int):
+        self.retries += 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.max_delay))
+
+        if isinstance(error, RateLimitError):
+            self.rate_limited += 1
+            now = time.monotonic()
+            if now - self._decreased_at >= self.decrease_interval:
+                self._decreased_at = now
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                # Hold back every caller, not just this one, until the server's window resets
+                if server_delay is not None:
+                    self.requests.drain(server_delay)
+
+        print(f"Retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}) after error: {error}")
+        await asyncio.sleep(delay)
+
+    def summary(self) -> str:
+        return (f"{self.calls} calls, {self.retries} retries, {self.rate_limited} rate limited, "
+                f"{self.failures} failed, concurrency {self.concurrency:.1f}, "
+                f"{self.waited_seconds:.1f}s total wait on limits")
+
+def load_rate_limiter_from_env(prefix: str) -> RateLimiter:
+    """Limiter configured from {prefix}_RPM, {prefix}_TPM and {prefix}_MAX_CONCURRENCY."""
+    return RateLimiter(
+        requests_per_minute=float(os.getenv(f"{prefix}_RPM", "3000")),
+        tokens_per_minute=float(os.getenv(f"{prefix}_TPM", "1000000")),
+        max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "32"))
+    )
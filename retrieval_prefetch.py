@@ -0,0 +1,88 @@
+"""Speculative retrieval for a chat message, started before the model asks for it.
+
+The system prompt has the agent open with retrieve_relevant_documentation, so
+nearly every answer spends a model round trip just to ask for the search. With
+prefetching the server starts that search as soon as the message arrives:
+
+- "tool" mode runs it alongside the first model turn and answers the model's
+  retrieve_relevant_documentation call from it when the query matches,
+- "context" mode waits for it and puts the results in the prompt, so the model
+  can answer without the tool call at all (first turns only, since pydantic-ai
+  only builds the system prompt for new conversations).
+
+Whether each prefetch was used, and how much search time it took off the
+answer, is recorded in the telemetry metrics.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, List, Optional
+
+from lexical_index import tokenize
+from telemetry import record_prefetch
+
+PREFETCH_MODES = ("off", "tool", "context")
+
+def query_coverage(message: str, query: str) -> float:
+    """Share of the query's distinct tokens that also appear in the message."""
+    query_tokens = set(tokenize(query))
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & set(tokenize(message))) / len(query_tokens)
+
+class RetrievalPrefetch:
+    """A search for `message` running in the background until the agent needs it.
+
+    A tool call is served from it when at least `min_coverage` of the tool
+    query's tokens appear in the message, so a rephrased question still
+    counts but a search for something else does not.
+    """
+
+    def __init__(self, message: str, search: Awaitable[List[dict]], min_coverage: float = 0.6):
+        self.message = message
+        self.min_coverage = min_coverage
+        self.started = time.perf_counter()
+        self.search_seconds: Optional[float] = None
+        self.outcome: Optional[str] = None
+        self.saved_seconds = 0.0
+        self.mismatched = False
+        self.task = asyncio.ensure_future(self._run(search))
+
+    async def _run(self, search: Awaitable[List[dict]]) -> List[dict]:
+        try:
+            return await search
+        finally:
+            self.search_seconds = time.perf_counter() - self.started
+
+    async def take(self, query: str, inject: bool = False) -> Optional[List[dict]]:
+        """The prefetched results if they answer `query`, else None and the caller searches itself."""
+        if query_coverage(self.message, query) < self.min_coverage:
+            self.mismatched = True
+            return None
+
+        waited_from = time.perf_counter()
+        try:
+            docs = await asyncio.shield(self.task)
+        except Exception as e:
+            print(f"Prefetched retrieval failed: {e}")
+            return None
+        if self.outcome is None:
+            # The search would have started now and taken its full duration
+            self.outcome = "injected" if inject else "used"
+            self.saved_seconds = max(0.0, self.search_seconds - (time.perf_counter() - waited_from))
+        return docs
+
+    def finish(self):
+        """Record how the prefetch was used and stop it if nobody did."""
+        if not self.task.done():
+            self.task.cancel()
+        elif not self.task.cancelled():
+            self.task.exception()  # Failures were reported by take(), if anyone asked
+        outcome = self.outcome or ("mismatched" if self.mismatched else "unused")
+        record_prefetch(outcome, self.saved_seconds)
+
+def load_prefetch_mode_from_env() -> str:
+    mode = os.getenv("RETRIEVAL_PREFETCH", "off").lower()
+    if mode not in PREFETCH_MODES:
+        raise ValueError(f"RETRIEVAL_PREFETCH must be one of {PREFETCH_MODES}, got {mode!r}")
+    return mode
@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+)
+
+from embedding_batcher import load_encoding
+
+_encoding = None
+
+def count_tokens(messages: List[ModelMessage]) -> int:
+    """Approximate prompt tokens taken by a list of messages."""
+    global _encoding
+    if _encoding is None:
+        _encoding = load_encoding("gpt-4o-mini") or False
+    text = ModelMessagesTypeAdapter.dump_json(messages).decode()
+    if not _encoding:
+        return len(text) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def split_turns(messages: List[ModelMessage]) -> List[List[ModelMessage]]:
+    """Group messages into turns, each starting at a request with a user prompt."""
+    turns: List[List[ModelMessage]] = []
+    for message in messages:
+        starts_turn = isinstance(message, ModelRequest) and any(
+            part.part_kind == 'user-prompt' for part in message.parts
+        )
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def compact_turn(turn: List[ModelMessage]) -> List[ModelMessage]:
+    """Reduce a turn to its prompt and final answer, dropping tool calls and returns."""
+    request = ModelRequest(parts=[
+        part for part in turn[0].parts
+        if part.part_kind in ('system-prompt', 'user-prompt')
+    ])
+    answer = ""
+    for message in reversed(turn):
+        if isinstance(message, ModelResponse):
+            answer = "".join(part.content for part in message.parts if part.part_kind == 'text')
+            if answer:
+                break
+    return [request, ModelResponse(parts=[TextPart(content=answer)])] if answer else [request]
+
+def compact_history(messages: List[ModelMessage], token_budget: int, keep_turns: int) -> List[ModelMessage]:
+    """Fit a conversation into `token_budget` tokens.
+
+    The last `keep_turns` turns are kept verbatim. Older turns lose their tool
+    traffic, and if that is not enough the oldest of them are dropped. The
+    system prompt always stays at the start of the history.
+    """
+    turns = split_turns(messages)
+    recent = turns[-keep_turns:] if keep_turns else []
+    older = [compact_turn(turn) for turn in turns[:len(turns) - len(recent)]]
+
+    system_parts = [
+        part for part in (messages[0].parts if messages and isinstance(messages[0], ModelRequest) else [])
+        if part.part_kind == 'system-prompt'
+    ]
+
+    def assemble() -> List[ModelMessage]:
+        history = [message for turn in older + recent for message in turn]
+        if history and system_parts and not any(
+            part.part_kind == 'system-prompt' for part in history[0].parts
+        ):
+            history[0] = ModelRequest(parts=system_parts + list(history[0].parts))
+        return history
+
+    history = assemble()
+    while older and count_tokens(history) > token_budget:
+        older.pop(0)
+        history = assemble()
+    return history
+
+class SessionStore:
+    """Conversation histories keyed by session id, compacted to a token budget.
+
+    Histories live in an in-memory LRU of `max_sessions` entries. With `path`
+    set they are also written to SQLite, so they survive restarts and are
+    shared between worker processes.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_sessions: int = 1000,
+        token_budget: int = 4000,
+        keep_turns: int = 3,
+        max_age: float = 7 * 24 * 3600
+    ):
+        self.path = Path(path) if path else None
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.max_age = max_age
+
+        self._sessions: "OrderedDict[str, List[ModelMessage]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("pragma journal_mode=wal")
+            self._db.execute("""
+                create table if not exists sessions (
+                    session_id text primary key,
+                    messages blob not null,
+                    updated_at real not null
+                )
+            """)
+            self._db.execute("delete from sessions where updated_at < ?", (time.time() - self.max_age,))
+            self._db.commit()
+        return self._db
+
+    def get(self, session_id: str) -> List[ModelMessage]:
+        """History to pass as `message_history` for the next turn."""
+        with self._lock:
+            messages = self._sessions.get(session_id)
+            if messages is not None:
+                self._sessions.move_to_end(session_id)
+                return list(messages)
+
+            db = self._connect()
+            row = db.execute(
+                "select messages from sessions where session_id = ?", (session_id,)
+            ).fetchone() if db else None
+            if row is None:
+                return []
+            messages = ModelMessagesTypeAdapter.validate_json(row[0])
+            self._remember(session_id, messages)
+            return list(messages)
+
+    def append(self, session_id: str, new_messages: List[ModelMessage]) -> List[ModelMessage]:
+        """Add a finished turn's messages and store the compacted history."""
+        history = compact_history(self.get(session_id) + list(new_messages), self.token_budget, self.keep_turns)
+        with self._lock:
+            self._remember(session_id, history)
+            db = self._connect()
+            if db:
+                db.execute(
+                    "insert or replace into sessions (session_id, messages, updated_at) values (?, ?, ?)",
+                    (session_id, ModelMessagesTypeAdapter.dump_json(history), time.time())
+                )
+                db.commit()
+        return history
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            db = self._connect()
+            if db:
+                db.execute("delete from sessions where session_id = ?", (session_id,))
+                db.commit()
+
+    def _remember(self, session_id: str, messages: List[ModelMessage]):
+        self._sessions[session_id] = messages
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+def load_session_store_from_env() -> SessionStore:
+    """In-memory store, backed by SQLite when SESSION_DB_PATH is set."""
+    return SessionStore(
+        path=os.getenv("SESSION_DB_PATH") or None,
+        token_budget=int(os.getenv("SESSION_TOKEN_BUDGET", "4000")),
+        keep_turns=int(os.getenv("SESSION_KEEP_TURNS", "3"))
+    )
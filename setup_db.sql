@@ -15,17 +15,87 @@ create table if not exists deepseek_pages (
     unique(url, chunk_number)
 );
 
+-- Track the last stored version of each page for incremental recrawls.
+-- Also serves as the page catalog for the agent's list_documentation_pages tool.
+create table if not exists deepseek_page_state (
+    url text primary key,
+    title text,
+    source text not null default 'deepseek_docs',
+    lastmod text,
+    etag text,
+    last_modified text,
+    page_hash text not null,
+    chunk_count integer not null,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+-- HTTP validators from the last fetch, sent back as If-None-Match and
+-- If-Modified-Since so unchanged pages come back as 304 Not Modified
+alter table deepseek_page_state
+    add column if not exists etag text,
+    add column if not exists last_modified text;
+
+-- Version stamp bumped by the crawler after each successful run, used to
+-- invalidate the agent's in-process page caches
+create table if not exists deepseek_corpus_version (
+    id smallint primary key default 1 check (id = 1),
+    version bigint not null default 0,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+insert into deepseek_corpus_version (id, version) values (1, 0) on conflict (id) do nothing;
+
+create or replace function bump_corpus_version()
+returns bigint
+language sql
+as $$
+    update deepseek_corpus_version
+    set version = version + 1, updated_at = timezone('utc'::text, now())
+    where id = 1
+    returning version;
+$$;
+
 -- Create an index for better vector similarity search performance
 create index on deepseek_pages using ivfflat (embedding vector_cosine_ops);
 
 -- Create an index on metadata for faster filtering
 create index idx_deepseek_pages_metadata on deepseek_pages using gin (metadata);
 
--- Create a function to match similar documents
+-- Each chunk's corpus source (deepseek_docs, changelogs, runbooks, ...) as a column,
+-- so searches restricted to one source can use that source's own vector index
+alter table deepseek_pages
+    add column if not exists source text generated always as (metadata->>'source') stored;
+
+create index if not exists idx_deepseek_pages_source on deepseek_pages (source);
+
+-- Partial ivfflat index over one source's chunks. Run once for every source
+-- indexed in this database: select create_source_index('changelogs');
+create or replace function create_source_index(source_name text)
+returns void
+language plpgsql
+as $$
+begin
+    execute format(
+        'create index if not exists %I on deepseek_pages using ivfflat (embedding vector_cosine_ops) where source = %L',
+        'idx_deepseek_pages_embedding_' || regexp_replace(lower(source_name), '[^a-z0-9_]', '_', 'g'),
+        source_name
+    );
+end;
+$$;
+
+select create_source_index('deepseek_docs');
+
+-- Create a function to match similar documents.
+-- `filter` is matched against metadata (metadata @> filter). With a source in it the
+-- query is planned for that literal source, so Postgres can use the source's partial
+-- ivfflat index (see create_source_index) instead of scanning every source.
+drop function if exists match_deepseek_pages(vector, float, int);
+
 create or replace function match_deepseek_pages (
     query_embedding vector(1536),
-    match_threshold float,
-    match_count int
+    match_count int default 10,
+    filter jsonb default '{}'::jsonb,
+    match_threshold float default 0
 )
 returns table (
     id bigint,
@@ -40,6 +110,28 @@ returns table (
 language plpgsql
 as $$
 begin
+    if filter ? 'source' then
+        return query execute format($query$
+            select
+                deepseek_pages.id,
+                deepseek_pages.url,
+                deepseek_pages.chunk_number,
+                deepseek_pages.title,
+                deepseek_pages.summary,
+                deepseek_pages.content,
+                deepseek_pages.metadata,
+                1 - (deepseek_pages.embedding <=> $1) as similarity
+            from deepseek_pages
+            where deepseek_pages.source = %L
+                and deepseek_pages.metadata @> $2
+                and 1 - (deepseek_pages.embedding <=> $1) > $3
+            order by deepseek_pages.embedding <=> $1
+            limit $4
+        $query$, filter->>'source')
+        using query_embedding, filter, match_threshold, match_count;
+        return;
+    end if;
+
     return query
     select
         deepseek_pages.id,
@@ -51,7 +143,8 @@ begin
         deepseek_pages.metadata,
         1 - (deepseek_pages.embedding <=> query_embedding) as similarity
     from deepseek_pages
-    where 1 - (deepseek_pages.embedding <=> query_embedding) > match_threshold
+    where deepseek_pages.metadata @> filter
+        and 1 - (deepseek_pages.embedding <=> query_embedding) > match_threshold
     order by deepseek_pages.embedding <=> query_embedding
     limit match_count;
 end;
@@ -75,4 +168,29 @@ create policy "Enable update for authenticated users"
     on deepseek_pages for update
     to authenticated
     using (true)
-    with check (true); 
\ No newline at end of file
+    with check (true);
+
+create policy "Enable delete for authenticated users"
+    on deepseek_pages for delete
+    to authenticated
+    using (true);
+
+alter table deepseek_page_state enable row level security;
+
+create policy "Enable read access to all users"
+    on deepseek_page_state for select
+    to public
+    using (true);
+
+create policy "Enable write access for authenticated users"
+    on deepseek_page_state for all
+    to authenticated
+    using (true)
+    with check (true);
+
+alter table deepseek_corpus_version enable row level security;
+
+create policy "Enable read access to all users"
+    on deepseek_corpus_version for select
+    to public
+    using (true);
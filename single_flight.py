@@ -0,0 +1,102 @@
+"""Share identical in-flight work between concurrent callers.
+
+When a docs link goes out, many people ask the same question at once. A
+`SingleFlight` keeps one task per key: the first caller starts it and
+everyone who asks for the same key while it runs awaits that task instead of
+repeating the embedding call, the search or the whole agent run. Nothing is
+kept once the work finishes; caching finished results is the job of the
+embedding and answer caches.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from telemetry import record_single_flight
+
+class SharedStream:
+    """Items of one async iterator, replayed to each subscriber from the start."""
+
+    def __init__(self, source: AsyncIterator[Any]):
+        self.items: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except (Exception, asyncio.CancelledError) as e:
+            # A cancelled pump must not look like a finished stream to subscribers
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            while position < len(self.items):
+                yield self.items[position]
+                position += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+class SingleFlight:
+    """One running task (or stream) per key, shared by every caller that asks while it runs.
+
+    The work runs in its own task, so a caller that gives up does not cancel it
+    for the others. Flask serves each request on a new event loop, and work is
+    only shared within one loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._running: Dict[Hashable, Tuple[asyncio.AbstractEventLoop, Any]] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def _join(self, key: Hashable) -> Optional[Any]:
+        entry = self._running.get(key)
+        if entry is None or entry[0] is not asyncio.get_running_loop():
+            return None
+        self.shared += 1
+        record_single_flight(self.name, shared=True)
+        return entry[1]
+
+    def _start(self, key: Hashable, work: Any, task: asyncio.Future):
+        self.leaders += 1
+        record_single_flight(self.name, shared=False)
+        self._running[key] = (asyncio.get_running_loop(), work)
+
+        def forget(_):
+            if self._running.get(key, (None, None))[1] is work:
+                del self._running[key]
+        task.add_done_callback(forget)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of `call()`, or of the identical call already in flight."""
+        task = self._join(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._start(key, task, task)
+        return await asyncio.shield(task)
+
+    def stream(self, key: Hashable, open_stream: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Items of `open_stream()`, or of the identical stream already in flight from its start."""
+        shared = self._join(key)
+        if shared is None:
+            shared = SharedStream(open_stream())
+            self._start(key, shared, shared.task)
+        return shared.subscribe()
+
+    def summary(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._running)}
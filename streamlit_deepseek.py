@@ -1,10 +1,15 @@
 from __future__ import annotations
-from typing import Literal, TypedDict
+from typing import Iterator, List, Literal, TypedDict
 import asyncio
 import os
+import queue
+import threading
+import uuid
+from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 
+import httpx
 import streamlit as st
 import json
 import logfire
@@ -25,37 +30,83 @@ from pydantic_ai.messages import (
     ModelMessagesTypeAdapter
 )
 from deepseek_agent import agentic_rag, DeepSeekDeps  # Changed import
+from lexical_index import load_lexical_index_from_env
+from page_catalog import PageCatalog
+from session_store import SessionStore, load_session_store_from_env
+from vector_index import load_vector_index_from_env
 
 # Get the directory containing the script
 script_dir = Path(__file__).resolve().parent
 
-# Load .env file from the same directory as the script
-env_path = script_dir / '.env'
-load_dotenv(dotenv_path=env_path)
-
-# Debug: Print where we're loading from
-print(f"Loading .env file from: {env_path}")
-print(f"SUPABASE_URL: {'[SET]' if os.getenv('SUPABASE_URL') else '[NOT SET]'}")
-print(f"SUPABASE_SERVICE_KEY: {'[SET]' if os.getenv('SUPABASE_SERVICE_KEY') else '[NOT SET]'}")
-print(f"OPENAI_API_KEY: {'[SET]' if os.getenv('OPENAI_API_KEY') else '[NOT SET]'}")
-
-# Initialize Supabase client with environment variables
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-
-if not supabase_url or not supabase_key or not openai_api_key:
-    raise ValueError(
-        "Missing required credentials. Please ensure SUPABASE_URL, "
-        "SUPABASE_SERVICE_KEY, and OPENAI_API_KEY are set in your .env file"
+# Streamlit re-executes this script on every rerun (each message, each widget
+# change), so anything that should happen once per server process lives in a
+# st.cache_resource function below.
+
+# Turns of the transcript rendered on each rerun; older ones are shown a page at a time on request
+TRANSCRIPT_RECENT_TURNS = int(os.getenv("TRANSCRIPT_RECENT_TURNS", "10"))
+TRANSCRIPT_PAGE_TURNS = int(os.getenv("TRANSCRIPT_PAGE_TURNS", "10"))
+
+@st.cache_resource
+def get_deps() -> DeepSeekDeps:
+    """Clients, indexes and caches for the agent, created once and shared by every session."""
+    # Load .env file from the same directory as the script
+    env_path = script_dir / '.env'
+    load_dotenv(dotenv_path=env_path)
+
+    # Debug: Print where we're loading from
+    print(f"Loading .env file from: {env_path}")
+    print(f"SUPABASE_URL: {'[SET]' if os.getenv('SUPABASE_URL') else '[NOT SET]'}")
+    print(f"SUPABASE_SERVICE_KEY: {'[SET]' if os.getenv('SUPABASE_SERVICE_KEY') else '[NOT SET]'}")
+    print(f"OPENAI_API_KEY: {'[SET]' if os.getenv('OPENAI_API_KEY') else '[NOT SET]'}")
+
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    if not supabase_url or not supabase_key or not openai_api_key:
+        raise ValueError(
+            "Missing required credentials. Please ensure SUPABASE_URL, "
+            "SUPABASE_SERVICE_KEY, and OPENAI_API_KEY are set in your .env file"
+        )
+
+    # Configure logfire to suppress warnings (optional)
+    logfire.configure(send_to_logfire='never')
+
+    supabase = Client(supabase_url, supabase_key)
+    return DeepSeekDeps(
+        supabase=supabase,
+        # Keep-alive connections are reused by every session, since all runs share one event loop.
+        # The agent's rate limiter retries.
+        openai_client=AsyncOpenAI(
+            api_key=openai_api_key,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+                    max_keepalive_connections=20
+                )
+            )
+        ),
+        vector_index=load_vector_index_from_env(),
+        lexical_index=load_lexical_index_from_env(),
+        page_catalog=PageCatalog(supabase)  # Page caches shared by every session
     )
 
-# Initialize the clients
-supabase = Client(supabase_url, supabase_key)
-openai_client = AsyncOpenAI(api_key=openai_api_key)
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """One event loop thread per server process that runs the agent for every session.
 
-# Configure logfire to suppress warnings (optional)
-logfire.configure(send_to_logfire='never')
+    A rerun that starts its own loop with asyncio.run would strand the OpenAI
+    client's pooled connections on a closed loop and open new ones each time.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    """One history store per server process, kept across reruns."""
+    return load_session_store_from_env()
 
 class ChatMessage(TypedDict):
     """Format of messages sent to the browser/API."""
@@ -63,70 +114,87 @@ class ChatMessage(TypedDict):
     timestamp: str
     content: str
 
-def display_message_part(part):
-    """Display a single part of a message in the Streamlit UI."""
-    if part.part_kind == 'system-prompt':
-        with st.chat_message("system"):
-            st.markdown(f"**System**: {part.content}")
-    elif part.part_kind == 'user-prompt':
-        with st.chat_message("user"):
-            st.markdown(part.content)
-    elif part.part_kind == 'text':
-        with st.chat_message("assistant"):
-            st.markdown(part.content)          
-
-async def run_agent_with_streaming(user_input: str):
-    """Run the agent with streaming text for DeepSeek queries."""
-    deps = DeepSeekDeps(  # Changed class
-        supabase=supabase,
-        openai_client=openai_client
-    )
-
-    async with agentic_rag.run_stream(
-        user_input,
-        deps=deps,
-        message_history=st.session_state.messages[:-1],
-    ) as result:
-        partial_text = ""
-        message_placeholder = st.empty()
-
-        async for chunk in result.stream_text(delta=True):
-            partial_text += chunk
-            message_placeholder.markdown(partial_text)
-
-        filtered_messages = [msg for msg in result.new_messages() 
-                            if not (hasattr(msg, 'parts') and 
-                                    any(part.part_kind == 'user-prompt' for part in msg.parts))]
-        st.session_state.messages.extend(filtered_messages)
-
-        st.session_state.messages.append(
-            ModelResponse(parts=[TextPart(content=partial_text)])
-        )
-
-async def main():
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def display_message(message: ChatMessage):
+    """Display one transcript message in the Streamlit UI."""
+    with st.chat_message("user" if message['role'] == 'user' else "assistant"):
+        st.markdown(message['content'])
+
+def stream_agent_response(user_input: str, session_id: str) -> Iterator[str]:
+    """Run the agent on the shared event loop and yield its answer as it streams in.
+
+    The model sees the compacted server-side history; st.session_state.messages
+    only holds the visible transcript. A run whose rerun is interrupted still
+    finishes and is saved to the session.
+    """
+    # Cached resources are resolved here, in the script thread that has Streamlit's
+    # run context; a missing credential then fails this rerun instead of the loop thread
+    session_store = get_session_store()
+    deps = get_deps()
+    chunks: queue.Queue = queue.Queue()
+
+    async def run(deps: DeepSeekDeps):
+        try:
+            async with agentic_rag.run_stream(
+                user_input,
+                deps=deps,
+                message_history=session_store.get(session_id),
+            ) as result:
+                async for chunk in result.stream_text(delta=True):
+                    chunks.put(chunk)
+                session_store.append(session_id, result.new_messages())
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(None)
+
+    asyncio.run_coroutine_threadsafe(run(deps), get_event_loop())
+    while (chunk := chunks.get()) is not None:
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield chunk
+
+def display_transcript(messages: List[ChatMessage]):
+    """Render the latest turns, and older ones only as far back as the user has paged.
+
+    A rerun then costs the same however long the conversation has grown.
+    """
+    visible_turns = TRANSCRIPT_RECENT_TURNS + st.session_state.transcript_pages * TRANSCRIPT_PAGE_TURNS
+    # A turn is a question and its answer
+    hidden = max(0, len(messages) - 2 * visible_turns)
+    if hidden:
+        if st.button(f"Show earlier messages ({hidden // 2} older turns hidden)"):
+            st.session_state.transcript_pages += 1
+            st.rerun()
+    for message in messages[hidden:]:
+        display_message(message)
+
+def main():
     st.title("DeepSeek Agentic RAG")  # Updated title
     st.write("Ask any question about DeepSeek's documentation including API references, guides, and best practices. Made by Arav Patel")
 
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if "transcript_pages" not in st.session_state:
+        st.session_state.transcript_pages = 0
 
-    for msg in st.session_state.messages:
-        if isinstance(msg, ModelRequest) or isinstance(msg, ModelResponse):
-            for part in msg.parts:
-                display_message_part(part)
+    display_transcript(st.session_state.messages)
 
     user_input = st.chat_input("What questions do you have about DeepSeek's documentation?")  # Updated prompt
 
     if user_input:
-        st.session_state.messages.append(
-            ModelRequest(parts=[UserPromptPart(content=user_input)])
-        )
-        
-        with st.chat_message("user"):
-            st.markdown(user_input)
+        user_message = ChatMessage(role='user', timestamp=now(), content=user_input)
+        st.session_state.messages.append(user_message)
+        display_message(user_message)
 
         with st.chat_message("assistant"):
-            await run_agent_with_streaming(user_input)
+            answer = st.write_stream(stream_agent_response(user_input, st.session_state.session_id))
+
+        st.session_state.messages.append(ChatMessage(role='model', timestamp=now(), content=answer))
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
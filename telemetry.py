@@ -0,0 +1,281 @@
+"""Timing spans, per-request aggregates and Prometheus metrics for the chat hot path.
+
+`span(kind, name)` wraps one operation (an agent tool, an embedding call, a
+Supabase query, an LLM turn) in a logfire span and records its duration and
+errors in process-wide histograms. Inside `track_request(...)` the same
+timings, tool calls, cache hits and token counts are also summed for the
+current request, so a slow answer can be broken down after the fact.
+`render_metrics()` returns everything in the Prometheus text format for the
+API's `/metrics` endpoint.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import logfire
+from pydantic_ai.messages import ModelMessage
+from pydantic_ai.models import AgentModel, Model
+from pydantic_ai.settings import ModelSettings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *values: str, amount: float = 1):
+        self.values[values] = self.values.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, values)} {total:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # Per label set: count in each bucket (not cumulative), then sum and count
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *values: str):
+        series = self.series.setdefault(values, [0] * (len(self.buckets) + 1) + [0.0, 0])
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+# The Flask server handles requests on several threads
+_lock = threading.Lock()
+
+operation_seconds = Histogram(
+    "rag_operation_seconds", "Duration of agent tools, embedding calls, database queries and LLM turns",
+    ("kind", "name"))
+operation_errors = Counter("rag_operation_errors_total", "Operations that raised", ("kind", "name"))
+llm_first_token_seconds = Histogram(
+    "rag_llm_first_token_seconds", "Time from sending a model request to its first streamed response", ("model",))
+cache_lookups = Counter("rag_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+tokens_used = Counter("rag_tokens_total", "Tokens reported by the OpenAI API", ("kind", "type"))
+chat_seconds = Histogram("rag_chat_request_seconds", "Duration of chat requests", ("endpoint", "cached"))
+chat_requests = Counter("rag_chat_requests_total", "Chat requests by outcome", ("endpoint", "status"))
+chat_tool_calls = Histogram("rag_chat_tool_calls", "Agent tool calls per chat request", (), COUNT_BUCKETS)
+chat_llm_turns = Histogram("rag_chat_llm_turns", "Model requests per chat request", (), COUNT_BUCKETS)
+prefetches = Counter("rag_prefetch_total", "Speculative retrievals by outcome", ("outcome",))
+prefetch_saved_seconds = Counter("rag_prefetch_saved_seconds_total", "Search time taken off answers by prefetching")
+single_flight_calls = Counter(
+    "rag_single_flight_total", "Calls that started work (leader) or joined identical work in flight (shared)",
+    ("name", "result"))
+
+METRICS = (operation_seconds, operation_errors, llm_first_token_seconds, cache_lookups, tokens_used,
+           chat_seconds, chat_requests, chat_tool_calls, chat_llm_turns, prefetches, prefetch_saved_seconds,
+           single_flight_calls)
+
+@dataclass
+class RequestStats:
+    """What one chat request spent its time on.
+
+    Seconds are summed per operation kind; tools contain the embedding and
+    database calls they make, so the kinds overlap.
+    """
+    started: float = field(default_factory=time.perf_counter)
+    seconds: Dict[str, float] = field(default_factory=dict)
+    calls: Dict[str, int] = field(default_factory=dict)
+    tool_calls: Dict[str, int] = field(default_factory=dict)
+    cache_hits: Dict[str, int] = field(default_factory=dict)
+    cache_misses: Dict[str, int] = field(default_factory=dict)
+    tokens: Dict[str, int] = field(default_factory=dict)
+    coalesced: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    cached: bool = False
+    prefetch: Optional[str] = None
+    prefetch_saved_seconds: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "ms": {kind: round(seconds * 1000, 1) for kind, seconds in self.seconds.items()},
+            "calls": dict(self.calls),
+            "tool_calls": dict(self.tool_calls),
+            "cache_hits": dict(self.cache_hits),
+            "cache_misses": dict(self.cache_misses),
+            "tokens": dict(self.tokens),
+            "coalesced": dict(self.coalesced),
+            "errors": self.errors,
+            **({"prefetch": self.prefetch, "prefetch_saved_ms": round(self.prefetch_saved_seconds * 1000, 1)}
+               if self.prefetch else {}),
+        }
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Any]:
+    """Time one operation as a logfire span and in the metrics."""
+    stats = current_request.get()
+    started = time.perf_counter()
+    with logfire.span("{kind} {name}", kind=kind, name=name, **attributes) as logfire_span:
+        try:
+            yield logfire_span
+        except Exception:
+            with _lock:
+                operation_errors.inc(kind, name)
+            if stats is not None:
+                stats.errors += 1
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            with _lock:
+                operation_seconds.observe(seconds, kind, name)
+            if stats is not None:
+                stats.seconds[kind] = stats.seconds.get(kind, 0.0) + seconds
+                stats.calls[kind] = stats.calls.get(kind, 0) + 1
+                if kind == "tool":
+                    stats.tool_calls[name] = stats.tool_calls.get(name, 0) + 1
+
+def record_cache(cache: str, hit: bool):
+    with _lock:
+        cache_lookups.inc(cache, "hit" if hit else "miss")
+    stats = current_request.get()
+    if stats is not None:
+        counts = stats.cache_hits if hit else stats.cache_misses
+        counts[cache] = counts.get(cache, 0) + 1
+
+def record_tokens(kind: str, prompt: Optional[int] = None, completion: Optional[int] = None):
+    stats = current_request.get()
+    for token_type, count in (("prompt", prompt), ("completion", completion)):
+        if not count:
+            continue
+        with _lock:
+            tokens_used.inc(kind, token_type, amount=count)
+        if stats is not None:
+            key = f"{kind}_{token_type}"
+            stats.tokens[key] = stats.tokens.get(key, 0) + count
+
+def record_prefetch(outcome: str, saved_seconds: float = 0.0):
+    with _lock:
+        prefetches.inc(outcome)
+        prefetch_saved_seconds.inc(amount=saved_seconds)
+    stats = current_request.get()
+    if stats is not None:
+        stats.prefetch = outcome
+        stats.prefetch_saved_seconds = saved_seconds
+
+def record_single_flight(name: str, shared: bool):
+    with _lock:
+        single_flight_calls.inc(name, "shared" if shared else "leader")
+    stats = current_request.get()
+    if stats is not None and shared:
+        stats.coalesced[name] = stats.coalesced.get(name, 0) + 1
+
+def prefetch_summary() -> Dict[str, Any]:
+    with _lock:
+        counts = {outcome: int(count) for (outcome,), count in prefetches.values.items()}
+        saved = prefetch_saved_seconds.values.get((), 0.0)
+    total = sum(counts.values())
+    served = counts.get("used", 0) + counts.get("injected", 0)
+    return {
+        **counts,
+        "use_rate": round(served / total, 3) if total else None,
+        "saved_seconds": round(saved, 3),
+        "mean_saved_ms": round(saved / counts["used"] * 1000, 1) if counts.get("used") else None,
+    }
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[RequestStats]:
+    """Collect the timings of everything run inside the block as one request."""
+    stats = RequestStats()
+    token = current_request.set(stats)
+    status = "ok"
+    try:
+        yield stats
+    except (GeneratorExit, KeyboardInterrupt):
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        try:
+            current_request.reset(token)
+        except ValueError:
+            # An abandoned streaming response is closed from another context
+            pass
+        seconds = time.perf_counter() - stats.started
+        with _lock:
+            chat_requests.inc(endpoint, status)
+            if status == "ok":
+                chat_seconds.observe(seconds, endpoint, str(stats.cached).lower())
+                chat_tool_calls.observe(sum(stats.tool_calls.values()))
+                chat_llm_turns.observe(stats.calls.get("llm", 0))
+        logfire.info("chat request {endpoint} {status}", endpoint=endpoint, status=status, **stats.summary())
+
+def render_metrics() -> str:
+    with _lock:
+        return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+class TimedAgentModel(AgentModel):
+    def __init__(self, wrapped: AgentModel, model_name: str):
+        self.wrapped = wrapped
+        self.model_name = model_name
+
+    async def request(self, messages: List[ModelMessage], model_settings: Optional[ModelSettings]):
+        with span("llm", self.model_name):
+            response, usage = await self.wrapped.request(messages, model_settings)
+            record_tokens("llm", usage.request_tokens, usage.response_tokens)
+            return response, usage
+
+    @asynccontextmanager
+    async def request_stream(self, messages: List[ModelMessage], model_settings: Optional[ModelSettings]) -> AsyncIterator[Any]:
+        # A streamed turn lasts until its response has been read to the end
+        with span("llm", self.model_name, streamed=True) as logfire_span:
+            started = time.perf_counter()
+            async with self.wrapped.request_stream(messages, model_settings) as response:
+                first_token = time.perf_counter() - started
+                logfire_span.set_attribute("first_token_seconds", round(first_token, 4))
+                with _lock:
+                    llm_first_token_seconds.observe(first_token, self.model_name)
+                yield response
+            usage = response.usage()
+            record_tokens("llm", usage.request_tokens, usage.response_tokens)
+
+class TimedModel(Model):
+    """A model whose requests are timed as "llm" spans with their token counts."""
+
+    def __init__(self, wrapped: Model):
+        self.wrapped = wrapped
+
+    async def agent_model(self, **kwargs: Any) -> AgentModel:
+        return TimedAgentModel(await self.wrapped.agent_model(**kwargs), self.wrapped.name())
+
+    def name(self) -> str:
+        return self.wrapped.name()
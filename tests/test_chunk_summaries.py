@@ -0,0 +1,31 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from chunk_summaries import ChunkSummarizer
+
+class QuotedIndexCompletions:
+    """Answers every batch in reverse order, with the indexes as strings."""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def create(self, messages, **kwargs):
+        self.requests += 1
+        count = messages[1]["content"].count("\nURL: ")
+        chunks = [{"index": str(i), "title": f"Title {i}", "summary": f"Summary {i}"} for i in reversed(range(count))]
+        message = SimpleNamespace(content=json.dumps({"chunks": chunks}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def test_string_indexes_match_their_chunks():
+    completions = QuotedIndexCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def scenario():
+        summarizer = ChunkSummarizer(client, mode="llm", max_batch_size=3)
+        return await asyncio.gather(*(summarizer.summarize(f"chunk {i}", f"https://docs/{i}") for i in range(3)))
+
+    results = asyncio.run(scenario())
+
+    assert [result["title"] for result in results] == ["Title 0", "Title 1", "Title 2"]
+    assert completions.requests == 1
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+from benchmarks.fakes import FakeSupabase
+from corpus_snapshot import CorpusSnapshot, export_corpus, load_corpus
+from embedding_batcher import EMBEDDING_DIMENSIONS
+
+def add_page(supabase: FakeSupabase, url: str, source: str, chunks: int = 2, etag: Optional[str] = None):
+    supabase.table("deepseek_pages").upsert([
+        {
+            "url": url,
+            "chunk_number": number,
+            "title": f"{url} {number}",
+            "summary": "",
+            "content": f"Content of {url} part {number}",
+            "metadata": {"source": source},
+            "embedding": np.full(EMBEDDING_DIMENSIONS, 0.01, dtype=np.float32).tolist(),
+        }
+        for number in range(chunks)
+    ], on_conflict="url,chunk_number").execute()
+    supabase.table("deepseek_page_state").upsert({
+        "url": url, "title": url, "source": source, "lastmod": None, "page_hash": url, "chunk_count": chunks,
+        "etag": etag, "last_modified": None,
+    }, on_conflict="url").execute()
+
+def stored(supabase: FakeSupabase, table: str):
+    return sorted({row["url"] for row in supabase.tables[table]})
+
+def test_roundtrip(tmp_path):
+    supabase = FakeSupabase()
+    add_page(supabase, "https://docs/a", "deepseek_docs", chunks=3)
+
+    snapshot = CorpusSnapshot.load(export_corpus(supabase, tmp_path / "snapshot"))
+
+    assert len(snapshot) == 3
+    assert snapshot.embeddings.shape == (3, EMBEDDING_DIMENSIONS)
+    assert snapshot.embeddings.dtype == np.float32
+    assert snapshot.metadata[0] == {"source": "deepseek_docs"}
+    assert snapshot.pages[0]["chunk_count"] == 3
+    assert snapshot.page_text("https://docs/a").startswith("Content of https://docs/a part 0")
+
+def test_source_snapshot_replace_keeps_other_sources(tmp_path):
+    source = FakeSupabase()
+    add_page(source, "https://docs/a", "deepseek_docs")
+    snapshot = CorpusSnapshot.load(export_corpus(source, tmp_path / "snapshot", source="deepseek_docs"))
+
+    target = FakeSupabase()
+    add_page(target, "https://docs/a", "deepseek_docs")
+    add_page(target, "https://docs/stale", "deepseek_docs")
+    add_page(target, "https://other/b", "other_docs")
+    asyncio.run(load_corpus(target, snapshot, replace=True))
+
+    assert stored(target, "deepseek_pages") == ["https://docs/a", "https://other/b"]
+    assert stored(target, "deepseek_page_state") == ["https://docs/a", "https://other/b"]
+
+def test_rollback_restores_page_validators(tmp_path):
+    supabase = FakeSupabase()
+    add_page(supabase, "https://docs/a", "deepseek_docs", etag='"old"')
+    snapshot = CorpusSnapshot.load(export_corpus(supabase, tmp_path / "snapshot"))
+
+    # A later crawl stores new content and a new ETag
+    add_page(supabase, "https://docs/a", "deepseek_docs", chunks=3, etag='"new"')
+    asyncio.run(load_corpus(supabase, snapshot, replace=True))
+
+    assert supabase.tables["deepseek_page_state"][0]["etag"] == '"old"'
+    assert len(supabase.tables["deepseek_pages"]) == 2
@@ -0,0 +1,29 @@
+import asyncio
+
+from rate_limiter import RateLimiter
+
+def test_cancelled_calls_release_their_slots():
+    async def scenario():
+        limiter = RateLimiter(max_concurrency=2)
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.Event().wait()
+
+        tasks = [asyncio.create_task(limiter.call(hang)) for _ in range(2)]
+        await started.wait()
+        await asyncio.sleep(0)
+        assert limiter.active == 2
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert limiter.active == 0
+
+        async def answer():
+            return 42
+
+        return await asyncio.wait_for(limiter.call(answer), timeout=1)
+
+    assert asyncio.run(scenario()) == 42
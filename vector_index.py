@@ -0,0 +1,356 @@
+"""Local exact vector search over a memory-mapped snapshot of deepseek_pages.
+
+A snapshot is a directory holding the normalized embeddings as a float32 matrix,
+the concatenated chunk contents and a JSON file with everything else. Snapshots
+are published under a root directory and the `CURRENT` file names the live one,
+so a running index picks up a new export without restarting. The files are
+opened with `np.memmap`, which lets every worker process on a host share a
+single copy through the page cache.
+
+Snapshots also carry compact int8 and 1-bit codes, optionally built from a
+truncated (Matryoshka) prefix of each vector. With `quantization` set, the index
+scans the codes and rescores only the best candidates with the full vectors.
+Rows are grouped by corpus source, so a search filtered to one source reads
+only that source's slice of the files.
+
+    python vector_index.py export --out snapshots [--coarse-dimensions 512]
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+from embedding_batcher import EMBEDDING_DIMENSIONS
+from quantization import (
+    binary_scores,
+    int8_scores,
+    quantize_binary,
+    quantize_int8,
+    top_k,
+    truncate,
+)
+
+CURRENT_FILE = "CURRENT"
+EXPORT_PAGE_SIZE = 500
+
+@dataclass
+class Snapshot:
+    name: str
+    embeddings: np.ndarray
+    content: np.ndarray
+    meta: Dict[str, Any]
+    partitions: Dict[str, np.ndarray] = field(default_factory=dict)
+    positions: Dict[int, int] = field(default_factory=dict)
+    int8_codes: Optional[np.ndarray] = None
+    int8_scale: Optional[np.ndarray] = None
+    binary_codes: Optional[np.ndarray] = None
+
+    @classmethod
+    def open(cls, directory: Path) -> "Snapshot":
+        meta = json.loads((directory / "meta.json").read_text())
+        count, dimensions = meta["count"], meta["dimensions"]
+        embeddings = np.memmap(directory / "embeddings.f32", dtype=np.float32, mode="r",
+                               shape=(count, dimensions)) if count else np.zeros((0, dimensions), np.float32)
+        content = np.memmap(directory / "content.bin", dtype=np.uint8, mode="r") \
+            if meta["content_offsets"][-1] else np.zeros(0, np.uint8)
+        snapshot = cls(directory.name, embeddings, content, meta)
+
+        # Snapshots exported before quantization was added have no codes
+        if count and meta.get("coarse_dimensions"):
+            coarse = meta["coarse_dimensions"]
+            snapshot.int8_codes = np.memmap(directory / "codes.int8", dtype=np.int8, mode="r",
+                                            shape=(count, coarse))
+            snapshot.int8_scale = np.asarray(meta["int8_scale"], dtype=np.float32)
+            snapshot.binary_codes = np.memmap(directory / "codes.bits", dtype=np.uint8, mode="r",
+                                              shape=(count, (coarse + 7) // 8))
+        return snapshot
+
+    def coarse_scores(self, query: np.ndarray, quantization: str, rows: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Approximate scores from the compact codes (of `rows` only, if given), or None if the snapshot has none."""
+        if self.int8_codes is None:
+            return None
+        query = truncate(query, self.meta["coarse_dimensions"])
+        if quantization == "int8":
+            codes = self.int8_codes if rows is None else self.select(self.int8_codes, rows)
+            return int8_scores(codes, self.int8_scale, query)
+        if quantization == "binary":
+            codes = self.binary_codes if rows is None else self.select(self.binary_codes, rows)
+            return binary_scores(codes, query)
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    def partition(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Positions of the rows whose metadata contains every key/value of `filter`, computed once per filter."""
+        key = json.dumps(filter, sort_keys=True)
+        if key not in self.partitions:
+            self.partitions[key] = np.flatnonzero(np.fromiter(
+                (all(meta.get(k) == v for k, v in filter.items()) for meta in self.meta["metadata"]),
+                dtype=bool, count=self.meta["count"]
+            ))
+        return self.partitions[key]
+
+    @staticmethod
+    def select(array: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """`array[rows]`, as a view without copying when the rows are contiguous."""
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return array[rows[0]:rows[-1] + 1]
+        return array[rows]
+
+    def position(self, row_id: int) -> Optional[int]:
+        if not self.positions:
+            self.positions = {row_id: i for i, row_id in enumerate(self.meta["ids"])}
+        return self.positions.get(row_id)
+
+    def row(self, i: int, similarity: float, include_embedding: bool = False) -> Dict[str, Any]:
+        """Build a result row with the same fields as `match_deepseek_pages`."""
+        start, end = self.meta["content_offsets"][i], self.meta["content_offsets"][i + 1]
+        row = {
+            "id": self.meta["ids"][i],
+            "url": self.meta["urls"][i],
+            "chunk_number": self.meta["chunk_numbers"][i],
+            "title": self.meta["titles"][i],
+            "summary": self.meta["summaries"][i],
+            "content": self.content[start:end].tobytes().decode("utf-8"),
+            "metadata": self.meta["metadata"][i],
+            "similarity": similarity
+        }
+        if include_embedding:
+            row["embedding"] = self.embeddings[i]
+        return row
+
+class LocalVectorIndex:
+    """In-process replacement for the `match_deepseek_pages` RPC."""
+
+    def __init__(
+        self,
+        root: Path,
+        reload_interval: float = 10,
+        quantization: Optional[str] = None,
+        rescore_factor: int = 10
+    ):
+        self.root = Path(root)
+        self.reload_interval = reload_interval
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self._snapshot: Optional[Snapshot] = None
+        self._checked_at = 0.0
+        self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+
+        try:
+            name = (self.root / CURRENT_FILE).read_text().strip()
+        except OSError as e:
+            print(f"No vector snapshot published in {self.root}: {e}")
+            return
+        if self._snapshot is None or self._snapshot.name != name:
+            # Swap in one assignment so concurrent searches see either snapshot, never half of one
+            self._snapshot = Snapshot.open(self.root / name)
+            print(f"Loaded vector snapshot {name} ({self._snapshot.meta['count']} chunks)")
+
+    def __len__(self) -> int:
+        return self._snapshot.meta["count"] if self._snapshot else 0
+
+    def search(
+        self,
+        query_embedding: List[float],
+        match_count: int = 5,
+        filter: Optional[Dict[str, Any]] = None,
+        match_threshold: float = 0.0,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Exact top-k cosine search, optionally restricted to rows whose metadata contains `filter`.
+
+        A filtered search only scores the rows that pass the filter, so searching
+        one source costs the same however many other sources the snapshot holds.
+        With `include_embeddings` each row also carries its normalized vector.
+        """
+        self._maybe_reload()
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.meta["count"]:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        query = query / norm
+
+        rows = snapshot.partition(filter) if filter else None
+        if rows is not None and not len(rows):
+            return []
+
+        coarse = snapshot.coarse_scores(query, self.quantization, rows) if self.quantization else None
+        if coarse is None:
+            if rows is None:
+                candidates = np.arange(snapshot.meta["count"])
+                scores = snapshot.embeddings @ query
+            else:
+                candidates = rows
+                scores = snapshot.select(snapshot.embeddings, rows) @ query
+        else:
+            # Rescore only the best coarse candidates with the full vectors;
+            # sorted indices keep reads from the memory map sequential
+            candidates = np.sort(top_k(coarse, match_count * self.rescore_factor))
+            if rows is not None:
+                candidates = rows[candidates]
+            scores = snapshot.embeddings[candidates] @ query
+
+        top = top_k(scores, match_count)
+        return [
+            snapshot.row(int(candidates[i]), float(scores[i]), include_embeddings)
+            for i in top
+            if np.isfinite(scores[i]) and scores[i] > match_threshold
+        ]
+
+    def rows_by_id(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """Rows for the given table ids that are present in the snapshot, without a similarity."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        positions = (snapshot.position(row_id) for row_id in ids)
+        return [snapshot.row(i, None) for i in positions if i is not None]
+
+def load_vector_index_from_env() -> Optional[LocalVectorIndex]:
+    """Use a local index when VECTOR_SNAPSHOT_DIR is set, otherwise search through Supabase."""
+    root = os.getenv("VECTOR_SNAPSHOT_DIR")
+    if not root:
+        return None
+    return LocalVectorIndex(
+        Path(root),
+        quantization=os.getenv("VECTOR_QUANTIZATION") or None,
+        rescore_factor=int(os.getenv("VECTOR_RESCORE_FACTOR", "10"))
+    )
+
+def parse_embedding(value: Any) -> List[float]:
+    # PostgREST returns pgvector columns as their text form, e.g. "[0.1,0.2]"
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+def build_codes(directory: Path, meta: Dict[str, Any], coarse_dimensions: Optional[int] = None):
+    """Write int8 and binary codes for a snapshot's embeddings and record them in `meta`."""
+    count, dimensions = meta["count"], meta["dimensions"]
+    if not count:
+        return
+    coarse_dimensions = min(coarse_dimensions or dimensions, dimensions)
+    embeddings = np.memmap(directory / "embeddings.f32", dtype=np.float32, mode="r", shape=(count, dimensions))
+    vectors = truncate(embeddings, coarse_dimensions)
+
+    codes, scale = quantize_int8(vectors)
+    codes.tofile(directory / "codes.int8")
+    quantize_binary(vectors).tofile(directory / "codes.bits")
+    meta.update(coarse_dimensions=coarse_dimensions, int8_scale=scale.tolist())
+
+def group_by_source(directory: Path, meta: Dict[str, Any]):
+    """Reorder a snapshot's rows so each source's are contiguous and a filtered search reads one slice."""
+    count, dimensions = meta["count"], meta["dimensions"]
+    sources = [metadata.get("source") or "" for metadata in meta["metadata"]]
+    order = sorted(range(count), key=sources.__getitem__)
+    if order == list(range(count)):
+        return
+
+    embeddings = np.memmap(directory / "embeddings.f32", dtype=np.float32, mode="r", shape=(count, dimensions))
+    content = np.memmap(directory / "content.bin", dtype=np.uint8, mode="r")
+    offsets = meta["content_offsets"]
+    new_offsets = [0]
+    with open(directory / "embeddings.f32.tmp", "wb") as embeddings_out, \
+            open(directory / "content.bin.tmp", "wb") as content_out:
+        for start in range(0, count, EXPORT_PAGE_SIZE):
+            rows = order[start:start + EXPORT_PAGE_SIZE]
+            embeddings_out.write(np.asarray(embeddings[rows]).tobytes())
+            for i in rows:
+                content_out.write(content[offsets[i]:offsets[i + 1]].tobytes())
+                new_offsets.append(new_offsets[-1] + offsets[i + 1] - offsets[i])
+    del embeddings, content
+    os.replace(directory / "embeddings.f32.tmp", directory / "embeddings.f32")
+    os.replace(directory / "content.bin.tmp", directory / "content.bin")
+
+    for key in ("ids", "urls", "chunk_numbers", "titles", "summaries", "metadata"):
+        meta[key] = [meta[key][i] for i in order]
+    meta["content_offsets"] = new_offsets
+
+def export_snapshot(supabase: Client, root: Path, keep: int = 3, coarse_dimensions: Optional[int] = None) -> Path:
+    """Export deepseek_pages to a new snapshot under `root` and publish it."""
+    name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    directory = Path(root) / name
+    directory.mkdir(parents=True)
+
+    meta = {key: [] for key in ("ids", "urls", "chunk_numbers", "titles", "summaries", "metadata")}
+    offsets = [0]
+    last_id = 0
+    with open(directory / "embeddings.f32", "wb") as embeddings, open(directory / "content.bin", "wb") as content:
+        while True:
+            rows = supabase.table("deepseek_pages")\
+                .select("id, url, chunk_number, title, summary, content, metadata, embedding")\
+                .gt("id", last_id)\
+                .order("id")\
+                .limit(EXPORT_PAGE_SIZE)\
+                .execute().data
+            if not rows:
+                break
+
+            for row in rows:
+                vector = np.asarray(parse_embedding(row["embedding"]), dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                embeddings.write((vector / norm if norm else vector).tobytes())
+
+                encoded = row["content"].encode("utf-8")
+                content.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+
+                meta["ids"].append(row["id"])
+                meta["urls"].append(row["url"])
+                meta["chunk_numbers"].append(row["chunk_number"])
+                meta["titles"].append(row["title"])
+                meta["summaries"].append(row["summary"])
+                meta["metadata"].append(row["metadata"] or {})
+            last_id = rows[-1]["id"]
+            print(f"Exported {len(meta['ids'])} chunks")
+
+    meta.update(count=len(meta["ids"]), dimensions=EMBEDDING_DIMENSIONS, content_offsets=offsets)
+    group_by_source(directory, meta)
+    build_codes(directory, meta, coarse_dimensions)
+    (directory / "meta.json").write_text(json.dumps(meta))
+    publish_snapshot(Path(root), name, keep)
+    return directory
+
+def publish_snapshot(root: Path, name: str, keep: int = 3):
+    """Point CURRENT at a snapshot atomically and prune the oldest ones."""
+    tmp = root / f"{CURRENT_FILE}.tmp"
+    tmp.write_text(name)
+    os.replace(tmp, root / CURRENT_FILE)
+
+    # Workers still mapping a pruned snapshot keep their pages until they reload
+    snapshots = sorted(path for path in root.iterdir() if path.is_dir())
+    for old in snapshots[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Export deepseek_pages to a local vector snapshot')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help='Export the table and publish a new snapshot')
+    export.add_argument('--out', type=Path, default=Path(os.getenv("VECTOR_SNAPSHOT_DIR", "snapshots")),
+                        help='Snapshot root directory')
+    export.add_argument('--keep', type=int, default=3, help='Number of snapshots to keep')
+    export.add_argument('--coarse-dimensions', type=int, default=None,
+                        help='Truncate vectors to this many dimensions for the quantized codes')
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=Path(__file__).resolve().parent / '.env')
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    directory = export_snapshot(supabase, args.out, keep=args.keep, coarse_dimensions=args.coarse_dimensions)
+    print(f"Published snapshot {directory}")
+
+if __name__ == "__main__":
+    main()